@@ -1,10 +1,42 @@
 from collections import defaultdict
+from functools import partial
+from itertools import repeat
+from operator import itemgetter
+import argparse
 import heapq
+import io
+import json
 import os
+import sys
 
-from mido import MidiFile
-
+from cache import AnalysisCache, LRUCache
 from musictheory import Key, Chord
+from rawmidi import read_midi_events
+from templates import template_table
+from util import POPCOUNT
+import instrument
+import util
+
+# Run as a script, this module is __main__. Other modules import it as
+# analyze, and must get this module rather than a second copy with its own
+# settings and caches.
+if __name__ == '__main__':
+    sys.modules.setdefault('analyze', sys.modules[__name__])
+
+# Bump whenever a change to chunking or chord matching changes the results,
+# so that cached analyses made by older versions are not reused.
+ANALYZER_VERSION = 1
+
+# Tracks of the bass, tenor, alto and soprano voices
+VOICE_TRACKS = (4, 3, 2, 1)
+
+
+def open_midi_file(filename=None, file=None):
+    """ Opens a MIDI file with mido, which is only imported on first use. """
+    from mido import MidiFile
+    with instrument.stage('load'):
+        return MidiFile(filename, file=file)
+
 
 def get_key_string(midi_file):
     meta_track = midi_file.tracks[0]
@@ -27,117 +59,626 @@ class ChordProgression(object):
     def __str__(self):
         return ' | '.join([str(chord) for chord in self.progression])
 
-    def from_midi_file(self, midi_file):
-        key_string = get_key_string(midi_file)
-        key = Key.from_str(key_string)
-
-        chunks = self.__chunks(midi_file)
-
-        for chunk in chunks:
-            best_match_rate = 0
-            chunk_set = set(chunk)
-            for chord in key.common_chords():
-                chord_set = set(chord.equivalence_classes(key))
-                if chunk_set.issubset(chord_set):
+    def from_midi_file(self, midi_file, window=None):
+        """ Analyzes midi_file, chunking it as the chunks are matched.
+
+        The chorale is analyzed in the key of its key signature, or the key
+        that fits it best if it has none. Given a window of beats, each beat
+        is instead analyzed in the key that fits the window beats around it,
+        following modulations. When instrumented, the time spent chunking
+        counts towards the match stage.
+        """
+        chunks = iter_chunks(voice_events(midi_file),
+                             midi_file.ticks_per_beat)
+        if window is None:
+            key_string = get_key_string(midi_file) or \
+                estimate_key_string(voice_events(midi_file),
+                                    midi_file.ticks_per_beat)
+            self.from_chunks(Key.from_str(key_string), chunks)
+            return
+
+        from keyfinding import key_track
+
+        key_strings = key_track(voice_events(midi_file),
+                                midi_file.ticks_per_beat, window)
+        self.from_key_track([Key.from_str(key_string)
+                             for key_string in key_strings], chunks)
+
+    def from_chunks(self, key, chunks):
+        self.from_key_track(repeat(key), chunks)
+
+    def from_key_track(self, keys, chunks):
+        """ Like from_chunks, with each chunk analyzed in its own key.
+
+        keys holds the key of each chunk, and the chords of the progression
+        are relative to the key of their chunk. Chunks are matched in
+        tonic-relative form, see match_relative.
+        """
+        key = None
+        counting = instrument.enabled
+        with instrument.stage('match'):
+            for chunk_key, chunk in zip(keys, chunks):
+                if chunk_key is not key:
+                    key = chunk_key
+                    scale = key.scale
+                    tonic = key.tonic.class_number()
+                    candidates = template_candidates(scale)
+                chunk_mask = util.rotate_mask(util.to_mask(chunk), tonic)
+                bass = (chunk[0] - tonic) % 12
+                index, chord = relative_matches.get_or_create(
+                    (scale, chunk_mask, bass), match_relative, scale,
+                    chunk_mask, bass)
+                if counting:
+                    count_match(chunk_mask, candidates.masks, index)
+                if index is not None:
                     best_match = chord
-                    break
-                match_rate = len(chunk_set & chord_set) / \
-                             len(chunk_set | chord_set)
-                if match_rate > best_match_rate:
-                    best_match = chord
-                    best_match_rate = match_rate
-            try:
-                inversion = best_match.equivalence_classes(key).index(chunk[0])
-            except ValueError:
-                inversion = 0 # Bass note is not a chord tone, assume root pos
-            scale_degree = best_match.scale_degree
-            quality = best_match.quality
-            relative = best_match.relative
-            self.progression.append(Chord.get_cached(scale_degree, quality,
-                                                     inversion, relative))
-
-    @staticmethod
-    def __chunks(midi_file):
-
-        def chunkify_track(bucket, midi_track, ticks_per_beat):
-            index = 0
-            bucket_capacity = {}
-            for message in midi_track:
-                if message.type == 'note_off':
-                    note = message.note % 12
-                    time = message.time
-                    while time > 0:
-                        bucket_capacity.setdefault(index, ticks_per_beat)
-                        if time <= bucket_capacity[index]:
-                            bucket_capacity[index] -= time
-                            time = 0
-                        else:
-                            time -= bucket_capacity[index]
-                            bucket_capacity[index] = 0
-                        insert_once(note, bucket.setdefault(index, list()))
-                        if bucket_capacity[index] == 0:
-                            index += 1
-
-        def insert_once(item, list_):
-            if item not in list_:
-                list_.append(item)
-
-        bucket = {}
-
-        bass_track = midi_file.tracks[4]
-        tenor_track = midi_file.tracks[3]
-        alto_track = midi_file.tracks[2]
-        soprano_track = midi_file.tracks[1]
-
-        for midi_track in (bass_track, tenor_track, alto_track, soprano_track):
-            chunkify_track(bucket, midi_track, midi_file.ticks_per_beat)
-
-        bucket_list = []
-        for i in range(0, len(bucket)):
-            bucket_list.append(bucket[i])
-        return bucket_list
-
-
-FILES = os.listdir('corpus/')
-
-major_key_progressions = []
-minor_key_progressions = []
-
-for file_ in FILES:
-    if file_.endswith('.mid'):
-        with MidiFile('corpus/' + file_) as midi_file:
-            if len(midi_file.tracks) == 5:
-                if get_key_string(midi_file).endswith('m'):
-                    progressions = minor_key_progressions
+                    best_match_classes = candidates.classes[index]
+                    best_match_tonic = tonic
                 else:
-                    progressions = major_key_progressions
-                cp = ChordProgression()
-                cp.from_midi_file(midi_file)
-                progressions.append(cp.progression)
+                    # Keep the previous chord, inverted over this bass
+                    try:
+                        inversion = best_match_classes.index(
+                            (chunk[0] - best_match_tonic) % 12)
+                    except ValueError:
+                        inversion = 0
+                    chord = Chord.get_cached(best_match.scale_degree,
+                                             best_match.quality, inversion,
+                                             best_match.relative)
+                self.progression.append(chord)
+
+
+# Result of match_relative by (scale, relative chunk mask, relative bass),
+# shared by every chorale
+relative_matches = LRUCache('relative_matches')
+
+# Chord label frequencies by scale that templates are tried in order of, or
+# None for the order of Key.common_chords; see set_template_frequencies
+template_frequencies = None
+
+# CandidateList of each scale for template_frequencies
+_candidates = {}
+
+def match_relative(scale, chunk_mask, bass):
+    """ Returns the template index and Chord of a tonic-relative chunk.
+
+    chunk_mask and bass are the pitch classes of a chunk and its bass
+    counted up from the tonic of a key of scale, so a sonority matches the
+    same way in every key of a scale. The index is into
+    template_candidates(scale). Returns (None, None) if no template fits,
+    see match_mask.
+    """
+    candidates = template_candidates(scale)
+    index = candidates.superset(chunk_mask)
+    if index is None:
+        index = match_mask(chunk_mask, candidates.masks)
+        if index is None:
+            return None, None
+    try:
+        inversion = candidates.classes[index].index(bass)
+    except ValueError:
+        inversion = 0 # Bass note is not a chord tone, root pos
+    chord = candidates.chords[index]
+    return index, Chord.get_cached(chord.scale_degree, chord.quality,
+                                   inversion, chord.relative)
+
+
+def template_candidates(scale):
+    """ Returns the CandidateList chunks in scale are matched against. """
+    candidates = _candidates.get(scale)
+    if candidates is None:
+        frequencies = template_frequencies and template_frequencies.get(scale)
+        candidates = template_table().candidates(scale, frequencies)
+        _candidates[scale] = candidates
+    return candidates
+
+
+def set_template_frequencies(frequencies):
+    """ Makes the analysis try the most frequent templates first.
+
+    frequencies maps each scale ('M' or 'm') to a mapping from chord labels
+    (scale degree, quality, relative) to how often they occur, for instance
+    CorpusFile.label_counts of an earlier analysis. When several templates
+    contain a chunk the most frequent one then wins, where by default the
+    first in the order of Key.common_chords does; None restores that order.
+    Results made with frequencies are cached apart from the others.
+    """
+    global template_frequencies
+    template_frequencies = frequencies
+    _candidates.clear()
+    relative_matches.clear()
+
+
+def cache_version():
+    """ Returns the AnalysisCache version of the current analysis settings.
+    """
+    if template_frequencies is None:
+        return ANALYZER_VERSION
+    import hashlib
+
+    settings = '\n'.join(sorted(json.dumps([scale, label, count])
+                                for scale, counts
+                                in template_frequencies.items()
+                                for label, count in counts.items()))
+    return '{}-{}'.format(ANALYZER_VERSION, hashlib.sha256(
+        settings.encode('utf-8')).hexdigest())
+
+
+def estimate_key_string(voices, ticks_per_beat):
+    """ Returns the key string of a chorale, see keyfinding.estimate_key. """
+    from keyfinding import estimate_key
+
+    instrument.count('keys_estimated')
+    return estimate_key(voices, ticks_per_beat)
+
+
+def count_match(chunk_mask, template_masks, index):
+    """ Counts the outcome of match_mask(chunk_mask, template_masks). """
+    instrument.count('chunks')
+    if index is None:
+        instrument.count('unmatched_chunks')
+    elif template_masks[index] & chunk_mask == chunk_mask:
+        instrument.count('subset_matches')
+    else:
+        instrument.count('jaccard_matches')
+
+
+def match_mask(chunk_mask, template_masks):
+    """ Returns the index of the template that best fits a chunk.
+
+    Both the chunk and the templates are 12-bit pitch class masks. The first
+    template containing every pitch class of the chunk wins; failing that, the
+    first one with the highest Jaccard similarity. Returns None if the chunk
+    shares no pitch class with any template.
+    """
+    best_index = None
+    best_match_rate = 0
+    for index, template_mask in enumerate(template_masks):
+        common = chunk_mask & template_mask
+        if common == chunk_mask:
+            return index
+        match_rate = POPCOUNT[common] / POPCOUNT[chunk_mask | template_mask]
+        if match_rate > best_match_rate:
+            best_index = index
+            best_match_rate = match_rate
+    return best_index
+
+
+def match_masks(chunk_masks, template_masks):
+    """ Vectorized match_mask over many chunks at once.
+
+    Returns an array holding, for each chunk mask, the index of the template
+    match_mask would pick, or -1 where it would return None.
+    """
+    import numpy as np
+
+    bits = np.arange(12)
+    chunk_bits = (np.asarray(chunk_masks, dtype=np.int64)[:, None] >> bits) & 1
+    template_bits = \
+        (np.asarray(template_masks, dtype=np.int64)[:, None] >> bits) & 1
+
+    common = chunk_bits @ template_bits.T
+    chunk_sizes = chunk_bits.sum(axis=1)[:, None]
+    union = chunk_sizes + template_bits.sum(axis=1)[None, :] - common
+    match_rates = common / union
+
+    # argmax returns the first maximum, the same tie-break as the scan.
+    is_subset = common == chunk_sizes
+    first_subset = is_subset.argmax(axis=1)
+    best_rate = match_rates.argmax(axis=1)
+    has_match = match_rates.max(axis=1, initial=0) > 0
+    return np.where(is_subset.any(axis=1), first_subset,
+                    np.where(has_match, best_rate, -1))
+
+
+def batch_progressions(key, chunk_lists, templates=None):
+    """ Analyzes the chunks of several chorales in key in one vectorized step.
+
+    templates defaults to key.common_chords(). Returns a list with a
+    progression for each list of chunks, the same as from_chunks would give.
+    """
+    import numpy as np
+
+    if templates is None:
+        templates, template_masks, classes = template_table().templates(key)
+    else:
+        template_masks = [chord.mask(key) for chord in templates]
+        classes = [chord.equivalence_classes(key) for chord in templates]
+
+    # Inversion of each template for each bass pitch class, and the chords
+    # they name.
+    inversions = np.zeros((len(templates), 12), dtype=np.intp)
+    labels = []
+    for i, chord in enumerate(templates):
+        for position, class_number in reversed(list(enumerate(classes[i]))):
+            inversions[i, class_number] = position
+        labels.append([Chord.get_cached(chord.scale_degree, chord.quality,
+                                        inversion, chord.relative)
+                       for inversion in range(4)])
+
+    all_chunks = [chunk for chunk_list in chunk_lists for chunk in chunk_list]
+    if not all_chunks:
+        return [[] for _ in chunk_lists]
+    with instrument.stage('match'):
+        chunk_masks = [util.to_mask(chunk) for chunk in all_chunks]
+        indices = match_masks(chunk_masks, template_masks).tolist()
+        if instrument.enabled:
+            for chunk_mask, index in zip(chunk_masks, indices):
+                count_match(chunk_mask, template_masks,
+                            index if index >= 0 else None)
+    inversions = inversions.tolist()
+
+    progressions = []
+    position = 0
+    for chunk_list in chunk_lists:
+        progression = []
+        best_match = None
+        for chunk, index in zip(chunk_list, indices[position:]):
+            if index >= 0:
+                best_match = index
+            elif best_match is None:
+                raise ValueError('Chunk shares no pitch class with any '
+                                 'template')
+            inversion = inversions[best_match][chunk[0]]
+            progression.append(labels[best_match][inversion])
+        position += len(chunk_list)
+        progressions.append(progression)
+    return progressions
+
+
+def chunks(midi_file, resolution=None):
+    """ Splits a chorale into beats.
+
+    Returns a list with one entry per beat, each a list of the pitch class
+    numbers sounding during that beat, bass voice first. Given a resolution
+    in ticks, the chorale is split into slices that long instead; see
+    note_intervals for other ways to slice it.
+    """
+    if resolution is None:
+        return list(iter_chunks(voice_events(midi_file),
+                                midi_file.ticks_per_beat))
+    intervals = note_intervals(midi_file)
+    return intervals.chunks(intervals.grid(resolution))
+
+
+def note_intervals(midi_file):
+    """ Returns the notes of a chorale as a slicing.NoteIntervals. """
+    from slicing import NoteIntervals
+
+    return NoteIntervals.from_voices(voice_events(midi_file),
+                                     midi_file.ticks_per_beat)
+
+
+def voice_events(midi_file):
+    """ Returns the note_off events of the four voices, bass first.
+
+    Each voice is an iterator of (note, time) pairs, read from the track as
+    it is consumed.
+    """
+    return [((message.note, message.time)
+             for message in midi_file.tracks[track]
+             if message.type == 'note_off')
+            for track in VOICE_TRACKS]
+
+
+def iter_chunks(voices, ticks_per_beat):
+    """ Yields the chunks of a chorale one beat at a time.
+
+    voices holds an iterable of (note, duration) pairs per voice, bass first.
+    They are walked together in order of absolute tick, always advancing the
+    voice that is furthest behind, and each beat is yielded as soon as every
+    voice has moved past its end. Only the beats in between are held in
+    memory, so voices may be arbitrarily long streams.
+    """
+    iterators = [iter(voice) for voice in voices]
+    # (absolute tick, voice) of every voice that has events left
+    cursors = [(0, voice) for voice in range(len(iterators))]
+    # Notes of each voice in beats not yet yielded, by beat
+    pending = {}
+    next_beat = 0
+    last_beat = -1
+
+    def pop_chunk(beat):
+        chunk = []
+        for notes in pending.pop(beat):
+            for note in notes:
+                if note not in chunk:
+                    chunk.append(note)
+        return chunk
+
+    while cursors:
+        tick, voice = heapq.heappop(cursors)
+        # No voice can sound before tick any more
+        while next_beat <= last_beat and \
+                (next_beat + 1) * ticks_per_beat <= tick:
+            yield pop_chunk(next_beat)
+            next_beat += 1
+
+        event = next(iterators[voice], None)
+        if event is None:
+            continue
+        note, duration = event
+        if duration > 0:
+            note %= 12
+            end_beat = (tick + duration - 1) // ticks_per_beat
+            last_beat = max(last_beat, end_beat)
+            for beat in range(tick // ticks_per_beat, end_beat + 1):
+                notes = pending.setdefault(
+                    beat, [[] for _ in iterators])[voice]
+                if note not in notes:
+                    notes.append(note)
+        heapq.heappush(cursors, (tick + duration, voice))
+
+    while next_beat <= last_beat:
+        yield pop_chunk(next_beat)
+        next_beat += 1
+
+
+def compact_progression(progression):
+    """ Returns a progression as a tuple of plain, picklable chord tuples. """
+    return tuple((chord.scale_degree, chord.quality, chord.inversion,
+                  tuple(chord.relative) if chord.relative else None)
+                 for chord in progression)
+
+
+def expand_progression(compact):
+    """ Inverse of compact_progression, returns a list of cached Chords. """
+    return [Chord.get_cached(*chord) for chord in compact]
+
+
+def analyze_file(path, cache_dir=None, raw=False):
+    """ Analyzes a single chorale.
+
+    Returns a (key string, compact progression) pair, or None if the file
+    does not have the expected meta track and four voice tracks. If cache_dir
+    is given, results are looked up in and stored to an AnalysisCache there,
+    and a file whose contents were analyzed before is not parsed again. With
+    raw, the file is read with rawmidi instead of mido, which is much faster
+    and gives the same results.
+    """
+    with open(path, 'rb') as fp:
+        data = fp.read()
+    return analyze_contents(data, cache_dir, raw)
+
+
+def analyze_contents(data, cache_dir=None, raw=False):
+    """ Returns the analyze_file result for data, the bytes of a file. """
+    if cache_dir is None:
+        return analyze_data(data, raw)[0]
+
+    cache = AnalysisCache(cache_dir, cache_version())
+    digest = cache.digest(data)
+
+    entry = cache.get(digest)
+    instrument.count('analysis_cache_misses' if entry is None
+                     else 'analysis_cache_hits')
+    if entry is not None:
+        if entry['key'] is None:
+            return None
+        return entry['key'], expand_compact(entry['progression'])
+
+    result, chunk_list = analyze_data(data, raw)
+    if result is None:
+        cache.put(digest, {'key': None})
+    else:
+        cache.put(digest, {'key': result[0], 'chunks': chunk_list,
+                           'progression': result[1]})
+    return result
+
+
+def analyze_data(data, raw=False):
+    """ Returns the analyze_midi_file result for the bytes of a MIDI file.
+
+    With raw, data is read with rawmidi rather than mido.
+    """
+    if raw:
+        with instrument.stage('load'):
+            events = read_midi_events(data)
+        return analyze_midi_events(events)
+    with open_midi_file(file=io.BytesIO(data)) as midi_file:
+        return analyze_midi_file(midi_file)
+
+
+def analyze_midi_file(midi_file):
+    """ Returns the analyze_file result for midi_file and its chunks. """
+    if len(midi_file.tracks) != 5:
+        instrument.count('files_skipped')
+        return None, None
+    instrument.count('files_analyzed')
+    key_string = get_key_string(midi_file) or \
+        estimate_key_string(voice_events(midi_file), midi_file.ticks_per_beat)
+    with instrument.stage('chunk'):
+        chunk_list = chunks(midi_file)
+    return analyze_chunks(key_string, chunk_list), chunk_list
+
+
+def analyze_midi_events(events):
+    """ Like analyze_midi_file, for the rawmidi.MidiEvents of a file. """
+    if events.track_count != 5:
+        instrument.count('files_skipped')
+        return None, None
+    instrument.count('files_analyzed')
+    key_string = events.key_string or estimate_key_string(
+        events.voice_events(VOICE_TRACKS), events.ticks_per_beat)
+    with instrument.stage('chunk'):
+        chunk_list = list(iter_chunks(events.voice_events(VOICE_TRACKS),
+                                      events.ticks_per_beat))
+    return analyze_chunks(key_string, chunk_list), chunk_list
+
+
+def analyze_chunks(key_string, chunk_list):
+    """ Returns the analyze_file result for the chunks of a chorale. """
+    cp = ChordProgression()
+    cp.from_chunks(Key.from_str(key_string), chunk_list)
+    return key_string, compact_progression(cp.progression)
+
+
+def expand_compact(compact):
+    """ Restores a compact progression that went through JSON. """
+    return tuple((degree, quality, inversion,
+                  tuple(relative) if relative else None)
+                 for degree, quality, inversion, relative in compact)
+
+
+def corpus_files(paths):
+    """ Expands directories in paths to the sorted .mid files they contain. """
+    files = []
+    for path in paths:
+        if os.path.isdir(path):
+            files.extend(sorted(os.path.join(path, file_)
+                                for file_ in os.listdir(path)
+                                if file_.endswith('.mid')))
+        else:
+            files.append(path)
+    return files
+
+
+def analyze_files(paths, jobs=None, cache_dir=None, raw=False,
+                  contents=None):
+    """ Returns the analyze_file results for paths, in the same order.
+
+    Directories in paths stand for the .mid files in them, see
+    corpus_files. With jobs other than 1 the files are spread over a pool of
+    that many worker processes (one per core if None). cache_dir and raw are
+    passed on to analyze_file. If the files were read already, contents
+    holds the bytes of each of paths, and they are not read again.
+    """
+    if contents is None:
+        contents = corpus_files(paths)
+        analyze = partial(analyze_file, cache_dir=cache_dir, raw=raw)
+    else:
+        analyze = partial(analyze_contents, cache_dir=cache_dir, raw=raw)
+
+    if jobs == 1 or len(contents) <= 1:
+        return list(map(analyze, contents))
+
+    workers = jobs or os.cpu_count() or 1
+    chunksize = max(1, len(contents) // (4 * workers))
+    from concurrent.futures import ProcessPoolExecutor
+    initargs = (instrument.enabled, template_frequencies)
+    if not instrument.enabled:
+        with ProcessPoolExecutor(max_workers=workers,
+                                 initializer=init_worker,
+                                 initargs=initargs) as executor:
+            return list(executor.map(analyze, contents,
+                                     chunksize=chunksize))
+
+    # Bring the workers' timers and counters back to this process
+    analyze = partial(analyze_instrumented, analyze)
+    results = []
+    with ProcessPoolExecutor(max_workers=workers, initializer=init_worker,
+                             initargs=initargs) as executor:
+        for result, snapshot in executor.map(analyze, contents,
+                                             chunksize=chunksize):
+            instrument.merge(snapshot)
+            results.append(result)
+    return results
+
+
+def init_worker(instrumented, frequencies):
+    """ Gives an analyze_files worker the settings of the parent process. """
+    if instrumented:
+        instrument.enable()
+    set_template_frequencies(frequencies)
+
+
+def analyze_instrumented(analyze, file_):
+    """ Returns analyze(file_) and an instrumentation snapshot. """
+    instrument.reset()
+    result = analyze(file_)
+    return result, instrument.snapshot()
+
+
+def analyze_corpus(paths, jobs=None, cache_dir=None, raw=False):
+    """ Analyzes every chorale in paths, which may include directories.
+
+    jobs, cache_dir and raw are passed on to analyze_files. Returns a pair of
+    lists of progressions, for the major and the minor key chorales, in the
+    order of corpus_files(paths).
+    """
+    return split_by_scale(analyze_files(paths, jobs=jobs,
+                                        cache_dir=cache_dir, raw=raw))
+
+
+def split_by_scale(results):
+    """ Splits analyze_files results into major and minor progressions. """
+    major_key_progressions = []
+    minor_key_progressions = []
+
+    for result in results:
+        if result is None:
+            continue
+        key_string, compact = result
+        if key_string.endswith('m'):
+            progressions = minor_key_progressions
+        else:
+            progressions = major_key_progressions
+        progressions.append(expand_progression(compact))
+
+    return major_key_progressions, minor_key_progressions
 
 
 def generate_transition_matrix(progressions):
+    """ Returns the chord histogram and transition counts of progressions.
+
+    Both are defaultdicts, with chords and pairs of chords in order of their
+    first transition, so TransitionCounts.from_dicts ranks the chords as
+    TransitionCounts().add(progressions) does.
+    """
+    import numpy as np
+    from chordstats import ChordVocabulary
+
     histogram = defaultdict(int)
     transition_matrix = defaultdict(int)
+    with instrument.stage('count'):
+        vocabulary = ChordVocabulary()
+        from_ids = []
+        to_ids = []
+        for progression in progressions:
+            ids = vocabulary.encode(progression)
+            from_ids.append(ids[:-1])
+            to_ids.append(ids[1:])
+        if not from_ids:
+            return histogram, transition_matrix
+        size = len(vocabulary)
+        from_ids = np.concatenate(from_ids)
+        chords = vocabulary.decode(range(size))
+        for chord_id, count in first_counts(from_ids):
+            histogram[chords[chord_id]] = count
+        for pair, count in first_counts(
+                from_ids * size + np.concatenate(to_ids)):
+            from_id, to_id = divmod(pair, size)
+            transition_matrix[(chords[from_id], chords[to_id])] = count
+    return histogram, transition_matrix
+
+def first_counts(values):
+    """ Returns (value, count) pairs of an array in order of first appearance.
+    """
+    import numpy as np
+
+    values, first, counts = np.unique(values, return_index=True,
+                                      return_counts=True)
+    order = np.argsort(first)
+    return zip(values[order].tolist(), counts[order].tolist())
 
-    for progression in progressions:
-        for i in range(0, len(progression) - 1):
-            from_chord, to_chord = progression[i:i+2]
-            histogram[from_chord] += 1
-            transition_matrix[(from_chord, to_chord)] += 1
+def get_n_most_common(dictionary, n):
+    """ Returns the n keys of dictionary with the largest values.
 
-    return (histogram, transition_matrix)
+    They are in descending order of value; keys with equal values keep the
+    order of the dictionary.
+    """
+    return [key for key, _ in heapq.nlargest(n, dictionary.items(),
+                                             key=itemgetter(1))]
 
-def get_n_most_common(dictionary, n):
-    values = list(dictionary.values())
-    largest = heapq.nlargest(n, values)
-    keys = list(dictionary.keys())
-    return [keys[values.index(m)] for m in largest]
+def get_trimmed_transition(histogram, transition_matrix, n, chords=None):
+    """ Returns the transitions among the n most common chords.
 
-def get_trimmed_transition(histogram, transition_matrix, n):
+    chords can pass in get_n_most_common(histogram, n) if it is already
+    known.
+    """
     new_matrix = defaultdict(int)
 
-    chords = get_n_most_common(histogram, n)
+    if chords is None:
+        chords = get_n_most_common(histogram, n)
     for from_chord in chords:
         for to_chord in chords:
             if from_chord == to_chord:
@@ -146,37 +687,179 @@ def get_trimmed_transition(histogram, transition_matrix, n):
                     transition_matrix[(from_chord, to_chord)]
     return new_matrix
 
-def get_max(dictionary):
-    if not dictionary:
-        return None
+def write_graphviz(progressions, filename):
+    histogram, transition_matrix = generate_transition_matrix(progressions)
+    write_graphviz_counts(histogram, transition_matrix, filename)
+
+def write_graphviz_counts(histogram, transition_matrix, filename):
+    """ Like write_graphviz, from generate_transition_matrix results. """
+    from chordstats import TransitionCounts
+
+    write_statistics(TransitionCounts.from_dicts(histogram,
+                                                 transition_matrix),
+                     [filename])
+
+def write_statistics(counts, paths, **options):
+    """ Writes TransitionCounts to each of paths, in the format of its name.
+
+    options are passed on to export.StatisticsExporter, which selects the
+    chords and transitions to write once for all paths.
+    """
+    from export import StatisticsExporter
+
+    with instrument.stage('write'):
+        exporter = StatisticsExporter(counts, **options)
+        for path in paths:
+            exporter.write(path)
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Chorale harmonic analysis tool.')
+    parser.add_argument('paths', nargs='*', default=None,
+                        help='MIDI files or directories of them '
+                             '(default: corpus/)')
+    parser.add_argument('-j', '--jobs', type=int, default=None,
+                        help='number of worker processes '
+                             '(default: one per core)')
+    parser.add_argument('--cache-dir', default=None,
+                        help='directory to cache per-file analyses in')
+    parser.add_argument('--index', default=None,
+                        help='corpus index file to refresh incrementally '
+                             'instead of analyzing every file')
+    parser.add_argument('--raw-midi', action='store_true',
+                        help='read MIDI files with the fast rawmidi reader '
+                             'instead of mido')
+    parser.add_argument('--hmm', action='store_true',
+                        help='decode whole chorales with a hidden Markov '
+                             'model instead of matching each beat on its own')
+    parser.add_argument('--em', type=int, default=None, metavar='N',
+                        help='with --hmm, refine the model with N iterations '
+                             'of Baum-Welch')
+    parser.add_argument('--format', action='append', default=None,
+                        choices=('dot', 'csv', 'json', 'npz'),
+                        help='write major.FORMAT and minor.FORMAT; may be '
+                             'given more than once (default: dot)')
+    parser.add_argument('--top', type=int, default=11, metavar='N',
+                        help='report the N most common chords (default: 11)')
+    parser.add_argument('--min-count', type=int, default=1, metavar='N',
+                        help='leave out transitions counted fewer than N '
+                             'times')
+    parser.add_argument('--stats', default=None,
+                        help='file to write per-stage timings and counters '
+                             'to as JSON')
+    parser.add_argument('--save', default=None, metavar='FILE',
+                        help='also write the analyzed progressions to a '
+                             'corpus file')
+    parser.add_argument('--load', default=None, metavar='FILE',
+                        help='count the progressions of a corpus file '
+                             'instead of analyzing MIDI files')
+    parser.add_argument('--order-by', default=None, metavar='FILE',
+                        help='try the chords most frequent in a corpus file '
+                             'first, instead of in a fixed order (changes '
+                             'the results)')
+    args = parser.parse_args(argv)
+    if args.load is not None and (
+            args.paths or args.jobs is not None or
+            args.cache_dir is not None or args.raw_midi or
+            args.index is not None or args.save is not None or
+            args.order_by is not None or args.hmm):
+        parser.error('--load does not go with paths, --jobs, --cache-dir, '
+                     '--raw-midi, --index, --save, --order-by or --hmm')
+    if args.save is not None and (args.index is not None or args.hmm):
+        parser.error('--save does not go with --index or --hmm')
+    if args.order_by is not None and args.hmm:
+        parser.error('--order-by does not go with --hmm')
+    if args.hmm and (args.jobs is not None or args.cache_dir is not None or
+                     args.index is not None):
+        parser.error('--hmm does not go with --jobs, --cache-dir or --index')
+    if args.em is not None and not args.hmm:
+        parser.error('--em only goes with --hmm')
+    if args.top < 1:
+        parser.error('--top must be at least 1')
+    if args.min_count < 1:
+        parser.error('--min-count must be at least 1')
+    if not args.paths:
+        args.paths = ['corpus/']
+
+    if args.stats is None:
+        run(args)
+        return
+    instrument.enable()
+    try:
+        run(args)
+    finally:
+        with open(args.stats, 'w') as fp:
+            json.dump(instrument.snapshot(), fp, indent=2)
+
+
+def run(args):
+    """ Analyzes the corpus as the parsed command line args ask. """
+    formats = args.format or ['dot']
+    for scale, counts in count_scales(args):
+        write_statistics(counts, [scale + '.' + format_
+                                  for format_ in formats],
+                         n=args.top, min_count=args.min_count)
+
+
+def count_scales(args):
+    """ Returns the TransitionCounts of the major and minor chorales.
+
+    The result is a list of ('major', counts) and ('minor', counts), made
+    as the parsed command line args ask.
+    """
+    from chordstats import TransitionCounts
+
+    scales = ('major', 'minor')
+    if args.load is not None:
+        from corpusfile import CorpusFile
+
+        corpus = CorpusFile(args.load)
+        return [(scale, corpus.transition_counts(scale)) for scale in scales]
+
+    if args.order_by is not None:
+        from corpusfile import CorpusFile
+
+        corpus = CorpusFile(args.order_by)
+        set_template_frequencies({'M': corpus.label_counts('major'),
+                                  'm': corpus.label_counts('minor')})
+
+    if args.index is not None:
+        from corpusindex import CorpusIndex
+
+        index = CorpusIndex(args.index)
+        index.refresh(corpus_files(args.paths), jobs=args.jobs,
+                      cache_dir=args.cache_dir, raw=args.raw_midi)
+        index.save()
+        return [(scale, TransitionCounts.from_dicts(*index.counts(scale)))
+                for scale in scales]
+
+    if args.hmm:
+        from chordhmm import analyze_corpus_hmm
+
+        progressions = analyze_corpus_hmm(corpus_files(args.paths),
+                                          iterations=args.em or 0,
+                                          raw=args.raw_midi)
+    elif args.save is not None:
+        from corpusfile import write_corpus
+
+        files = corpus_files(args.paths)
+        results = analyze_files(files, jobs=args.jobs,
+                                cache_dir=args.cache_dir, raw=args.raw_midi)
+        write_corpus(args.save, ((path, result[0],
+                                  expand_progression(result[1]))
+                                 for path, result in zip(files, results)
+                                 if result is not None))
+        progressions = split_by_scale(results)
     else:
-        current_max = dictionary.values[0]
+        progressions = analyze_corpus(corpus_files(args.paths),
+                                      jobs=args.jobs,
+                                      cache_dir=args.cache_dir,
+                                      raw=args.raw_midi)
 
-    for value in dictionary.values():
-        current_max = value if value > current_max else current_max
-    return current_max
+    with instrument.stage('count'):
+        return [(scale, TransitionCounts().add(scale_progressions))
+                for scale, scale_progressions in zip(scales, progressions)]
 
-def write_graphviz(progressions, filename):
-    histogram, transition_matrix = generate_transition_matrix(progressions)
-    trimmed = get_trimmed_transition(histogram, transition_matrix, 11)
-    chords = get_n_most_common(histogram, 11)
-    max_ = get_max(trimmed)
-    w = 4.0 / max_
-
-    with open(filename, 'w') as fp:
-        fp.write('digraph G {\n')
-        for from_ in chords:
-            for to in chords:
-                if trimmed[(from_, to)] == 0:
-                    continue
-                weight = w * trimmed[(from_, to)]
-                from_str = str(from_).encode('ascii', 'xmlcharrefreplace')
-                from_str = from_str.decode('utf-8')
-                to_str = str(to).encode('ascii', 'xmlcharrefreplace')
-                to_str = to_str.decode('utf-8')
-                format_str = '    \"{0}\" -> \"{1}\"[penwidth={2:3}];\n'
-                fp.write(format_str.format(from_str, to_str, weight))
-        fp.write('}')
-
-write_graphviz(major_key_progressions, 'major.dot')
-write_graphviz(minor_key_progressions, 'minor.dot')
+
+if __name__ == '__main__':
+    main()
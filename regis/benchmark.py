@@ -0,0 +1,175 @@
+""" Benchmarks of the analysis pipeline and the music theory primitives.
+
+Each stage of the pipeline (parsing, chunking, matching, counting and
+exporting) is timed on its own, on the bundled corpus and optionally on a
+synthetic one, and the results are written as JSON so that runs on different
+commits can be compared.
+"""
+
+from collections import defaultdict
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import timeit
+
+import analyze
+from musictheory import Chord, Interval, Key, PitchClass
+from rawmidi import load_midi_events
+
+
+def best_of(repeat, function, *args):
+    """ Runs function repeat times and returns its timings and last result.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = function(*args)
+        timings.append(time.perf_counter() - start)
+    return {'best': min(timings), 'mean': sum(timings) / len(timings),
+            'runs': timings}, result
+
+
+def parse(paths):
+    midi_files = []
+    for path in paths:
+        with analyze.open_midi_file(path) as midi_file:
+            if len(midi_file.tracks) == 5:
+                midi_files.append(midi_file)
+    return midi_files
+
+
+def parse_raw(paths):
+    return [load_midi_events(path) for path in paths]
+
+
+def chunk(midi_files):
+    return [(analyze.get_key_string(midi_file), analyze.chunks(midi_file))
+            for midi_file in midi_files]
+
+
+def match(chunked):
+    progressions = []
+    for key_string, chunk_list in chunked:
+        cp = analyze.ChordProgression()
+        cp.from_chunks(Key.from_str(key_string), chunk_list)
+        progressions.append(cp.progression)
+    return progressions
+
+
+def match_batch(chunked):
+    by_key = defaultdict(list)
+    for key_string, chunk_list in chunked:
+        by_key[key_string].append(chunk_list)
+    return [progression for key_string, chunk_lists in by_key.items()
+            for progression in analyze.batch_progressions(
+                Key.from_str(key_string), chunk_lists)]
+
+
+def count(progressions):
+    return analyze.generate_transition_matrix(progressions)
+
+
+def export(counts):
+    with tempfile.TemporaryDirectory() as directory:
+        filename = os.path.join(directory, 'graph.dot')
+        analyze.write_graphviz_counts(*counts, filename=filename)
+
+
+def benchmark_corpus(paths, repeat):
+    """ Times every stage of the pipeline on the chorales in paths. """
+    stages = {}
+    stages['parse'], midi_files = best_of(repeat, parse, paths)
+    stages['parse_raw'], _ = best_of(repeat, parse_raw, paths)
+    stages['chunk'], chunked = best_of(repeat, chunk, midi_files)
+    stages['match'], progressions = best_of(repeat, match, chunked)
+    stages['match_batch'], _ = best_of(repeat, match_batch, chunked)
+    stages['count'], counts = best_of(repeat, count, progressions)
+    stages['export'], _ = best_of(repeat, export, counts)
+    stages['analyze_corpus'], _ = best_of(
+        repeat, analyze.analyze_corpus, paths, 1)
+    return {'files': len(paths), 'chorales': len(midi_files),
+            'beats': sum(len(chunk_list) for _, chunk_list in chunked),
+            'stages': stages}
+
+
+def benchmark_primitives(number):
+    """ Returns the time per call in seconds of music theory primitives. """
+    C = PitchClass('C')
+    major_third = Interval('M', 3)
+    key = Key.from_str('Eb')
+    chord = Chord(5, '7', 0, (5, 'M'))
+
+    def pitch_classes_uncached():
+        Chord.clear_cache()
+        return chord.pitch_classes(key)
+
+    primitives = {
+        'PitchClass.__add__': lambda: C + major_third,
+        'PitchClass.class_number': C.class_number,
+        'Interval.semitones': major_third.semitones,
+        'Interval.__add__': lambda: major_third + major_third,
+        'Chord.pitch_classes': lambda: chord.pitch_classes(key),
+        'Chord.pitch_classes (uncached)': pitch_classes_uncached,
+        'Key.common_chords (new key)': lambda: Key(C, 'M').common_chords(),
+    }
+    return {name: min(timeit.repeat(function, number=number, repeat=3))
+            / number for name, function in primitives.items()}
+
+
+def environment():
+    info = {'python': platform.python_version(),
+            'platform': platform.platform()}
+    try:
+        info['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', 'HEAD'], stderr=subprocess.DEVNULL,
+            cwd=os.path.dirname(os.path.abspath(__file__))).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark the chorale analysis pipeline.')
+    parser.add_argument('--corpus', default='corpus/',
+                        help='directory of chorales (default: corpus/)')
+    parser.add_argument('--synthetic', type=int, default=0, metavar='N',
+                        help='also benchmark N synthetic chorales')
+    parser.add_argument('--seed', type=int, default=0,
+                        help='seed of the synthetic corpus')
+    parser.add_argument('--repeat', type=int, default=3,
+                        help='runs of each stage, the best one counts')
+    parser.add_argument('--number', type=int, default=10000,
+                        help='calls per run of each primitive')
+    parser.add_argument('-o', '--output', default=None,
+                        help='file to write the JSON results to '
+                             '(default: standard output)')
+    args = parser.parse_args(argv)
+
+    results = {'environment': environment(), 'corpora': {}}
+    results['corpora']['bundled'] = benchmark_corpus(
+        analyze.corpus_files([args.corpus]), args.repeat)
+    if args.synthetic:
+        from synthetic import generate_corpus
+
+        with tempfile.TemporaryDirectory() as directory:
+            paths = generate_corpus(directory, args.synthetic, seed=args.seed)
+            results['corpora']['synthetic'] = benchmark_corpus(paths,
+                                                               args.repeat)
+    results['primitives'] = benchmark_primitives(args.number)
+
+    if args.output is None:
+        json.dump(results, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    else:
+        with open(args.output, 'w') as fp:
+            json.dump(results, fp, indent=2)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,204 @@
+""" Caches for regis """
+
+from collections import OrderedDict, namedtuple
+import hashlib
+import json
+import os
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'size',
+                                       'capacity'])
+
+# Every LRUCache created, as a list of caches by name. A module imported twice,
+# as __main__ and under its own name, creates its caches twice.
+registry = {}
+
+# Whether LRUCaches count hits, misses and evictions, see set_counting
+counting = False
+
+
+class LRUCache(object):
+    """ Mapping that keeps the capacity most recently used entries.
+
+    While counting is on, lookups through get and get_or_create count towards
+    the hit and miss statistics. A capacity of None means the cache is
+    unbounded. Every cache registers itself under its name, see cache_stats
+    and set_capacity. The caches are not thread-safe; the analysis runs its
+    workers in separate processes.
+    """
+
+    __missing = object()
+
+    def __init__(self, name, capacity=None):
+        self.__name = name
+        self.__capacity = capacity
+        self.__entries = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+        self.__evictions = 0
+        registry.setdefault(name, []).append(self)
+
+    @property
+    def name(self):
+        return self.__name
+
+    @property
+    def capacity(self):
+        return self.__capacity
+
+    @capacity.setter
+    def capacity(self, capacity):
+        self.__capacity = capacity
+        self.__evict()
+
+    def get(self, key, default=None):
+        value = self.__entries.get(key, self.__missing)
+        if value is self.__missing:
+            if counting:
+                self.__misses += 1
+            return default
+        self.__entries.move_to_end(key)
+        if counting:
+            self.__hits += 1
+        return value
+
+    def put(self, key, value):
+        """ Stores value under key and returns the value now stored there.
+
+        If a value is already stored under key, that one is kept and
+        returned, so all callers end up sharing one value.
+        """
+        existing = self.__entries.get(key, self.__missing)
+        if existing is not self.__missing:
+            self.__entries.move_to_end(key)
+            return existing
+        self.__entries[key] = value
+        self.__evict()
+        return value
+
+    def get_or_create(self, key, factory, *args):
+        """ Returns the value under key, storing factory(*args) if missing.
+
+        The factory may use this cache itself.
+        """
+        entries = self.__entries
+        try:
+            value = entries[key]
+        except KeyError:
+            if counting:
+                self.__misses += 1
+            return self.put(key, factory(*args))
+        entries.move_to_end(key)
+        if counting:
+            self.__hits += 1
+        return value
+
+    def clear(self):
+        self.__entries.clear()
+
+    def stats(self):
+        return CacheStats(self.__hits, self.__misses, self.__evictions,
+                          len(self.__entries), self.__capacity)
+
+    def reset_stats(self):
+        self.__hits = self.__misses = self.__evictions = 0
+
+    def __len__(self):
+        return len(self.__entries)
+
+    def __contains__(self, key):
+        return key in self.__entries
+
+    def __evict(self):
+        if self.__capacity is None:
+            return
+        while len(self.__entries) > self.__capacity:
+            self.__entries.popitem(last=False)
+            if counting:
+                self.__evictions += 1
+
+
+def set_counting(on):
+    """ Turns counting of cache hits, misses and evictions on or off. """
+    global counting
+    counting = on
+
+
+def cache_stats():
+    """ Returns the CacheStats of every LRUCache, by name.
+
+    The statistics of caches sharing a name are added up.
+    """
+    result = {}
+    for name, caches in list(registry.items()):
+        hits = misses = evictions = size = 0
+        for cache in caches:
+            stats = cache.stats()
+            hits += stats.hits
+            misses += stats.misses
+            evictions += stats.evictions
+            size += stats.size
+        result[name] = CacheStats(hits, misses, evictions, size,
+                                  caches[-1].capacity)
+    return result
+
+
+def set_capacity(name, capacity):
+    """ Changes the capacity of every LRUCache called name. """
+    for cache in registry[name]:
+        cache.capacity = capacity
+
+
+class AnalysisCache(object):
+    """ On-disk cache of per-file analysis results.
+
+    Entries are JSON documents keyed by the SHA-256 of the analyzer version
+    and the file contents, so a changed file or a new analyzer version never
+    sees a stale entry. Writes go through a temporary file and a rename, so
+    several worker processes can share one cache directory.
+    """
+
+    def __init__(self, directory, version):
+        self.__directory = directory
+        self.__version = str(version)
+
+    @property
+    def directory(self):
+        return self.__directory
+
+    @property
+    def version(self):
+        return self.__version
+
+    def digest(self, data):
+        """ Returns the cache key of a file with contents data. """
+        hash_ = hashlib.sha256(self.version.encode('utf-8') + b'\0')
+        hash_.update(data)
+        return hash_.hexdigest()
+
+    def get(self, digest):
+        """ Returns the entry stored under digest, or None if there is none.
+        """
+        try:
+            with open(self.__path(digest), encoding='utf-8') as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return None
+
+    def put(self, digest, entry):
+        """ Stores a JSON-serializable entry under digest. """
+        import tempfile
+
+        path = self.__path(digest)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as fp:
+                json.dump(entry, fp)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+    def __path(self, digest):
+        return os.path.join(self.directory, digest[:2], digest + '.json')
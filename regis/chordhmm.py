@@ -0,0 +1,396 @@
+""" Hidden Markov model analysis of chorales.
+
+Rather than picking the chord of each beat on its own, a ChordHMM decodes
+whole chorales at once. Its hidden states are the template chords of a
+scale, the emission scores say how well the pitch classes of a beat fit each
+template, and the transition probabilities between chords act as the prior
+that settles ambiguous beats. The chorales of a scale are decoded together:
+the Viterbi and forward-backward recursions step through the beats, but
+each step is a NumPy operation over many chorales and pairs of states.
+Chorales are sorted by length and split into batches of at most
+BATCH_SIZE, each padded only to its longest chorale, and a step only
+involves those that have not ended yet.
+"""
+
+import numpy as np
+
+from chordstats import TransitionCounts
+from musictheory import Chord, Key
+from templates import REFERENCE_KEYS, template_table
+import util
+
+# Bounds of the emission rates, which keep the emission scores finite
+MIN_RATE = 1e-3
+MAX_RATE = 1 - 1e-3
+
+# Most chorales decoded together in one Batch
+BATCH_SIZE = 32
+
+
+class ChordHMM(object):
+    """ Hidden Markov model of the chords of the chorales in one scale.
+
+    States are numbered like the templates of the scale, see labels.
+    transitions and initial are weights of the transitions between states
+    and of the first state of a chorale, uniform by default. Every pitch
+    class of the state's chord sounds during a beat with chord_tone_rate,
+    every other one with other_tone_rate.
+    """
+
+    def __init__(self, scale, transitions=None, initial=None,
+                 chord_tone_rate=0.8, other_tone_rate=0.1):
+        self.__scale = scale
+        chords = template_table().templates(
+            Key.from_str(REFERENCE_KEYS[scale]))[0]
+        self.__labels = [(chord.scale_degree, chord.quality, chord.relative)
+                         for chord in chords]
+        size = len(self.__labels)
+        if transitions is None:
+            transitions = np.ones((size, size))
+        if initial is None:
+            initial = np.ones(size)
+        self.__set_parameters(transitions, initial, chord_tone_rate,
+                              other_tone_rate)
+
+    @classmethod
+    def from_counts(cls, scale, counts, first_chords=None, smoothing=1.0,
+                    **rates):
+        """ Returns a model with the transitions of a TransitionCounts.
+
+        Chords are counted towards the state of their template whatever
+        their inversion. The initial weights are counted from first_chords,
+        the first Chord of each chorale, or from the chord histogram if it
+        is not given. smoothing is added to every count, so that no
+        transition is impossible; rates are passed on to the constructor.
+        """
+        model = cls(scale, **rates)
+        index = {label: state for state, label in enumerate(model.labels)}
+        mapping = np.zeros((len(counts.vocabulary), len(index)))
+        for chord_id, chord in enumerate(counts.vocabulary):
+            state = index.get((chord.scale_degree, chord.quality,
+                               chord.relative))
+            if state is not None:
+                mapping[chord_id, state] = 1
+        transitions = mapping.T @ counts.transitions @ mapping + smoothing
+        if first_chords is None:
+            initial = mapping.T @ counts.histogram + smoothing
+        else:
+            initial = np.full(len(index), float(smoothing))
+            for chord in first_chords:
+                state = index.get((chord.scale_degree, chord.quality,
+                                   chord.relative))
+                if state is not None:
+                    initial[state] += 1
+        model.__set_parameters(transitions, initial, model.chord_tone_rate,
+                               model.other_tone_rate)
+        return model
+
+    @property
+    def scale(self):
+        return self.__scale
+
+    @property
+    def labels(self):
+        """ The (scale degree, quality, relative) of each state. """
+        return self.__labels
+
+    @property
+    def log_transitions(self):
+        return self.__log_transitions
+
+    @property
+    def log_initial(self):
+        return self.__log_initial
+
+    @property
+    def chord_tone_rate(self):
+        return self.__chord_tone_rate
+
+    @property
+    def other_tone_rate(self):
+        return self.__other_tone_rate
+
+    def decode(self, chorales):
+        """ Returns the most likely progression of each chorale.
+
+        chorales is a list of (key, chunk list) pairs in keys of the model's
+        scale. The progressions are lists of Chords, with inversions found
+        from the bass like ChordProgression.from_chunks does.
+        """
+        progressions = [[] for _ in chorales]
+        labels = [[Chord.get_cached(degree, quality, inversion, relative)
+                   for inversion in range(4)]
+                  for degree, quality, relative in self.labels]
+        for batch in batches(chorales):
+            paths = viterbi(self.log_initial, self.log_transitions,
+                            self.__emissions(batch), batch.lengths)
+            for row, chorale in enumerate(batch.order.tolist()):
+                key_index = batch.key_indices[row]
+                inversions = batch.inversions[key_index]
+                length = batch.lengths[row]
+                states = paths[row, :length]
+                positions = inversions[states, batch.basses[row, :length]]
+                progressions[chorale] = [
+                    labels[state][position]
+                    for state, position in zip(states.tolist(),
+                                               positions.tolist())]
+        return progressions
+
+    def log_likelihood(self, chorales):
+        """ Returns the total log likelihood of chorales under the model. """
+        return sum((expectations(self.log_initial, self.log_transitions,
+                                 self.__emissions(batch), batch.lengths)[0]
+                    for batch in batches(chorales)), 0.0)
+
+    def fit(self, chorales, iterations=10, smoothing=1.0):
+        """ Re-estimates the model on chorales with the Baum-Welch algorithm.
+
+        chorales are as decode takes them. Each iteration replaces the
+        transitions, initial weights and emission rates with their expected
+        values given the current model, with smoothing added to every
+        expected transition and initial count. Returns the log likelihood
+        of chorales before each iteration.
+        """
+        log_likelihoods = []
+        parts = []
+        for batch in batches(chorales):
+            template_bits = batch.template_bits[batch.key_indices]
+            # Chord tones sounding in each beat for each state, and the sizes
+            # of the chunks and of the templates
+            overlaps = batch.chunk_bits @ template_bits.transpose(0, 2, 1)
+            chunk_sizes = batch.chunk_bits.sum(axis=2, keepdims=True)
+            template_sizes = template_bits.sum(axis=2)[:, None, :]
+            parts.append((batch, overlaps, chunk_sizes, template_sizes))
+        if not parts:
+            return log_likelihoods
+
+        size = len(self.labels)
+        for _ in range(iterations):
+            log_likelihood = 0.0
+            transitions = np.zeros((size, size))
+            initial = np.zeros(size)
+            # Expected chord tones sounding, chord tones, other tones
+            # sounding and other tones
+            tones = np.zeros(4)
+            for batch, overlaps, chunk_sizes, template_sizes in parts:
+                batch_log_likelihood, posteriors, batch_transitions = \
+                    expectations(self.log_initial, self.log_transitions,
+                                 self.__emissions(batch), batch.lengths)
+                log_likelihood += batch_log_likelihood
+                transitions += batch_transitions
+                initial += posteriors[:, 0].sum(axis=0)
+                tones += ((posteriors * overlaps).sum(),
+                          (posteriors * template_sizes).sum(),
+                          (posteriors * (chunk_sizes - overlaps)).sum(),
+                          (posteriors * (12 - template_sizes)).sum())
+            log_likelihoods.append(log_likelihood)
+            self.__set_parameters(transitions + smoothing,
+                                  initial + smoothing,
+                                  tones[0] / tones[1], tones[2] / tones[3])
+        return log_likelihoods
+
+    def __set_parameters(self, transitions, initial, chord_tone_rate,
+                         other_tone_rate):
+        transitions = np.asarray(transitions, dtype=float)
+        initial = np.asarray(initial, dtype=float)
+        with np.errstate(divide='ignore'):
+            self.__log_transitions = np.log(
+                transitions / transitions.sum(axis=1, keepdims=True))
+            self.__log_initial = np.log(initial / initial.sum())
+        self.__chord_tone_rate = float(np.clip(chord_tone_rate, MIN_RATE,
+                                               MAX_RATE))
+        self.__other_tone_rate = float(np.clip(other_tone_rate, MIN_RATE,
+                                               MAX_RATE))
+
+    def __emissions(self, batch):
+        """ Returns the (chorales, beats, states) log emission scores. """
+        a = self.chord_tone_rate
+        b = self.other_tone_rate
+        template_bits = batch.template_bits[batch.key_indices]
+        # Score of each pitch class sounding, and of it not sounding
+        sounding = template_bits * np.log(a) + (1 - template_bits) * np.log(b)
+        silent = template_bits * np.log(1 - a) + \
+            (1 - template_bits) * np.log(1 - b)
+        return batch.chunk_bits @ sounding.transpose(0, 2, 1) + \
+            (1 - batch.chunk_bits) @ silent.transpose(0, 2, 1)
+
+
+def batches(chorales, size=None):
+    """ Returns the chorales with chunks as Batches of at most size each.
+
+    size defaults to BATCH_SIZE. Chorales are sorted longest first and split
+    in that order, so that the chorales of a batch have similar lengths.
+    """
+    if size is None:
+        size = BATCH_SIZE
+    lengths = [len(chunk_list) for _, chunk_list in chorales]
+    order = sorted((chorale for chorale, length in enumerate(lengths)
+                    if length), key=lambda chorale: -lengths[chorale])
+    return [Batch(chorales, order[start:start + size])
+            for start in range(0, len(order), size)]
+
+
+class Batch(object):
+    """ Chunks of some chorales as padded arrays.
+
+    order lists the indices into chorales of the chorales in the batch,
+    longest first, and none of them may be without chunks.
+    """
+
+    def __init__(self, chorales, order):
+        self.order = np.array(order, dtype=np.intp)
+        self.lengths = np.array([len(chorales[chorale][1])
+                                 for chorale in order], dtype=np.intp)
+
+        keys = []
+        key_indices = {}
+        self.key_indices = np.zeros(len(order), dtype=np.intp)
+        beats = self.lengths[0]
+        self.chunk_bits = np.zeros((len(order), beats, 12))
+        self.basses = np.zeros((len(order), beats), dtype=np.intp)
+        for row, chorale in enumerate(order):
+            key, chunk_list = chorales[chorale]
+            if key not in key_indices:
+                key_indices[key] = len(keys)
+                keys.append(key)
+            self.key_indices[row] = key_indices[key]
+            masks = np.array([util.to_mask(chunk) for chunk in chunk_list])
+            self.chunk_bits[row, :len(masks)] = \
+                (masks[:, None] >> np.arange(12)) & 1
+            self.basses[row, :len(masks)] = [chunk[0]
+                                              for chunk in chunk_list]
+
+        # Pitch classes of the templates of each key, and the inversion of
+        # each template for each bass pitch class
+        self.template_bits = []
+        self.inversions = []
+        for key in keys:
+            _, masks, classes = template_table().templates(key)
+            self.template_bits.append(
+                (np.array(masks)[:, None] >> np.arange(12)) & 1)
+            inversions = np.zeros((len(masks), 12), dtype=np.intp)
+            for state, template_classes in enumerate(classes):
+                for position, class_number in reversed(
+                        list(enumerate(template_classes))):
+                    inversions[state, class_number] = position
+            self.inversions.append(inversions)
+        self.template_bits = np.array(self.template_bits, dtype=float)
+
+
+def active_counts(lengths):
+    """ Returns how many of lengths, sorted longest first, exceed each beat.
+    """
+    return np.searchsorted(-lengths, -np.arange(lengths[0]), side='left')
+
+
+def viterbi(log_initial, log_transitions, emissions, lengths):
+    """ Returns the most likely state sequences of a batch of chorales.
+
+    emissions holds the (chorales, beats, states) log emission scores of
+    chorales sorted by their lengths, longest first. The result holds the
+    states of each chorale, padded after its length.
+    """
+    count, beats, size = emissions.shape
+    active = active_counts(lengths)
+    scores = log_initial + emissions[:, 0]
+    back_pointers = np.zeros((count, beats, size), dtype=np.int16)
+    for beat in range(1, beats):
+        k = active[beat]
+        candidates = scores[:k, :, None] + log_transitions
+        best = candidates.argmax(axis=1)
+        back_pointers[:k, beat] = best
+        scores[:k] = np.take_along_axis(candidates, best[:, None, :],
+                                        axis=1)[:, 0] + emissions[:k, beat]
+
+    # Chorales that ended earlier keep the scores of their last beat
+    paths = np.zeros((count, beats), dtype=np.intp)
+    states = scores.argmax(axis=1)
+    rows = np.arange(count)
+    for beat in range(beats - 1, 0, -1):
+        k = active[beat]
+        paths[:k, beat] = states[:k]
+        states[:k] = back_pointers[rows[:k], beat, states[:k]]
+    paths[:, 0] = states
+    return paths
+
+
+def expectations(log_initial, log_transitions, emissions, lengths):
+    """ Runs the forward-backward algorithm on a batch of chorales.
+
+    emissions and lengths are as viterbi takes them. Returns the total log
+    likelihood, the posterior probability of each state at each beat
+    (zero past the end of a chorale) and the expected number of each
+    transition.
+
+    The recursions use probabilities rescaled to sum to 1 at every beat
+    rather than logarithms, so that each step is a matrix product; the
+    scale factors add up to the log likelihood.
+    """
+    count, beats, size = emissions.shape
+    active = active_counts(lengths)
+    transition_matrix = np.exp(log_transitions)
+    # Emission probabilities relative to the best state of each beat
+    shifts = emissions.max(axis=2)
+    emissions = np.exp(emissions - shifts[:, :, None])
+
+    forward = np.zeros((count, beats, size))
+    scales = np.ones((count, beats))
+    forward[:, 0] = np.exp(log_initial) * emissions[:, 0]
+    scales[:, 0] = forward[:, 0].sum(axis=1)
+    forward[:, 0] /= scales[:, 0, None]
+    for beat in range(1, beats):
+        k = active[beat]
+        step = (forward[:k, beat - 1] @ transition_matrix) * \
+            emissions[:k, beat]
+        scales[:k, beat] = step.sum(axis=1)
+        forward[:k, beat] = step / scales[:k, beat, None]
+    beat_numbers = np.arange(beats)
+    log_likelihood = np.where(beat_numbers < lengths[:, None],
+                              np.log(scales) + shifts, 0).sum()
+
+    posteriors = np.zeros((count, beats, size))
+    transitions = np.zeros((size, size))
+    backward = np.ones((count, size))
+    for beat in range(beats - 1, -1, -1):
+        k = active[beat]
+        posteriors[:k, beat] = forward[:k, beat] * backward[:k]
+        if beat == 0:
+            break
+        following = emissions[:k, beat] * backward[:k] / \
+            scales[:k, beat, None]
+        transitions += transition_matrix * (forward[:k, beat - 1].T @
+                                            following)
+        backward[:k] = following @ transition_matrix.T
+    return log_likelihood, posteriors, transitions
+
+
+def analyze_corpus_hmm(paths, iterations=0, raw=False):
+    """ Like analyze.analyze_corpus, decoding chorales with ChordHMMs.
+
+    The transitions and initial weights of the model of each scale are
+    counted from the greedy analyses of the chorales in paths, then refined
+    by iterations of ChordHMM.fit. raw is passed on to analyze.analyze_data.
+    Files are read and analyzed one at a time, without a cache.
+    """
+    from analyze import analyze_data, expand_progression
+
+    chorales = {'M': [], 'm': []}
+    greedy = {'M': [], 'm': []}
+    for path in paths:
+        with open(path, 'rb') as fp:
+            result, chunk_list = analyze_data(fp.read(), raw)
+        if result is None:
+            continue
+        key = Key.from_str(result[0])
+        chorales[key.scale].append((key, chunk_list))
+        greedy[key.scale].append(expand_progression(result[1]))
+
+    progressions = {}
+    for scale in ('M', 'm'):
+        model = ChordHMM.from_counts(
+            scale, TransitionCounts().add(greedy[scale]),
+            first_chords=[progression[0] for progression in greedy[scale]
+                          if progression])
+        model.fit(chorales[scale], iterations)
+        progressions[scale] = model.decode(chorales[scale])
+    return progressions['M'], progressions['m']
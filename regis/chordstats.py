@@ -0,0 +1,241 @@
+""" Chord statistics over analyzed progressions.
+
+Chords are numbered by a ChordVocabulary, and histograms and transition
+counts are kept in NumPy arrays indexed by those numbers, so counting a
+corpus never hashes Chord pairs.
+"""
+
+from collections import defaultdict
+
+import numpy as np
+
+# Rank of a chord that has not been followed by another chord yet
+UNRANKED = np.iinfo(np.int64).max
+
+
+class ChordVocabulary(object):
+    """ Numbers distinct chords 0, 1, 2, ... in order of first appearance. """
+
+    def __init__(self, chords=()):
+        self.__chords = []
+        self.__ids = {}
+        for chord in chords:
+            self.id(chord)
+
+    def id(self, chord):
+        """ Returns the number of chord, giving it the next one if it is new.
+        """
+        chord_id = self.__ids.get(chord)
+        if chord_id is None:
+            chord_id = len(self.__chords)
+            self.__ids[chord] = chord_id
+            self.__chords.append(chord)
+        return chord_id
+
+    def get(self, chord):
+        """ Returns the number of chord, or None if it has none. """
+        return self.__ids.get(chord)
+
+    def encode(self, progression):
+        """ Returns a progression as an array of chord ids. """
+        return np.fromiter((self.id(chord) for chord in progression),
+                           dtype=np.intp, count=len(progression))
+
+    def decode(self, ids):
+        """ Returns the chords with the given ids. """
+        return [self.__chords[chord_id] for chord_id in ids]
+
+    def __getitem__(self, chord_id):
+        return self.__chords[chord_id]
+
+    def __len__(self):
+        return len(self.__chords)
+
+    def __iter__(self):
+        return iter(self.__chords)
+
+    def __contains__(self, chord):
+        return chord in self.__ids
+
+
+class TransitionCounts(object):
+    """ Chord histogram and first order transition counts.
+
+    histogram[i] counts how often chord i is followed by another chord and
+    transitions[i, j] how often it is followed by chord j, where the ids are
+    those of vocabulary. Chords are also ranked in the order they were first
+    followed by another chord, which breaks ties among equal counts the same
+    way however the chords are numbered.
+    """
+
+    def __init__(self, vocabulary=None):
+        self.__vocabulary = vocabulary if vocabulary is not None \
+            else ChordVocabulary()
+        size = len(self.__vocabulary)
+        self.__histogram = np.zeros(size, dtype=np.int64)
+        self.__transitions = np.zeros((size, size), dtype=np.int64)
+        self.__ranks = np.full(size, UNRANKED, dtype=np.int64)
+        self.__next_rank = 0
+
+    @property
+    def vocabulary(self):
+        return self.__vocabulary
+
+    @property
+    def histogram(self):
+        self.__grow()
+        return self.__histogram
+
+    @property
+    def transitions(self):
+        self.__grow()
+        return self.__transitions
+
+    def add(self, progressions):
+        """ Counts the transitions in an iterable of lists of Chords. """
+        self.add_encoded(self.vocabulary.encode(progression)
+                         for progression in progressions)
+        return self
+
+    def add_encoded(self, progressions):
+        """ Counts the transitions in an iterable of chord id arrays. """
+        from_ids = []
+        to_ids = []
+        for ids in progressions:
+            ids = np.asarray(ids, dtype=np.intp)
+            from_ids.append(ids[:-1])
+            to_ids.append(ids[1:])
+        self.__grow()
+        if from_ids:
+            from_ids = np.concatenate(from_ids)
+            to_ids = np.concatenate(to_ids)
+            np.add.at(self.__histogram, from_ids, 1)
+            np.add.at(self.__transitions, (from_ids, to_ids), 1)
+            self.__rank(from_ids)
+        return self
+
+    def merge(self, other):
+        """ Adds the counts of other, which may use a different vocabulary.
+        """
+        ids = np.fromiter((self.vocabulary.id(chord)
+                           for chord in other.vocabulary),
+                          dtype=np.intp, count=len(other.vocabulary))
+        self.__grow()
+        np.add.at(self.__histogram, ids, other.histogram)
+        np.add.at(self.__transitions, np.ix_(ids, ids), other.transitions)
+        self.__rank(ids[other.__ranked()])
+        return self
+
+    def probabilities(self):
+        """ Returns the transition counts normalized to sum to 1 per row.
+
+        Rows of chords that are never followed by anything are all zero.
+        """
+        transitions = self.transitions
+        totals = transitions.sum(axis=1, keepdims=True)
+        return np.divide(transitions, totals,
+                         out=np.zeros(transitions.shape), where=totals > 0)
+
+    def most_common(self, n):
+        """ Returns the ids of the n most common chords, most common first.
+
+        Chords with equal counts are in the order they were first followed
+        by another chord.
+        """
+        histogram = self.histogram
+        ranks = self.__ranks
+        if n <= 0:
+            return np.zeros(0, dtype=np.intp)
+        if n >= len(histogram):
+            ids = np.arange(len(histogram))
+        else:
+            # The n largest are those above the nth largest count, and the
+            # first ranked few with exactly that count.
+            threshold = np.partition(histogram, len(histogram) - n)[-n]
+            above = np.flatnonzero(histogram > threshold)
+            at = np.flatnonzero(histogram == threshold)
+            at = at[np.argsort(ranks[at], kind='stable')][:n - len(above)]
+            ids = np.concatenate([above, at])
+        return ids[np.lexsort((ranks[ids], -histogram[ids]))]
+
+    def trimmed(self, n):
+        """ Returns the transitions among the n most common chords.
+
+        The result is a pair of the chord ids and the matrix of transition
+        counts between them, without transitions from a chord to itself.
+        """
+        ids = self.most_common(n)
+        matrix = self.transitions[np.ix_(ids, ids)].copy()
+        np.fill_diagonal(matrix, 0)
+        return ids, matrix
+
+    def to_dicts(self):
+        """ Returns the counts as (histogram, transition matrix) dicts.
+
+        The histogram maps chords and the transition matrix pairs of chords to
+        counts. Only nonzero counts are included; both are defaultdicts. The
+        histogram is in order of rank, the transition matrix in id order.
+        """
+        chords = self.vocabulary.decode(range(len(self.vocabulary)))
+        histogram = defaultdict(int)
+        for chord_id in self.__ranked().tolist():
+            histogram[chords[chord_id]] = int(self.histogram[chord_id])
+        transition_matrix = defaultdict(int)
+        from_ids, to_ids = np.nonzero(self.transitions)
+        for from_id, to_id, count in zip(
+                from_ids.tolist(), to_ids.tolist(),
+                self.transitions[from_ids, to_ids].tolist()):
+            transition_matrix[(chords[from_id], chords[to_id])] = count
+        return histogram, transition_matrix
+
+    @classmethod
+    def from_dicts(cls, histogram, transition_matrix):
+        """ Returns the counts that to_dicts gave histogram and the matrix.
+
+        Chords are numbered and ranked in the order of histogram, followed by
+        those only found in transition_matrix.
+        """
+        vocabulary = ChordVocabulary(histogram)
+        for from_chord, to_chord in transition_matrix:
+            vocabulary.id(from_chord)
+            vocabulary.id(to_chord)
+        counts = cls(vocabulary)
+        for chord, count in histogram.items():
+            counts.__histogram[vocabulary.get(chord)] = count
+        counts.__rank(np.array([vocabulary.get(chord) for chord, count
+                                in histogram.items() if count],
+                               dtype=np.intp))
+        for (from_chord, to_chord), count in transition_matrix.items():
+            counts.__transitions[vocabulary.get(from_chord),
+                                 vocabulary.get(to_chord)] = count
+        return counts
+
+    def __grow(self):
+        """ Pads the arrays to cover chords added to the vocabulary since. """
+        size = len(self.vocabulary)
+        padding = size - len(self.__histogram)
+        if padding > 0:
+            self.__histogram = np.pad(self.__histogram, (0, padding))
+            self.__transitions = np.pad(self.__transitions,
+                                        ((0, padding), (0, padding)))
+            self.__ranks = np.pad(self.__ranks, (0, padding),
+                                  constant_values=UNRANKED)
+
+    def __rank(self, source_ids):
+        """ Ranks the chords in source_ids that have no rank yet.
+
+        source_ids are chords followed by another chord, in order; each new
+        one is ranked after every chord before it.
+        """
+        ids, first = np.unique(source_ids, return_index=True)
+        new = self.__ranks[ids] == UNRANKED
+        ids = ids[new][np.argsort(first[new])]
+        self.__ranks[ids] = np.arange(self.__next_rank,
+                                      self.__next_rank + len(ids))
+        self.__next_rank += len(ids)
+
+    def __ranked(self):
+        """ Returns the ids of the ranked chords, in order of rank. """
+        self.__grow()
+        ids = np.argsort(self.__ranks, kind='stable')
+        return ids[self.__ranks[ids] != UNRANKED]
@@ -0,0 +1,222 @@
+""" Analyzed corpora stored as chord id arrays in one binary file.
+
+A corpus file holds, after a small JSON header with the chord vocabulary
+and the name and key of each chorale, a table of offsets into one array of
+uint16 chord ids with the progressions of all chorales end to end. Both are
+memory-mapped when the file is opened, so even a corpus of millions of beats
+opens at once and takes two bytes of memory per beat that is read.
+
+Layout, all little-endian:
+
+    b'RGCF', format version (uint32), header length (uint32), JSON header,
+    zero padding to a multiple of 8 bytes, chorales + 1 offsets (uint64),
+    chord ids (uint16)
+"""
+
+import json
+import struct
+
+import numpy as np
+
+from analyze import compact_progression, expand_compact, expand_progression
+from chordstats import ChordVocabulary, TransitionCounts
+from musictheory import Chord, Key
+from templates import REFERENCE_KEYS, template_table
+
+MAGIC = b'RGCF'
+FORMAT_VERSION = 1
+PREAMBLE = struct.Struct('<4sII')
+
+
+def standard_chords():
+    """ Returns every chord the analyzer can name, in a fixed order.
+
+    These are the template chords of the major and then the minor scale,
+    each in all four inversions.
+    """
+    chords = []
+    seen = set()
+    for scale in ('M', 'm'):
+        for template in template_table().templates(
+                Key.from_str(REFERENCE_KEYS[scale]))[0]:
+            for inversion in range(4):
+                chord = Chord.get_cached(template.scale_degree,
+                                         template.quality, inversion,
+                                         template.relative)
+                if chord not in seen:
+                    seen.add(chord)
+                    chords.append(chord)
+    return chords
+
+
+def standard_vocabulary():
+    """ Returns a ChordVocabulary numbering the standard_chords.
+
+    The analyzer's chords get the same ids in every corpus written with it.
+    """
+    return ChordVocabulary(standard_chords())
+
+
+def write_corpus(path, chorales, vocabulary=None):
+    """ Writes analyzed chorales to a corpus file at path.
+
+    chorales is an iterable of (name, key string, progression) triples.
+    vocabulary defaults to standard_vocabulary(); chords missing from it are
+    added to it.
+    """
+    if vocabulary is None:
+        vocabulary = standard_vocabulary()
+    names = []
+    keys = []
+    progressions = []
+    for name, key_string, progression in chorales:
+        names.append(name)
+        keys.append(key_string)
+        progressions.append(vocabulary.encode(progression))
+    if len(vocabulary) > 0x10000:
+        raise ValueError('More chords than uint16 ids')
+
+    lengths = [len(ids) for ids in progressions]
+    offsets = np.zeros(len(progressions) + 1, dtype='<u8')
+    np.cumsum(lengths, out=offsets[1:])
+    ids = np.concatenate(progressions).astype('<u2') if progressions \
+        else np.zeros(0, dtype='<u2')
+
+    header = json.dumps({
+        'vocabulary': compact_progression(vocabulary),
+        'names': names,
+        'keys': keys,
+    }).encode('utf-8')
+    padding = -(PREAMBLE.size + len(header)) % 8
+    with open(path, 'wb') as fp:
+        fp.write(PREAMBLE.pack(MAGIC, FORMAT_VERSION, len(header)))
+        fp.write(header)
+        fp.write(b'\0' * padding)
+        fp.write(offsets.tobytes())
+        fp.write(ids.tobytes())
+
+
+class CorpusFile(object):
+    """ A corpus file opened for reading.
+
+    corpus[i] is the memory-mapped array of chord ids of chorale i, which
+    vocabulary turns back into Chords.
+    """
+
+    def __init__(self, path):
+        with open(path, 'rb') as fp:
+            magic, version, header_size = PREAMBLE.unpack(
+                fp.read(PREAMBLE.size))
+            if magic != MAGIC:
+                raise ValueError('{} is not a corpus file'.format(path))
+            if version != FORMAT_VERSION:
+                raise ValueError('Unsupported corpus file version {}'.format(
+                    version))
+            header = json.loads(fp.read(header_size).decode('utf-8'))
+
+        self.__path = path
+        self.__vocabulary = ChordVocabulary(
+            expand_progression(expand_compact(header['vocabulary'])))
+        self.__names = header['names']
+        self.__keys = header['keys']
+
+        position = PREAMBLE.size + header_size
+        position += -position % 8
+        self.__offsets = np.memmap(path, dtype='<u8', mode='r',
+                                   offset=position,
+                                   shape=(len(self.__keys) + 1,))
+        position += self.__offsets.nbytes
+        beats = int(self.__offsets[-1])
+        if beats:
+            self.__ids = np.memmap(path, dtype='<u2', mode='r',
+                                   offset=position, shape=(beats,))
+        else:
+            self.__ids = np.zeros(0, dtype='<u2') # Can't map 0 bytes
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def vocabulary(self):
+        return self.__vocabulary
+
+    @property
+    def names(self):
+        return self.__names
+
+    @property
+    def keys(self):
+        """ The key string of each chorale. """
+        return self.__keys
+
+    @property
+    def offsets(self):
+        return self.__offsets
+
+    @property
+    def ids(self):
+        """ The chord ids of all chorales, end to end. """
+        return self.__ids
+
+    def __len__(self):
+        return len(self.__keys)
+
+    def __getitem__(self, index):
+        return self.__ids[self.__offsets[index]:self.__offsets[index + 1]]
+
+    def indices(self, scale=None):
+        """ Returns the indices of the chorales in scale, or of all of them.
+
+        scale is 'major' or 'minor'.
+        """
+        if scale is None:
+            return list(range(len(self)))
+        minor = scale == 'minor'
+        return [index for index, key_string in enumerate(self.keys)
+                if key_string.endswith('m') == minor]
+
+    def progression(self, index):
+        """ Returns the progression of chorale index as a list of Chords. """
+        return self.vocabulary.decode(self[index].tolist())
+
+    def progressions(self, scale=None):
+        return [self.progression(index) for index in self.indices(scale)]
+
+    def label_counts(self, scale=None):
+        """ Returns how often each chord label occurs in scale.
+
+        Labels are (scale degree, quality, relative) tuples, with the
+        inversions of a chord counted together.
+        """
+        counts = {}
+        indices = self.indices(scale)
+        if not indices:
+            return counts
+        beats = np.bincount(np.concatenate([self[index] for index in indices]),
+                            minlength=len(self.vocabulary))
+        for chord, count in zip(self.vocabulary, beats.tolist()):
+            if count:
+                label = (chord.scale_degree, chord.quality,
+                         tuple(chord.relative) if chord.relative else None)
+                counts[label] = counts.get(label, 0) + count
+        return counts
+
+    def transition_counts(self, scale=None):
+        """ Returns the TransitionCounts of the chorales in scale.
+
+        Its vocabulary numbers the chords in order of first appearance, as
+        TransitionCounts().add(self.progressions(scale)) would, leaving out
+        those that never occur.
+        """
+        progressions = [self[index] for index in self.indices(scale)]
+        if not progressions:
+            return TransitionCounts()
+        chord_ids, first = np.unique(np.concatenate(progressions),
+                                     return_index=True)
+        order = chord_ids[np.argsort(first)]
+        renumbered = np.zeros(len(self.vocabulary), dtype=np.intp)
+        renumbered[order] = np.arange(len(order))
+        counts = TransitionCounts(
+            ChordVocabulary(self.vocabulary.decode(order.tolist())))
+        return counts.add_encoded(renumbered[ids] for ids in progressions)
@@ -0,0 +1,171 @@
+""" Incrementally maintained chord statistics of a corpus.
+
+A CorpusIndex remembers, for every file it has analyzed, the file's size,
+modification time and content hash along with its contribution to the
+chord histogram and transition counts of its scale. Refreshing it only
+analyzes files that were added or changed, and the totals are summed from
+the contributions of the files in the order they were last refreshed in, so
+they come out the same however the index got there. An index belongs to
+the analysis settings it was made with, see analyze.cache_version; under
+other settings it starts over.
+"""
+
+from collections import Counter, defaultdict
+import hashlib
+import json
+import os
+
+from analyze import analyze_files, cache_version
+from musictheory import Chord
+
+SCALES = ('major', 'minor')
+
+
+class CorpusIndex(object):
+
+    def __init__(self, path):
+        self.__path = path
+        self.__version = cache_version()
+        self.__files = {}
+
+        try:
+            with open(path, encoding='utf-8') as fp:
+                saved = json.load(fp)
+        except OSError:
+            return
+        if saved.get('version') != self.__version:
+            return # Analyzed differently, start over
+        for file_, entry in saved['files'].items():
+            entry['histogram'] = [(to_chord_key(chord), count)
+                                  for chord, count in entry['histogram']]
+            entry['transitions'] = [
+                ((to_chord_key(from_chord), to_chord_key(to_chord)), count)
+                for from_chord, to_chord, count in entry['transitions']]
+            self.__files[file_] = entry
+
+    @property
+    def path(self):
+        return self.__path
+
+    @property
+    def files(self):
+        """ The paths of all indexed files, in the order last refreshed. """
+        return list(self.__files)
+
+    def refresh(self, paths, jobs=None, cache_dir=None, raw=False):
+        """ Brings the index up to date with the files in paths.
+
+        Files that are new or whose contents changed are analyzed with
+        analyze_files, passing on jobs, cache_dir and raw; indexed files
+        missing from paths are dropped. Each of them is read once, for both
+        its hash and its analysis. Returns the lists of added, changed and
+        removed paths.
+        """
+        version = cache_version()
+        if version != self.__version:
+            # Analyzed with other settings, start over
+            self.__files.clear()
+            self.__version = version
+
+        added = []
+        changed = []
+        stats = {}
+        contents = {}
+        hashes = {}
+        for path in paths:
+            stat = os.stat(path)
+            stats[path] = (stat.st_size, stat.st_mtime_ns)
+            entry = self.__files.get(path)
+            if entry is None:
+                added.append(path)
+                continue
+            if (entry['size'], entry['mtime']) == stats[path]:
+                continue
+            contents[path] = read_file(path)
+            hashes[path] = content_hash(contents[path])
+            if entry['hash'] == hashes[path]:
+                entry['size'], entry['mtime'] = stats[path] # Touched only
+            else:
+                changed.append(path)
+        removed = [path for path in self.__files if path not in stats]
+
+        for path in changed + removed:
+            del self.__files[path]
+        for path in added:
+            contents[path] = read_file(path)
+            hashes[path] = content_hash(contents[path])
+
+        to_analyze = added + changed
+        results = analyze_files(to_analyze, jobs=jobs, cache_dir=cache_dir,
+                                raw=raw,
+                                contents=[contents[path]
+                                          for path in to_analyze])
+        for path, result in zip(to_analyze, results):
+            entry = {'size': stats[path][0], 'mtime': stats[path][1],
+                     'hash': hashes[path],
+                     'key': None,
+                     'histogram': [], 'transitions': []}
+            if result is not None:
+                entry['key'], progression = result
+                histogram = Counter(progression[:-1])
+                transitions = Counter(zip(progression, progression[1:]))
+                entry['histogram'] = list(histogram.items())
+                entry['transitions'] = list(transitions.items())
+            self.__files[path] = entry
+
+        self.__files = {path: self.__files[path] for path in paths}
+        return added, changed, removed
+
+    def counts(self, scale):
+        """ Returns the totals of scale ('major' or 'minor').
+
+        They are a (histogram, transition matrix) pair of defaultdicts, the
+        same as generate_transition_matrix returns for the progressions of
+        all indexed files in that scale, in the order of files.
+        """
+        histogram = Counter()
+        transitions = Counter()
+        for entry in self.__files.values():
+            if entry['key'] is not None and scale_of(entry['key']) == scale:
+                histogram.update(dict(entry['histogram']))
+                transitions.update(dict(entry['transitions']))
+
+        histogram = defaultdict(int, ((Chord.get_cached(*chord), count)
+                                      for chord, count in histogram.items()))
+        transition_matrix = defaultdict(int)
+        for (from_chord, to_chord), count in transitions.items():
+            transition_matrix[(Chord.get_cached(*from_chord),
+                               Chord.get_cached(*to_chord))] = count
+        return histogram, transition_matrix
+
+    def save(self):
+        files = {}
+        for path, entry in self.__files.items():
+            entry = dict(entry)
+            entry['histogram'] = [[chord, count]
+                                  for chord, count in entry['histogram']]
+            entry['transitions'] = [[from_chord, to_chord, count]
+                                    for (from_chord, to_chord), count
+                                    in entry['transitions']]
+            files[path] = entry
+        with open(self.path, 'w', encoding='utf-8') as fp:
+            json.dump({'version': self.__version, 'files': files}, fp)
+
+
+def scale_of(key_string):
+    return 'minor' if key_string.endswith('m') else 'major'
+
+
+def to_chord_key(chord):
+    """ Turns a compact chord that went through JSON back into a tuple. """
+    degree, quality, inversion, relative = chord
+    return degree, quality, inversion, tuple(relative) if relative else None
+
+
+def read_file(path):
+    with open(path, 'rb') as fp:
+        return fp.read()
+
+
+def content_hash(data):
+    return hashlib.sha256(data).hexdigest()
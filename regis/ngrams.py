@@ -0,0 +1,253 @@
+""" Counts of chord n-grams up to a given order.
+
+An n-gram of chord ids is stored as a single integer, its ids read as the
+digits of a number in base len(vocabulary), first chord most significant.
+All n-grams that continue the same context then make up one range of
+integers, so in a sorted array of them the continuations of a context are
+found with two binary searches.
+
+Exact counts keep a sorted array of n-gram keys and one of counts per
+order. Newly counted keys are buffered and only merged into those when the
+buffer outgrows them or the counts are read, so counting a corpus in many
+small batches does not sort all keys for every batch. For corpora with more
+distinct n-grams than fit in memory, a count-min sketch of fixed size can be
+kept instead. It may overestimate a count, but never underestimates it.
+"""
+
+import numpy as np
+
+# How many keys of one length may be buffered before they are merged, even
+# if fewer are stored
+PENDING_KEYS = 1 << 16
+
+
+class NGramCounts(object):
+    """ Counts of all n-grams of chords of lengths 1 up to order.
+
+    Chords are numbered by vocabulary, corpusfile.standard_vocabulary() by
+    default, which must not grow once counting has started: its size fixes
+    the n-gram keys. With sketch, a (width, depth) pair, counts are kept in
+    a count-min sketch with depth rows of width counters for each order, a
+    power of two; seed picks its hash functions, and sketches can only be
+    merged if they were made with the same seed.
+    """
+
+    def __init__(self, order, vocabulary=None, sketch=None, seed=0):
+        if vocabulary is None:
+            from corpusfile import standard_vocabulary
+
+            vocabulary = standard_vocabulary()
+        self.__order = order
+        self.__vocabulary = vocabulary
+        self.__size = len(vocabulary)
+        if self.__size ** order >= 1 << 63:
+            raise ValueError('{} chords are too many for {}-grams'.format(
+                self.__size, order))
+        self.__totals = [0] * (order + 1)
+
+        self.__sketch = None
+        if sketch is None:
+            self.__keys = [np.zeros(0, dtype=np.int64)
+                           for _ in range(order + 1)]
+            self.__counts = [np.zeros(0, dtype=np.int64)
+                             for _ in range(order + 1)]
+            # Keys and counts not merged into those yet
+            self.__pending = [[] for _ in range(order + 1)]
+            self.__pending_sizes = [0] * (order + 1)
+            return
+        width, depth = sketch
+        bits = max(int(width - 1).bit_length(), 1)
+        self.__sketch = (1 << bits, depth, seed)
+        self.__shift = np.uint64(64 - bits)
+        # Odd multipliers of the multiply-shift hash of each row
+        rng = np.random.default_rng(seed)
+        self.__multipliers = rng.integers(
+            0, 1 << 63, size=(depth, 1), dtype=np.uint64) * np.uint64(2) + \
+            np.uint64(1)
+        self.__tables = np.zeros((order + 1, depth, 1 << bits),
+                                 dtype=np.int64)
+
+    @property
+    def order(self):
+        return self.__order
+
+    @property
+    def vocabulary(self):
+        return self.__vocabulary
+
+    @property
+    def sketch(self):
+        """ The (width, depth, seed) of the sketch, or None if exact. """
+        return self.__sketch
+
+    def total(self, length):
+        """ Returns how many n-grams of length were counted. """
+        return self.__totals[length]
+
+    def add(self, progressions):
+        """ Counts the n-grams in an iterable of lists of Chords. """
+        return self.add_encoded(self.vocabulary.encode(progression)
+                                for progression in progressions)
+
+    def add_encoded(self, progressions):
+        """ Counts the n-grams in an iterable of chord id arrays. """
+        progressions = [np.asarray(ids, dtype=np.int64)
+                        for ids in progressions]
+        if not progressions:
+            return self
+        ids = np.concatenate(progressions)
+        if len(ids) and (ids.min() < 0 or ids.max() >= self.__size):
+            raise ValueError('Chord ids outside the vocabulary the n-gram '
+                             'keys were made for')
+        lengths = np.array([len(progression)
+                            for progression in progressions])
+        # End of the progression of each position
+        ends = np.repeat(np.cumsum(lengths), lengths)
+        keys = np.zeros(len(ids), dtype=np.int64)
+
+        for length in range(1, self.order + 1):
+            count = len(ids) - length + 1
+            if count <= 0:
+                break
+            # Extend the (length - 1)-grams starting at each position
+            keys = keys[:count] * self.__size + ids[length - 1:]
+            ngrams = keys[np.arange(count) + length <= ends[:count]]
+            self.__totals[length] += len(ngrams)
+            self.__add_keys(length, ngrams,
+                            np.ones(len(ngrams), dtype=np.int64))
+        return self
+
+    def merge(self, other):
+        """ Adds the counts of other, which must have been made alike. """
+        if other.order != self.order or other.sketch != self.sketch or \
+                list(other.vocabulary) != list(self.vocabulary):
+            raise ValueError('Only n-gram counts of the same order, '
+                             'vocabulary and sketch can be merged')
+        for length in range(1, self.order + 1):
+            self.__totals[length] += other.total(length)
+        if self.sketch is not None:
+            self.__tables += other.__tables
+            return self
+        for length in range(1, self.order + 1):
+            self.__add_keys(length, *other.__merged(length))
+        return self
+
+    def count(self, ngram):
+        """ Returns how often a sequence of Chords was counted. """
+        ids = [self.vocabulary.get(chord) for chord in ngram]
+        if None in ids or not 1 <= len(ids) <= self.order:
+            return 0
+        key = 0
+        for chord_id in ids:
+            key = key * self.__size + chord_id
+        return int(self.__lookup(len(ids), np.array([key]))[0])
+
+    def continuations(self, context):
+        """ Returns what follows a sequence of Chords, and how often.
+
+        The result is a list of (Chord, count) pairs, most frequent first,
+        for every chord counted after context. context may be empty, and
+        shorter than order.
+        """
+        ids = [self.vocabulary.get(chord) for chord in context]
+        length = len(ids) + 1
+        if length > self.order:
+            raise ValueError('Contexts of {}-gram counts are at most {} '
+                             'chords long'.format(self.order, self.order - 1))
+        if None in ids:
+            return []
+        start = 0
+        for chord_id in ids:
+            start = start * self.__size + chord_id
+        start *= self.__size
+
+        if self.sketch is None:
+            keys, counts = self.__merged(length)
+            low, high = np.searchsorted(keys, [start, start + self.__size])
+            next_ids = keys[low:high] - start
+            counts = counts[low:high]
+        else:
+            next_ids = np.arange(self.__size)
+            counts = self.__lookup(length, start + next_ids)
+            next_ids = next_ids[counts > 0]
+            counts = counts[counts > 0]
+        order = np.argsort(-counts, kind='stable')
+        return list(zip(self.vocabulary.decode(next_ids[order].tolist()),
+                        counts[order].tolist()))
+
+    def most_common(self, length, n):
+        """ Returns the n most common n-grams of length, with their counts.
+
+        The result is a list of (tuple of Chords, count) pairs. Only exact
+        counts can list their n-grams.
+        """
+        if self.sketch is not None:
+            raise ValueError('A sketch cannot list its n-grams')
+        keys, counts = self.__merged(length)
+        order = np.argsort(-counts, kind='stable')[:n]
+        result = []
+        for key, count in zip(keys[order].tolist(), counts[order].tolist()):
+            ids = []
+            for _ in range(length):
+                key, chord_id = divmod(key, self.__size)
+                ids.append(chord_id)
+            result.append((tuple(self.vocabulary.decode(ids[::-1])), count))
+        return result
+
+    def __add_keys(self, length, keys, counts):
+        """ Adds counts of the n-grams of length with the given keys. """
+        if self.sketch is not None:
+            width = self.sketch[0]
+            for row, columns in enumerate(self.__columns(keys)):
+                self.__tables[length, row] += np.bincount(
+                    columns, weights=counts, minlength=width).astype(np.int64)
+            return
+
+        self.__pending[length].append((keys, counts))
+        self.__pending_sizes[length] += len(keys)
+        if self.__pending_sizes[length] > max(len(self.__keys[length]),
+                                              PENDING_KEYS):
+            self.__merge_pending(length)
+
+    def __merged(self, length):
+        """ Returns the sorted keys and counts of the n-grams of length. """
+        if self.__pending[length]:
+            self.__merge_pending(length)
+        return self.__keys[length], self.__counts[length]
+
+    def __merge_pending(self, length):
+        """ Merges the buffered keys of length into the sorted ones. """
+        pending = self.__pending[length]
+        keys = np.concatenate([self.__keys[length]] +
+                              [keys for keys, _ in pending])
+        counts = np.concatenate([self.__counts[length]] +
+                                [counts for _, counts in pending])
+        self.__pending[length] = []
+        self.__pending_sizes[length] = 0
+        if not len(keys):
+            return
+        order = np.argsort(keys, kind='stable')
+        keys = keys[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.__keys[length] = keys[starts]
+        self.__counts[length] = np.add.reduceat(counts[order], starts)
+
+    def __lookup(self, length, keys):
+        """ Returns the counts of the n-grams of length with the given keys.
+        """
+        if self.sketch is not None:
+            tables = self.__tables[length]
+            return np.min([tables[row, columns] for row, columns
+                           in enumerate(self.__columns(keys))], axis=0)
+        stored, counts = self.__merged(length)
+        indices = np.minimum(np.searchsorted(stored, keys),
+                             max(len(stored) - 1, 0))
+        if not len(stored):
+            return np.zeros(len(keys), dtype=np.int64)
+        return np.where(stored[indices] == keys, counts[indices], 0)
+
+    def __columns(self, keys):
+        """ Returns the sketch column of each key in each row. """
+        keys = np.asarray(keys, dtype=np.int64).astype(np.uint64)
+        return ((self.__multipliers * keys[None, :]) >>
+                self.__shift).astype(np.intp)
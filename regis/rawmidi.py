@@ -0,0 +1,192 @@
+""" Fast reader of the parts of MIDI files that the analyzer uses.
+
+mido builds a message object for every event of a file, while the analyzer
+only needs the key signature and tempo of the meta track and the note_off
+events of the voice tracks. read_midi_events walks the raw bytes instead,
+decoding delta times and running status the same way mido does, and keeps
+only those events. Every file mido can read gives the same key, tempo and
+note_offs here.
+"""
+
+from array import array
+
+# mido's names of the (sharps or -flats, minor) key signatures
+KEY_SIGNATURES = {
+    (-7, 0): 'Cb', (-6, 0): 'Gb', (-5, 0): 'Db', (-4, 0): 'Ab',
+    (-3, 0): 'Eb', (-2, 0): 'Bb', (-1, 0): 'F', (0, 0): 'C', (1, 0): 'G',
+    (2, 0): 'D', (3, 0): 'A', (4, 0): 'E', (5, 0): 'B', (6, 0): 'F#',
+    (7, 0): 'C#',
+    (-7, 1): 'Abm', (-6, 1): 'Ebm', (-5, 1): 'Bbm', (-4, 1): 'Fm',
+    (-3, 1): 'Cm', (-2, 1): 'Gm', (-1, 1): 'Dm', (0, 1): 'Am', (1, 1): 'Em',
+    (2, 1): 'Bm', (3, 1): 'F#m', (4, 1): 'C#m', (5, 1): 'G#m',
+    (6, 1): 'D#m', (7, 1): 'A#m',
+}
+
+# Data bytes following each status byte of a channel message, by high nibble
+CHANNEL_DATA_LENGTHS = {0x80: 2, 0x90: 2, 0xa0: 2, 0xb0: 2, 0xc0: 1,
+                        0xd0: 1, 0xe0: 2}
+
+# Data bytes following the status byte of the other non-meta messages
+SYSTEM_DATA_LENGTHS = {0xf1: 1, 0xf2: 2, 0xf3: 1, 0xf6: 0, 0xf8: 0, 0xfa: 0,
+                       0xfb: 0, 0xfc: 0, 0xfe: 0}
+
+KEY_SIGNATURE = 0x59
+SET_TEMPO = 0x51
+
+
+class MidiEvents(object):
+    """ The events of a MIDI file the analyzer uses.
+
+    key_string and tempo are those of the first key_signature and set_tempo
+    events of the first track, or None, as get_key_string and get_tempo
+    return them. note_offs holds a (notes, times) pair of arrays per track,
+    with the delta time in ticks of each note_off event, as mido gives it.
+    """
+
+    def __init__(self, ticks_per_beat, key_string, tempo, note_offs):
+        self.ticks_per_beat = ticks_per_beat
+        self.key_string = key_string
+        self.tempo = tempo
+        self.note_offs = note_offs
+
+    @property
+    def track_count(self):
+        return len(self.note_offs)
+
+    def voice_events(self, tracks):
+        """ Returns an iterator of (note, time) pairs for each of tracks. """
+        return [zip(*self.note_offs[track]) for track in tracks]
+
+
+def load_midi_events(filename):
+    with open(filename, 'rb') as fp:
+        return read_midi_events(fp.read())
+
+
+def read_midi_events(data):
+    """ Reads the MidiEvents of a MIDI file from a bytes-like object.
+
+    Raises OSError or EOFError like mido for malformed or truncated files.
+    """
+    data = memoryview(data)
+    if bytes(data[:4]) != b'MThd':
+        raise OSError('MThd not found. Probably not a MIDI file')
+    header_size = read_uint(data, 4, 4)
+    if len(data) < 8 + header_size or header_size < 6:
+        raise EOFError
+    # Signed, as mido reads them
+    track_count = read_int(data, 10)
+    ticks_per_beat = read_int(data, 12)
+
+    key_string = None
+    tempo = None
+    note_offs = []
+    position = 8 + header_size
+    for track in range(track_count):
+        if len(data) < position + 8:
+            raise EOFError
+        if bytes(data[position:position + 4]) != b'MTrk':
+            raise OSError('no MTrk header at start of track')
+        size = read_uint(data, position + 4, 4)
+        start = position + 8
+        try:
+            notes, times, meta = read_track(data, start, start + size,
+                                            track == 0)
+        except IndexError:
+            raise EOFError from None
+        note_offs.append((notes, times))
+        if track == 0:
+            key_string, tempo = meta
+        position = start + size
+    return MidiEvents(ticks_per_beat, key_string, tempo, note_offs)
+
+
+def read_uint(data, position, size):
+    return int.from_bytes(data[position:position + size], 'big')
+
+
+def read_int(data, position):
+    """ Reads a signed 16-bit integer. """
+    return int.from_bytes(data[position:position + 2], 'big', signed=True)
+
+
+def read_track(data, position, end, read_meta):
+    """ Returns the note_offs of the track between position and end.
+
+    They come as arrays of notes and of delta times, along with the first key
+    string and tempo of the track if read_meta is true.
+    """
+    notes = array('B')
+    times = array('L')
+    key_string = None
+    tempo = None
+    last_status = None
+
+    while position < end:
+        byte = data[position]
+        position += 1
+        delta = byte & 0x7f
+        while byte & 0x80:
+            byte = data[position]
+            position += 1
+            delta = (delta << 7) | (byte & 0x7f)
+
+        status = data[position]
+        if status < 0x80:
+            if last_status is None:
+                raise OSError('running status without last_status')
+            status = last_status
+            if status == 0xf0 or status == 0xf7:
+                position += 1 # mido drops the data byte before a sysex
+        else:
+            position += 1
+            if status != 0xff: # Meta messages don't set running status
+                last_status = status
+
+        if status < 0xf0:
+            kind = status & 0xf0
+            if kind == 0x80:
+                notes.append(data[position])
+                times.append(delta)
+            position += CHANNEL_DATA_LENGTHS[kind]
+        elif status == 0xff:
+            meta_type = data[position]
+            length, position = read_variable_int(data, position + 1)
+            if read_meta:
+                if meta_type == KEY_SIGNATURE and key_string is None:
+                    key_string = decode_key_signature(
+                        data[position:position + length])
+                elif meta_type == SET_TEMPO and tempo is None:
+                    tempo = read_uint(data, position, 3)
+            position += length
+        elif status == 0xf0 or status == 0xf7:
+            length, position = read_variable_int(data, position)
+            position += length
+        else:
+            try:
+                position += SYSTEM_DATA_LENGTHS[status]
+            except KeyError:
+                raise OSError('undefined status byte 0x{:02x}'.format(
+                    status)) from None
+
+    return notes, times, (key_string, tempo)
+
+
+def read_variable_int(data, position):
+    """ Returns a variable-length quantity and the position after it. """
+    value = 0
+    while True:
+        byte = data[position]
+        position += 1
+        value = (value << 7) | (byte & 0x7f)
+        if byte < 0x80:
+            return value, position
+
+
+def decode_key_signature(payload):
+    sharps = payload[0] - 0x100 if payload[0] >= 0x80 else payload[0]
+    try:
+        return KEY_SIGNATURES[(sharps, payload[1])]
+    except KeyError:
+        raise ValueError('Could not decode key signature {} {}'.format(
+            sharps, payload[1])) from None
@@ -0,0 +1,157 @@
+""" Chunking of chorales at any resolution.
+
+The notes of a chorale are turned into arrays of absolute tick intervals in
+one pass over the voices. Chunks on any grid of slice boundaries are then
+looked up from those arrays with searchsorted, so a chorale can be chunked
+in beats, eighths, measures or between note onsets without walking its
+tracks again.
+"""
+
+import numpy as np
+
+
+class NoteIntervals(object):
+    """ The sounding notes of a chorale, as parallel arrays.
+
+    Note i is pitch class classes[i] of voice voices[i], sounding from tick
+    starts[i] up to but not including ends[i]. Notes are in voice order, bass
+    first, and in order of time within each voice.
+    """
+
+    def __init__(self, starts, ends, classes, voices, ticks_per_beat):
+        self.__starts = starts
+        self.__ends = ends
+        self.__classes = classes
+        self.__voices = voices
+        self.__ticks_per_beat = ticks_per_beat
+
+    @classmethod
+    def from_voices(cls, voices, ticks_per_beat):
+        """ Returns the intervals of voices, as iter_chunks takes them.
+
+        voices holds an iterable of (note, duration) pairs per voice, bass
+        first. Notes of duration 0 never sound and are left out.
+        """
+        starts = []
+        ends = []
+        classes = []
+        numbers = []
+        for number, voice in enumerate(voices):
+            events = np.array(list(voice), dtype=np.int64).reshape(-1, 2)
+            notes, durations = events[:, 0], events[:, 1]
+            voice_ends = np.cumsum(durations)
+            sounding = durations > 0
+            starts.append((voice_ends - durations)[sounding])
+            ends.append(voice_ends[sounding])
+            classes.append(notes[sounding] % 12)
+            numbers.append(np.full(sounding.sum(), number))
+        if not starts:
+            starts = ends = classes = numbers = [np.zeros(0, dtype=np.int64)]
+        return cls(np.concatenate(starts), np.concatenate(ends),
+                   np.concatenate(classes), np.concatenate(numbers),
+                   ticks_per_beat)
+
+    @property
+    def starts(self):
+        return self.__starts
+
+    @property
+    def ends(self):
+        return self.__ends
+
+    @property
+    def classes(self):
+        return self.__classes
+
+    @property
+    def voices(self):
+        return self.__voices
+
+    @property
+    def ticks_per_beat(self):
+        return self.__ticks_per_beat
+
+    @property
+    def length(self):
+        """ The tick at which the last note ends. """
+        return int(self.ends.max()) if len(self.ends) else 0
+
+    def grid(self, resolution=None):
+        """ Returns slice boundaries every resolution ticks.
+
+        resolution defaults to a beat. The last slice is the first to reach
+        the end of the last note.
+        """
+        if resolution is None:
+            resolution = self.ticks_per_beat
+        return np.arange(0, self.length + resolution, resolution)
+
+    def onset_grid(self):
+        """ Returns slice boundaries at every tick where a note starts.
+
+        Each slice then holds one sonority, along with the notes held over
+        into it.
+        """
+        return np.union1d(self.starts, [0, self.length])
+
+    def chunks(self, boundaries=None):
+        """ Returns the pitch classes sounding in each slice.
+
+        boundaries are the increasing ticks slices start at, followed by the
+        tick the last one ends at, and default to grid(). Each chunk lists
+        every pitch class sounding in its slice once, in voice order, bass
+        first, and in order of time within a voice. With the default
+        boundaries they are the same chunks iter_chunks gives.
+        """
+        if boundaries is None:
+            boundaries = self.grid()
+        slices, pieces = self.__split(boundaries)
+        count = max(len(boundaries) - 1, 0)
+
+        # The notes are already in chunk order within each slice, so a
+        # stable sort by slice followed by dropping repeated pitch classes
+        # leaves each chunk in order.
+        order = np.argsort(slices, kind='stable')
+        keys = slices[order] * 12 + self.classes[pieces[order]]
+        _, first = np.unique(keys, return_index=True)
+        first.sort()
+        slices = slices[order[first]]
+        classes = self.classes[pieces[order[first]]].tolist()
+
+        starts = np.searchsorted(slices, np.arange(count + 1)).tolist()
+        return [classes[start:end]
+                for start, end in zip(starts[:-1], starts[1:])]
+
+    def durations(self, boundaries=None):
+        """ Returns how long each pitch class sounds in each slice.
+
+        The result is a (slices, 12) array of ticks, boundaries as for
+        chunks.
+        """
+        if boundaries is None:
+            boundaries = self.grid()
+        boundaries = np.asarray(boundaries)
+        slices, pieces = self.__split(boundaries)
+        overlaps = np.minimum(self.ends[pieces], boundaries[slices + 1]) - \
+            np.maximum(self.starts[pieces], boundaries[slices])
+        durations = np.zeros((max(len(boundaries) - 1, 0), 12))
+        np.add.at(durations, (slices, self.classes[pieces]), overlaps)
+        return durations
+
+    def __split(self, boundaries):
+        """ Splits every note into one piece per slice it sounds in.
+
+        Returns the slice of each piece and the note it is a piece of. Notes
+        outside the boundaries are clipped to them.
+        """
+        boundaries = np.asarray(boundaries)
+        count = len(boundaries) - 1
+        first = np.searchsorted(boundaries, self.starts, side='right') - 1
+        last = np.searchsorted(boundaries, self.ends, side='left') - 1
+        first = np.maximum(first, 0)
+        last = np.minimum(last, count - 1)
+        spans = np.maximum(last - first + 1, 0)
+        pieces = np.repeat(np.arange(len(spans)), spans)
+        slices = first[pieces] + np.arange(len(pieces)) - \
+            np.repeat(np.cumsum(spans) - spans, spans)
+        return slices, pieces
@@ -0,0 +1,109 @@
+""" Generator of synthetic chorales for benchmarking.
+
+The chorales are random but valid input for the analyzer: a meta track with
+tempo, time and key signatures followed by soprano, alto, tenor and bass
+tracks, with each beat voicing one of the common chords of the key and the
+occasional eighth-note passing motion or half note.
+"""
+
+import argparse
+import os
+import random
+
+from musictheory import Key
+
+# (lowest, highest) MIDI note of soprano, alto, tenor and bass
+VOICE_RANGES = ((60, 79), (55, 74), (48, 67), (40, 60))
+
+KEY_STRINGS = ('C', 'G', 'D', 'A', 'E', 'F', 'Bb', 'Eb',
+               'Am', 'Em', 'Bm', 'F#m', 'Dm', 'Gm', 'Cm')
+
+
+def voice_chord(rng, classes):
+    """ Returns soprano, alto, tenor and bass notes sounding classes. """
+    bass_class = classes[0] if rng.random() < 0.7 else rng.choice(classes)
+    notes = []
+    for (lowest, highest), class_number in zip(
+            VOICE_RANGES, [rng.choice(classes) for _ in range(3)] +
+            [bass_class]):
+        candidates = [note for note in range(lowest, highest + 1)
+                      if note % 12 == class_number]
+        notes.append(rng.choice(candidates))
+    return notes
+
+
+def generate_chorale(rng, key_string, beats, ticks_per_beat=480):
+    """ Returns a random chorale in key_string as a mido MidiFile. """
+    from mido import Message, MetaMessage, MidiFile, MidiTrack
+
+    key = Key.from_str(key_string)
+    # Favour the chords of the key itself over those of related keys.
+    chords = key.common_chords()
+    weights = [4 if chord.relative is None else 1 for chord in chords]
+
+    midi_file = MidiFile(ticks_per_beat=ticks_per_beat)
+    meta_track = MidiTrack([
+        MetaMessage('set_tempo', tempo=rng.randrange(600000, 1000000, 50000)),
+        MetaMessage('time_signature', numerator=4, denominator=4),
+        MetaMessage('key_signature', key=key_string),
+        MetaMessage('end_of_track', time=beats * ticks_per_beat)])
+    midi_file.tracks.append(meta_track)
+
+    voices = [[] for _ in VOICE_RANGES]
+    beat = 0
+    while beat < beats:
+        chord = rng.choices(chords, weights)[0]
+        notes = voice_chord(rng, chord.equivalence_classes(key))
+        length = 2 if beat + 1 < beats and rng.random() < 0.15 else 1
+        for voice, note in zip(voices, notes):
+            if length == 1 and rng.random() < 0.2:
+                # Two eighths, the second a step away
+                step = rng.choice((-2, -1, 1, 2))
+                half = ticks_per_beat // 2
+                voice.append((note, half))
+                voice.append((note + step, ticks_per_beat - half))
+            else:
+                voice.append((note, length * ticks_per_beat))
+        beat += length
+
+    for voice in voices:
+        track = MidiTrack()
+        for note, duration in voice:
+            track.append(Message('note_on', note=note, velocity=80, time=0))
+            track.append(Message('note_off', note=note, velocity=0,
+                                 time=duration))
+        track.append(MetaMessage('end_of_track', time=0))
+        midi_file.tracks.append(track)
+    return midi_file
+
+
+def generate_corpus(directory, count, seed=0, min_beats=32, max_beats=96):
+    """ Writes count random chorales to directory and returns their paths.
+
+    The same seed always gives the same corpus.
+    """
+    rng = random.Random(seed)
+    os.makedirs(directory, exist_ok=True)
+    paths = []
+    for number in range(count):
+        key_string = rng.choice(KEY_STRINGS)
+        midi_file = generate_chorale(rng, key_string,
+                                     rng.randint(min_beats, max_beats))
+        path = os.path.join(directory, 'synthetic{:06d}.mid'.format(number))
+        midi_file.save(path)
+        paths.append(path)
+    return paths
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(
+        description='Write a corpus of random chorales.')
+    parser.add_argument('directory')
+    parser.add_argument('-n', '--count', type=int, default=1000)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    generate_corpus(args.directory, args.count, seed=args.seed)
+
+
+if __name__ == '__main__':
+    main()
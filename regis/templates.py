@@ -0,0 +1,278 @@
+""" Precomputed chord templates.
+
+The analyzer matches each beat against the common chords of the chorale's
+key. Spelling those chords walks the interval arithmetic of musictheory for
+every new key, so this module tabulates them once.
+
+The common chords of every key of a scale are the same chords transposed,
+so the shared table only spells the chords of one reference key per scale.
+relative_templates gives that row with pitch classes counted up from the
+tonic, and the templates of any other key are transposed from it.
+"""
+
+from musictheory import Key
+from util import rotate_mask
+
+# The key relative_templates spells the templates of each scale in. Every key
+# of a scale has the same template chords, in the same order, relative to its
+# tonic.
+REFERENCE_KEYS = {'M': 'C', 'm': 'Am'}
+
+
+class TemplateTable(object):
+    """ Dense table of chord templates, indexed by (key id, chord id).
+
+    chords is the list of template chords of all keys; common[key_id] lists
+    the chord ids of that key's common_chords, in the same order. masks,
+    equivalence_classes and pitch_classes hold each chord spelled in each key,
+    the latter two padded with -1 and None to four chord tones. Chords that
+    cannot be spelled in a key have a zero mask there.
+    """
+
+    def __init__(self, key_strings, chords, common, masks, equivalence_classes,
+                 pitch_classes):
+        import numpy as np
+
+        self.__key_strings = tuple(key_strings)
+        self.__chords = tuple(chords)
+        self.__common = tuple(tuple(ids) for ids in common)
+        self.__masks = np.asarray(masks, dtype=np.uint16)
+        self.__equivalence_classes = np.asarray(equivalence_classes,
+                                                dtype=np.int8)
+        self.__pitch_classes = tuple(tuple(row) for row in pitch_classes)
+
+        self.__key_ids = {Key.from_str(key_string): key_id
+                          for key_id, key_string
+                          in enumerate(self.__key_strings)}
+        self.__rows = {}
+        self.__relative_rows = {}
+        self.__candidates = {}
+
+    @property
+    def key_strings(self):
+        return self.__key_strings
+
+    @property
+    def chords(self):
+        return self.__chords
+
+    @property
+    def common(self):
+        return self.__common
+
+    @property
+    def masks(self):
+        return self.__masks
+
+    @property
+    def equivalence_classes(self):
+        return self.__equivalence_classes
+
+    @property
+    def pitch_classes(self):
+        return self.__pitch_classes
+
+    def key_id(self, key):
+        """ Returns the row of key in the table, or None if it has none. """
+        return self.__key_ids.get(key)
+
+    def templates(self, key):
+        """ Returns the common chords of key with their masks and classes.
+
+        The result is a (chords, masks, equivalence classes) triple of
+        tuples, in the order of key.common_chords(). Keys outside the table
+        get the relative_templates of their scale, transposed to their
+        tonic.
+        """
+        row = self.__rows.get(key)
+        if row is not None:
+            return row
+
+        key_id = self.key_id(key)
+        if key_id is None:
+            chords, masks, classes = self.relative_templates(key.scale)
+            tonic = key.tonic.class_number()
+            row = (chords,
+                   tuple(rotate_mask(mask, -tonic % 12) for mask in masks),
+                   tuple(tuple((class_number + tonic) % 12
+                               for class_number in chord_classes)
+                         for chord_classes in classes))
+        else:
+            ids = self.common[key_id]
+            masks = self.masks[key_id].tolist()
+            classes = self.equivalence_classes[key_id].tolist()
+            row = (tuple(self.chords[chord_id] for chord_id in ids),
+                   tuple(masks[chord_id] for chord_id in ids),
+                   tuple(tuple(class_number for class_number
+                               in classes[chord_id] if class_number >= 0)
+                         for chord_id in ids))
+        self.__rows[key] = row
+        return row
+
+    def relative_templates(self, scale):
+        """ Returns the templates of every key of scale ('M' or 'm').
+
+        They are a triple like templates returns, with masks and equivalence
+        classes transposed so that the tonic is pitch class 0.
+        """
+        row = self.__relative_rows.get(scale)
+        if row is None:
+            key = Key.from_str(REFERENCE_KEYS[scale])
+            tonic = key.tonic.class_number()
+            chords, masks, classes = self.templates(key)
+            row = (chords,
+                   tuple(rotate_mask(mask, tonic) for mask in masks),
+                   tuple(tuple((class_number - tonic) % 12
+                               for class_number in chord_classes)
+                         for chord_classes in classes))
+            self.__relative_rows[scale] = row
+        return row
+
+    def candidates(self, scale, frequencies=None):
+        """ Returns the relative_templates of scale as a CandidateList.
+
+        frequencies is passed on to CandidateList; without it the list is
+        built once and shared.
+        """
+        if frequencies is not None:
+            return CandidateList(*self.relative_templates(scale),
+                                 frequencies=frequencies)
+        candidates = self.__candidates.get(scale)
+        if candidates is None:
+            candidates = CandidateList(*self.relative_templates(scale))
+            self.__candidates[scale] = candidates
+        return candidates
+
+    @classmethod
+    def build(cls, key_strings=tuple(REFERENCE_KEYS.values())):
+        """ Spells the common chords of every key that can be spelled. """
+        keys = []
+        for key_string in key_strings:
+            key = Key.from_str(key_string)
+            if any(cls.__spelling(chord, key) is None
+                   for chord in key.common_chords()):
+                # Some chord would need triple sharps or flats
+                continue
+            keys.append((key_string, key))
+
+        chord_ids = {}
+        common = []
+        for _, key in keys:
+            ids = []
+            for chord in key.common_chords():
+                ids.append(chord_ids.setdefault(chord, len(chord_ids)))
+            common.append(ids)
+        chords = sorted(chord_ids, key=chord_ids.get)
+
+        masks = []
+        equivalence_classes = []
+        pitch_classes = []
+        for _, key in keys:
+            cells = [cls.__spell(chord, key) for chord in chords]
+            masks.append([mask for mask, _, _ in cells])
+            equivalence_classes.append([classes for _, classes, _ in cells])
+            pitch_classes.append([spelling for _, _, spelling in cells])
+
+        return cls([key_string for key_string, _ in keys], chords, common,
+                   masks, equivalence_classes, pitch_classes)
+
+    @staticmethod
+    def __spell(chord, key):
+        """ Returns the mask, classes and pitch classes of chord in key.
+
+        Chords that cannot be spelled in key get an empty mask, as they never
+        occur among its common chords.
+        """
+        spelling = TemplateTable.__spelling(chord, key)
+        if spelling is None:
+            return 0, [-1] * 4, (None,) * 4
+        padding = 4 - len(spelling)
+        return (chord.mask(key),
+                list(chord.equivalence_classes(key)) + [-1] * padding,
+                spelling + (None,) * padding)
+
+    @staticmethod
+    def __spelling(chord, key):
+        """ Returns the pitch classes of chord in key, or None if it cannot
+        be spelled there.
+        """
+        pitch_classes = tuple(chord.pitch_classes(key))
+        if any(pitch_class is None for pitch_class in pitch_classes):
+            return None
+        return pitch_classes
+
+
+class CandidateList(object):
+    """ Templates in the order they are tried against a chunk.
+
+    Templates with the same mask as one tried before them are dropped, as
+    they could never be matched. Given frequencies, a mapping from chord
+    labels (scale degree, quality, relative) to how often they occur, the
+    templates are tried most frequent first, which changes which of several
+    supersets of a chunk wins. Without it they keep the order of
+    common_chords and match exactly as before.
+    """
+
+    def __init__(self, chords, masks, classes, frequencies=None):
+        import numpy as np
+
+        order = range(len(chords))
+        if frequencies:
+            # A stable sort keeps chords of equal frequency in their order
+            order = sorted(order, key=lambda index: -frequencies.get(
+                (chords[index].scale_degree, chords[index].quality,
+                 chords[index].relative), 0))
+        kept = []
+        seen = set()
+        for index in order:
+            if masks[index] not in seen:
+                seen.add(masks[index])
+                kept.append(index)
+
+        self.__chords = tuple(chords[index] for index in kept)
+        self.__masks = tuple(masks[index] for index in kept)
+        self.__classes = tuple(classes[index] for index in kept)
+
+        # First template containing each of the 4096 possible chunk masks
+        chunk_masks = np.arange(1 << 12)[:, None]
+        contains = (chunk_masks & np.array(self.__masks, dtype=np.int64)) \
+            == chunk_masks
+        supersets = np.where(contains.any(axis=1), contains.argmax(axis=1),
+                             -1)
+        self.__supersets = supersets.tolist()
+
+    @property
+    def chords(self):
+        return self.__chords
+
+    @property
+    def masks(self):
+        return self.__masks
+
+    @property
+    def classes(self):
+        return self.__classes
+
+    def superset(self, chunk_mask):
+        """ Returns the index of the first template containing a chunk.
+
+        Returns None if no template contains every pitch class of the chunk.
+        """
+        index = self.__supersets[chunk_mask]
+        return index if index >= 0 else None
+
+    def __len__(self):
+        return len(self.__chords)
+
+
+_table = None
+
+def template_table():
+    """ Returns the shared TemplateTable of the REFERENCE_KEYS.
+
+    It is built on first use.
+    """
+    global _table
+    if _table is None:
+        _table = TemplateTable.build()
+    return _table
@@ -1,9 +1,21 @@
+import contextlib
+import io
 import os
+import subprocess
+import sys
 import unittest
 
 from mido import MidiFile
 
-from analyze import chunks
+from analyze import (ANALYZER_VERSION, ChordProgression, batch_progressions,
+                     cache_version, chunks, generate_transition_matrix,
+                     get_key_string, get_n_most_common, iter_chunks, main,
+                     match_mask, match_masks, set_template_frequencies)
+from musictheory import Chord, Key
+from util import rotate_mask, to_mask
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
 
 class TestChunker (unittest.TestCase):
 
@@ -15,5 +27,179 @@ class TestChunker (unittest.TestCase):
             for produced, expected in zip(chunks(midi_file), expected_chunks):
                 self.assertEqual(produced, expected)
 
+    def test_streaming(self):
+        consumed = []
+
+        def voice(events):
+            for event in events:
+                consumed.append(event)
+                yield event
+
+        # Half-beat notes against a held bass, then a rest of the stream.
+        bass = voice([(48, 4), (43, 4), (48, 4)])
+        soprano = voice([(64, 2), (62, 2), (67, 4), (64, 2), (67, 2)])
+        produced = iter_chunks([bass, soprano], 4)
+
+        self.assertEqual(next(produced), [0, 4, 2])
+        # Only as much as the first beat needed was read.
+        self.assertEqual(len(consumed), 3)
+        self.assertEqual(list(produced), [[7], [0, 4, 7]])
+
+class TestMatching (unittest.TestCase):
+
+    def test_match_mask(self):
+        c_major = to_mask([0, 4, 7])
+        g_seventh = to_mask([7, 11, 2, 5])
+        templates = (c_major, g_seventh, to_mask([7, 11, 2]))
+
+        # The first superset wins, even over an exact match.
+        self.assertEqual(match_mask(to_mask([7, 11]), templates), 1)
+        self.assertEqual(match_mask(to_mask([0, 4]), templates), 0)
+        # Otherwise the best Jaccard similarity, earliest on ties.
+        self.assertEqual(match_mask(to_mask([0, 4, 7, 9]), templates), 0)
+        self.assertEqual(match_mask(to_mask([0, 7, 11]), templates), 0)
+        self.assertIsNone(match_mask(to_mask([1, 3]), templates))
+
+    def test_batch_progressions(self):
+        # Chorales in several keys, several to a key, come out as
+        # from_chunks analyzes each of them.
+        chunk_lists = {}
+        for file_ in ('000206b_.mid', '004006b_.mid', '000306b_.mid',
+                      '001707b_.mid', '000408b_.mid'):
+            with MidiFile(os.path.join(CORPUS, file_)) as midi_file:
+                key_string = get_key_string(midi_file)
+                chunk_lists.setdefault(key_string, []).append(
+                    chunks(midi_file))
+        self.assertEqual(len(chunk_lists), 3)
+        for key_string, key_chunk_lists in chunk_lists.items():
+            key = Key.from_str(key_string)
+            expected = []
+            for chunk_list in key_chunk_lists:
+                cp = ChordProgression()
+                cp.from_chunks(key, chunk_list)
+                expected.append(cp.progression)
+            self.assertEqual(batch_progressions(key, key_chunk_lists),
+                             expected)
+            self.assertEqual(batch_progressions(key, key_chunk_lists,
+                                                key.common_chords()),
+                             expected)
+
+        # With fewer templates some chunks match none, and keep the chord
+        # before them in root position; a chorale cannot start with one.
+        key = Key.from_str('C')
+        I, IV, V = Chord(1, 'M', 0), Chord(4, 'M', 0), Chord(5, 'M', 0)
+        chunk_lists = [[[0, 4, 7], [4, 0, 7], [1, 3], [2, 7, 11],
+                        [6, 8, 10], [5, 9, 0, 2]], [], [[7, 11, 2]]]
+        self.assertEqual(batch_progressions(key, chunk_lists, [I, IV, V]),
+                         [[I, Chord(1, 'M', 1), I, Chord(5, 'M', 2), V, IV],
+                          [], [V]])
+        self.assertRaises(ValueError, batch_progressions, key,
+                          [[[7, 11, 2]], [[1, 3]]], [I, IV, V])
+
+    def test_transposition(self):
+        with MidiFile('test_chunking.mid') as midi_file:
+            chunk_list = chunks(midi_file)
+        expected = ChordProgression()
+        expected.from_chunks(Key.from_str('Em'), chunk_list)
+        # The same chunks a major third higher, in the key a third higher
+        transposed = ChordProgression()
+        transposed.from_chunks(Key.from_str('G#m'),
+                               [[(class_number + 4) % 12
+                                 for class_number in chunk]
+                                for chunk in chunk_list])
+        self.assertEqual(transposed.progression, expected.progression)
+
+    def test_template_frequencies(self):
+        chunk_list = [[0, 4, 7], [0], [5, 0]]
+        key = Key.from_str('C')
+        expected = ChordProgression()
+        expected.from_chunks(key, chunk_list)
+        self.assertEqual(expected.progression[1], Chord(1, 'M', 0))
+        try:
+            set_template_frequencies({'M': {(4, 'M', None): 1}})
+            self.assertNotEqual(cache_version(), ANALYZER_VERSION)
+            reordered = ChordProgression()
+            reordered.from_chunks(key, chunk_list)
+        finally:
+            set_template_frequencies(None)
+        self.assertEqual(reordered.progression,
+                         [Chord(1, 'M', 0), Chord(4, 'M', 2),
+                          Chord(4, 'M', 0)])
+        self.assertEqual(cache_version(), ANALYZER_VERSION)
+        restored = ChordProgression()
+        restored.from_chunks(key, chunk_list)
+        self.assertEqual(restored.progression, expected.progression)
+
+    def test_rotate_mask(self):
+        self.assertEqual(rotate_mask(to_mask([2, 6, 9]), 2),
+                         to_mask([0, 4, 7]))
+        self.assertEqual(rotate_mask(to_mask([0, 11]), 11),
+                         to_mask([1, 0]))
+        self.assertEqual(rotate_mask(to_mask([0, 4, 7]), 0),
+                         to_mask([0, 4, 7]))
+
+    def test_match_masks(self):
+        templates = (to_mask([0, 4, 7]), to_mask([7, 11, 2, 5]),
+                     to_mask([7, 11, 2]), to_mask([9, 0, 4]))
+        chunk_masks = range(1 << 12)
+        expected = [match_mask(mask, templates) for mask in chunk_masks]
+        expected = [-1 if index is None else index for index in expected]
+        self.assertEqual(match_masks(chunk_masks, templates).tolist(),
+                         expected)
+
+class TestStatistics (unittest.TestCase):
+
+    def test_get_n_most_common(self):
+        histogram = {'I': 5, 'IV': 3, 'V': 5, 'vi': 3, 'ii': 1}
+        self.assertEqual(get_n_most_common(histogram, 3), ['I', 'V', 'IV'])
+        # Equal counts give distinct keys.
+        self.assertEqual(get_n_most_common(histogram, 4),
+                         ['I', 'V', 'IV', 'vi'])
+        self.assertEqual(len(get_n_most_common(histogram, 10)), 5)
+
+    def test_generate_transition_matrix(self):
+        I, IV, V, vi = (Chord(1, 'M', 0), Chord(4, 'M', 0), Chord(5, 'M', 0),
+                        Chord(6, 'm', 0))
+        # vi only ends a progression before it is followed by anything.
+        progressions = [[I, vi], [V, I, IV], [], [vi, V, I], [IV, I, V]]
+        histogram, transition_matrix = generate_transition_matrix(
+            progressions)
+        self.assertEqual(list(histogram.items()),
+                         [(I, 3), (V, 2), (vi, 1), (IV, 1)])
+        self.assertEqual(list(transition_matrix.items()),
+                         [((I, vi), 1), ((V, I), 2), ((I, IV), 1),
+                          ((vi, V), 1), ((IV, I), 1), ((I, V), 1)])
+        self.assertEqual(generate_transition_matrix([]), ({}, {}))
+
+class TestImport (unittest.TestCase):
+
+    def test_import_is_lazy(self):
+        # Importing the analyzer must not parse MIDI or load mido and numpy.
+        code = ('import sys, analyze; '
+                'print("mido" in sys.modules, "numpy" in sys.modules)')
+        output = subprocess.check_output(
+            [sys.executable, '-c', code],
+            cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        self.assertEqual(output.split(), [b'False', b'False'])
+
+class TestCommandLine (unittest.TestCase):
+
+    def test_rejected_options(self):
+        # Options that would be ignored, and counts below 1, are errors.
+        for argv in (['--hmm', '-j', '2'], ['--hmm', '--cache-dir', 'c'],
+                     ['--hmm', '--index', 'i.json'], ['--em', '3'],
+                     ['--top', '0'], ['--min-count', '-1'],
+                     ['--load', 'c.bin', 'corpus/'],
+                     ['--load', 'c.bin', '-j', '2'],
+                     ['--load', 'c.bin', '--cache-dir', 'c'],
+                     ['--load', 'c.bin', '--raw-midi'],
+                     ['--load', 'c.bin', '--index', 'i.json'],
+                     ['--load', 'c.bin', '--save', 'd.bin'],
+                     ['--load', 'c.bin', '--order-by', 'd.bin'],
+                     ['--load', 'c.bin', '--hmm']):
+            with contextlib.redirect_stderr(io.StringIO()):
+                with self.assertRaises(SystemExit):
+                    main(argv)
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,88 @@
+import tempfile
+import unittest
+
+from cache import (AnalysisCache, LRUCache, cache_stats, set_capacity,
+                   set_counting)
+
+class TestLRUCache(unittest.TestCase):
+
+    def setUp(self):
+        set_counting(True)
+
+    def tearDown(self):
+        set_counting(False)
+
+    def test_eviction(self):
+        cache = LRUCache('test_eviction', 2)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.put('c', 3)
+
+        # 'b' was the least recently used entry.
+        self.assertNotIn('b', cache)
+        self.assertEqual(cache.get('b', 0), 0)
+        self.assertEqual(cache.get('c'), 3)
+        self.assertEqual(tuple(cache.stats()), (2, 1, 1, 2, 2))
+
+        cache.capacity = 1
+        self.assertEqual(len(cache), 1)
+        self.assertIn('c', cache)
+
+    def test_get_or_create(self):
+        cache = LRUCache('test_get_or_create')
+        self.assertEqual(cache.get_or_create('a', max, 1, 2), 2)
+        self.assertEqual(cache.get_or_create('a', min, 1, 2), 2)
+        self.assertEqual(cache.put('a', 3), 2)
+        self.assertEqual(cache_stats()['test_get_or_create'].hits, 1)
+
+    def test_counting(self):
+        cache = LRUCache('test_counting', 1)
+        set_counting(False)
+        cache.get_or_create('a', max, 1, 2)
+        cache.get_or_create('a', max, 1, 2)
+        cache.put('b', 3)
+        self.assertEqual(tuple(cache.stats()), (0, 0, 0, 1, 1))
+
+    def test_shared_name(self):
+        # A module imported twice creates its caches twice; the second keeps
+        # the first from being forgotten, and both are counted.
+        first = LRUCache('test_shared_name')
+        second = LRUCache('test_shared_name')
+        first.get_or_create('a', max, 1, 2)
+        second.get_or_create('a', max, 1, 2)
+        second.get('a')
+        self.assertEqual(tuple(cache_stats()['test_shared_name']),
+                         (1, 2, 0, 2, None))
+        set_capacity('test_shared_name', 0)
+        self.assertEqual((len(first), len(second)), (0, 0))
+
+class TestAnalysisCache(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_roundtrip(self):
+        cache = AnalysisCache(self.directory.name, 1)
+        digest = cache.digest(b'MThd')
+        self.assertIsNone(cache.get(digest))
+
+        cache.put(digest, {'key': 'G', 'chunks': [[7, 11, 2]]})
+        self.assertEqual(cache.get(digest),
+                         {'key': 'G', 'chunks': [[7, 11, 2]]})
+
+    def test_digest(self):
+        cache = AnalysisCache(self.directory.name, 1)
+        self.assertEqual(cache.digest(b'MThd'), cache.digest(b'MThd'))
+        self.assertNotEqual(cache.digest(b'MThd'), cache.digest(b'MTrk'))
+
+        # Entries of other analyzer versions are never found.
+        newer_cache = AnalysisCache(self.directory.name, 2)
+        self.assertNotEqual(cache.digest(b'MThd'), newer_cache.digest(b'MThd'))
+
+
+if __name__ == '__main__':
+    unittest.main()
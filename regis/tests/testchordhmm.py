@@ -0,0 +1,170 @@
+import itertools
+import os
+import unittest
+from unittest import mock
+
+from mido import MidiFile
+import numpy as np
+
+from analyze import ChordProgression, chunks, get_key_string
+from chordhmm import ChordHMM, batches, expectations, viterbi
+from chordstats import TransitionCounts
+from musictheory import Chord, Key
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+def path_scores(log_initial, log_transitions, emissions, length):
+    """ Yields every state sequence of length and its log score. """
+    size = len(log_initial)
+    for path in itertools.product(range(size), repeat=length):
+        score = log_initial[path[0]] + emissions[0, path[0]]
+        for beat in range(1, length):
+            score += log_transitions[path[beat - 1], path[beat]] + \
+                emissions[beat, path[beat]]
+        yield path, score
+
+class TestRecursions(unittest.TestCase):
+
+    def setUp(self):
+        rng = np.random.default_rng(1)
+        self.log_initial = np.log(rng.dirichlet(np.ones(3)))
+        self.log_transitions = np.log(rng.dirichlet(np.ones(3), size=3))
+        self.emissions = np.log(rng.random((3, 5, 3)))
+        self.lengths = np.array([5, 4, 2])
+
+    def test_viterbi(self):
+        paths = viterbi(self.log_initial, self.log_transitions,
+                        self.emissions, self.lengths)
+        for row, length in enumerate(self.lengths):
+            best = max(path_scores(self.log_initial, self.log_transitions,
+                                   self.emissions[row], length),
+                       key=lambda item: item[1])[0]
+            self.assertEqual(paths[row, :length].tolist(), list(best))
+
+    def test_expectations(self):
+        log_likelihood, posteriors, transitions = expectations(
+            self.log_initial, self.log_transitions, self.emissions,
+            self.lengths)
+
+        expected_likelihood = 0
+        expected_transitions = np.zeros((3, 3))
+        for row, length in enumerate(self.lengths):
+            scores = list(path_scores(self.log_initial, self.log_transitions,
+                                      self.emissions[row], length))
+            total = np.logaddexp.reduce([score for _, score in scores])
+            expected_likelihood += total
+            expected_posteriors = np.zeros((length, 3))
+            for path, score in scores:
+                weight = np.exp(score - total)
+                expected_posteriors[np.arange(length), path] += weight
+                for from_state, to_state in zip(path, path[1:]):
+                    expected_transitions[from_state, to_state] += weight
+            np.testing.assert_allclose(posteriors[row, :length],
+                                       expected_posteriors)
+            self.assertFalse(posteriors[row, length:].any())
+
+        self.assertAlmostEqual(log_likelihood, expected_likelihood)
+        np.testing.assert_allclose(transitions, expected_transitions)
+
+class TestChordHMM(unittest.TestCase):
+
+    def setUp(self):
+        self.chorales = []
+        progressions = []
+        for file_ in ('000206b_.mid', '000408b_.mid', 'test_chunking.mid'):
+            path = os.path.join(CORPUS, file_) if file_.startswith('0') \
+                else file_
+            with MidiFile(path) as midi_file:
+                key = Key.from_str(get_key_string(midi_file))
+                chunk_list = chunks(midi_file)
+            cp = ChordProgression()
+            cp.from_chunks(key, chunk_list)
+            self.chorales.append((key, chunk_list))
+            progressions.append(cp.progression)
+        self.model = ChordHMM.from_counts('m',
+                                          TransitionCounts().add(progressions))
+
+    def test_decode(self):
+        progressions = self.model.decode(self.chorales +
+                                         [(Key.from_str('Am'), [])])
+        self.assertEqual([len(progression) for progression in progressions],
+                         [len(chunk_list) for _, chunk_list in self.chorales]
+                         + [0])
+        for progression in progressions:
+            for chord in progression:
+                self.assertIsInstance(chord, Chord)
+
+        # An unambiguous triad is the chord it spells, inversion included.
+        key = Key.from_str('Am')
+        progression = self.model.decode([(key, [[4, 8, 11], [0, 4, 9]])])[0]
+        self.assertEqual(progression, [Chord(5, 'M', 0), Chord(1, 'm', 1)])
+
+    def test_transitions_settle_ambiguity(self):
+        # C major is III of A minor, and also I of the relative major. With
+        # uniform transitions the first template wins, as in from_chunks.
+        key = Key.from_str('Am')
+        chunk_list = [[9, 0, 4], [0, 4, 7]]
+        progression = ChordHMM('m').decode([(key, chunk_list)])[0]
+        self.assertEqual(progression[1], Chord(3, 'M', 0))
+
+        # A prior that expects the relative major makes the beat its I.
+        labels = ChordHMM('m').labels
+        transitions = np.ones((len(labels), len(labels)))
+        tonic = labels.index((1, 'm', None))
+        relative_tonic = labels.index((1, 'M', (3, 'M')))
+        transitions[tonic, relative_tonic] = 1000
+        model = ChordHMM('m', transitions=transitions)
+        progression = model.decode([(key, chunk_list)])[0]
+        self.assertEqual(progression[1], Chord(1, 'M', 0, (3, 'M')))
+
+    def test_initial_weights(self):
+        # Only chorales that start on i make it the likeliest first state.
+        counts = TransitionCounts().add([[Chord(5, 'M', 0)] * 8])
+        model = ChordHMM.from_counts('m', counts,
+                                     first_chords=[Chord(1, 'm', 1)] * 3)
+        tonic = model.labels.index((1, 'm', None))
+        self.assertEqual(np.argmax(model.log_initial), tonic)
+        self.assertAlmostEqual(np.exp(model.log_initial[tonic]),
+                               4 / (3 + len(model.labels)))
+
+    def test_batches(self):
+        # Chorales of similar lengths are batched together, longest first.
+        chorales = self.chorales + [(Key.from_str('Am'), [])]
+        order = [[row.tolist() for row in (batch.order, batch.lengths)]
+                 for batch in batches(chorales, 2)]
+        lengths = [len(chunk_list) for _, chunk_list in self.chorales]
+        self.assertEqual(sorted(lengths, reverse=True),
+                         [length for _, batch_lengths in order
+                          for length in batch_lengths])
+        self.assertEqual([len(batch_order) for batch_order, _ in order],
+                         [2, 1])
+
+        # Splitting the chorales differently gives the same results.
+        progressions = self.model.decode(chorales)
+        log_likelihood = self.model.log_likelihood(chorales)
+        with mock.patch('chordhmm.BATCH_SIZE', 1):
+            self.assertEqual(self.model.decode(chorales), progressions)
+            self.assertAlmostEqual(self.model.log_likelihood(chorales),
+                                   log_likelihood)
+            model = ChordHMM('m')
+            log_likelihoods = model.fit(self.chorales, iterations=2)
+            rates = (model.chord_tone_rate, model.other_tone_rate)
+        model = ChordHMM('m')
+        np.testing.assert_allclose(model.fit(self.chorales, iterations=2),
+                                   log_likelihoods)
+        np.testing.assert_allclose((model.chord_tone_rate,
+                                    model.other_tone_rate), rates)
+
+    def test_fit(self):
+        log_likelihood = self.model.log_likelihood(self.chorales)
+        log_likelihoods = self.model.fit(self.chorales, iterations=4)
+        self.assertEqual(len(log_likelihoods), 4)
+        self.assertAlmostEqual(log_likelihoods[0], log_likelihood)
+        self.assertGreater(log_likelihoods[-1], log_likelihoods[0])
+        self.assertGreater(self.model.chord_tone_rate,
+                           self.model.other_tone_rate)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,75 @@
+import unittest
+
+from chordstats import ChordVocabulary, TransitionCounts
+from musictheory import Chord
+
+I, IV, V = Chord(1, 'M', 0), Chord(4, 'M', 0), Chord(5, 'M', 0)
+
+class TestChordVocabulary(unittest.TestCase):
+
+    def test_ids(self):
+        vocabulary = ChordVocabulary([I, V])
+        self.assertEqual(vocabulary.id(V), 1)
+        self.assertEqual(vocabulary.id(IV), 2)
+        self.assertIsNone(vocabulary.get(Chord(2, 'm', 0)))
+        self.assertEqual(vocabulary.encode([V, I, IV]).tolist(), [1, 0, 2])
+        self.assertEqual(vocabulary.decode([2, 0]), [IV, I])
+
+class TestTransitionCounts(unittest.TestCase):
+
+    def test_counts(self):
+        counts = TransitionCounts().add([[I, IV, V, I], [I, V, I]])
+        self.assertEqual(counts.histogram.tolist(), [2, 1, 2])
+        self.assertEqual(counts.transitions.tolist(),
+                         [[0, 1, 1], [0, 0, 1], [2, 0, 0]])
+        self.assertEqual(counts.probabilities()[0].tolist(), [0, 0.5, 0.5])
+
+        histogram, transition_matrix = counts.to_dicts()
+        self.assertEqual(dict(histogram), {I: 2, IV: 1, V: 2})
+        self.assertEqual(transition_matrix[(V, I)], 2)
+        self.assertEqual(transition_matrix[(IV, I)], 0)
+
+    def test_trimmed(self):
+        counts = TransitionCounts().add([[I, IV, V, I], [I, V, V, I]])
+        ids, matrix = counts.trimmed(2)
+        self.assertEqual(counts.vocabulary.decode(ids), [V, I])
+        # Transitions from a chord to itself are left out.
+        self.assertEqual(matrix.tolist(), [[0, 2], [1, 0]])
+
+    def test_most_common(self):
+        counts = TransitionCounts().add(
+            [[I, IV, V, I], [IV, V, I, V], [Chord(2, 'm', 0), V]])
+        # Counts are I: 2, IV: 2, V: 2, ii: 1
+        self.assertEqual(counts.most_common(2).tolist(), [0, 1])
+        self.assertEqual(counts.most_common(3).tolist(), [0, 1, 2])
+        self.assertEqual(counts.most_common(10).tolist(), [0, 1, 2, 3])
+        self.assertEqual(counts.most_common(0).tolist(), [])
+        self.assertEqual(counts.most_common(-1).tolist(), [])
+
+    def test_ranks(self):
+        # Equal counts are in the order chords were first followed by
+        # another, not in id order.
+        counts = TransitionCounts().add([[I, V], [IV, V], [V, IV]])
+        self.assertEqual(counts.vocabulary.decode(counts.most_common(3)),
+                         [I, IV, V])
+        self.assertEqual(list(counts.to_dicts()[0]), [I, IV, V])
+
+        counts = TransitionCounts().add([[V, IV]])
+        counts.merge(TransitionCounts().add([[I, V], [IV, I]]))
+        self.assertEqual(counts.vocabulary.decode(counts.most_common(3)),
+                         [V, I, IV])
+
+    def test_merge(self):
+        counts = TransitionCounts().add([[I, V, I]])
+        other = TransitionCounts().add([[IV, I, IV]])
+        counts.merge(other)
+        expected = TransitionCounts(counts.vocabulary).add(
+            [[I, V, I], [IV, I, IV]])
+        self.assertEqual(counts.transitions.tolist(),
+                         expected.transitions.tolist())
+        self.assertEqual(counts.histogram.tolist(),
+                         expected.histogram.tolist())
+
+
+if __name__ == '__main__':
+    unittest.main()
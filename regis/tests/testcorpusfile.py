@@ -0,0 +1,95 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from analyze import analyze_files, corpus_files, expand_progression
+from analyze import generate_transition_matrix, split_by_scale
+from corpusfile import CorpusFile, standard_vocabulary, write_corpus
+from musictheory import Chord
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+class TestCorpusFile(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'corpus.bin')
+        files = corpus_files([CORPUS])[:20] + ['test_chunking.mid']
+        analyzed = [(path, result) for path, result
+                    in zip(files, analyze_files(files, jobs=1))
+                    if result is not None]
+        self.files = [path for path, _ in analyzed]
+        self.results = [result for _, result in analyzed]
+        self.chorales = [(path, key_string, expand_progression(compact))
+                         for path, (key_string, compact)
+                         in zip(self.files, self.results)]
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_standard_vocabulary(self):
+        vocabulary = standard_vocabulary()
+        self.assertEqual(vocabulary.get(Chord(1, 'M', 0)), 0)
+        self.assertEqual(list(vocabulary), list(standard_vocabulary()))
+        self.assertLessEqual(len(vocabulary), 0x10000)
+        for _, _, progression in self.chorales:
+            for chord in progression:
+                self.assertIn(chord, vocabulary)
+
+    def test_round_trip(self):
+        write_corpus(self.path, self.chorales)
+        corpus = CorpusFile(self.path)
+        self.assertEqual(len(corpus), len(self.chorales))
+        self.assertIsInstance(corpus.ids, np.memmap)
+        self.assertEqual(corpus.ids.dtype, np.dtype('<u2'))
+        self.assertEqual(corpus.names, self.files)
+        for index, (_, key_string, progression) in enumerate(self.chorales):
+            self.assertEqual(corpus.keys[index], key_string)
+            self.assertEqual(len(corpus[index]), len(progression))
+            self.assertEqual(corpus.progression(index), progression)
+
+    def test_transition_counts(self):
+        write_corpus(self.path, self.chorales)
+        corpus = CorpusFile(self.path)
+        for scale, progressions in zip(('major', 'minor'),
+                                       split_by_scale(self.results)):
+            self.assertEqual(corpus.progressions(scale), progressions)
+            histogram, transitions = \
+                corpus.transition_counts(scale).to_dicts()
+            expected = generate_transition_matrix(progressions)
+            self.assertEqual(list(histogram.items()),
+                             list(expected[0].items()))
+            self.assertEqual(transitions, expected[1])
+
+    def test_label_counts(self):
+        write_corpus(self.path, self.chorales)
+        corpus = CorpusFile(self.path)
+        for scale, progressions in zip(('major', 'minor'),
+                                       split_by_scale(self.results)):
+            expected = {}
+            for progression in progressions:
+                for chord in progression:
+                    label = (chord.scale_degree, chord.quality,
+                             chord.relative)
+                    expected[label] = expected.get(label, 0) + 1
+            self.assertEqual(corpus.label_counts(scale), expected)
+
+    def test_empty(self):
+        write_corpus(self.path, [])
+        corpus = CorpusFile(self.path)
+        self.assertEqual(len(corpus), 0)
+        self.assertEqual(len(corpus.ids), 0)
+        self.assertEqual(corpus.transition_counts().to_dicts(), ({}, {}))
+
+    def test_not_a_corpus_file(self):
+        with open(self.path, 'wb') as fp:
+            fp.write(b'MThd' + bytes(20))
+        self.assertRaises(ValueError, CorpusFile, self.path)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,88 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest import mock
+
+from analyze import (analyze_corpus, generate_transition_matrix,
+                     set_template_frequencies)
+from corpusindex import CorpusIndex, read_file
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+class TestCorpusIndex(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.files = []
+        for file_ in ('000206b_.mid', '000306b_.mid', '000408b_.mid',
+                      '001707b_.mid'):
+            shutil.copy(os.path.join(CORPUS, file_), self.directory)
+            self.files.append(os.path.join(self.directory, file_))
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def assertCountsMatch(self, index, files):
+        major, minor = analyze_corpus(files, jobs=1)
+        for scale, progressions in (('major', major), ('minor', minor)):
+            histogram, transition_matrix = index.counts(scale)
+            expected = generate_transition_matrix(progressions)
+            # In the same order, whatever the history of the index
+            self.assertEqual(list(histogram.items()),
+                             list(expected[0].items()))
+            self.assertEqual(list(transition_matrix.items()),
+                             list(expected[1].items()))
+
+    def test_refresh(self):
+        index_path = os.path.join(self.directory, 'index.json')
+        index = CorpusIndex(index_path)
+        added, changed, removed = index.refresh(self.files[:3], jobs=1)
+        self.assertEqual((added, changed, removed), (self.files[:3], [], []))
+        self.assertCountsMatch(index, self.files[:3])
+        index.save()
+
+        # Replace the contents of one file, drop one and add one.
+        shutil.copy(self.files[3], self.files[0])
+        os.utime(self.files[0], ns=(0, 0))
+        index = CorpusIndex(index_path)
+        files = [self.files[0], self.files[2], self.files[3]]
+        with mock.patch('corpusindex.read_file', wraps=read_file) as read, \
+             mock.patch('analyze.analyze_file') as analyze_file:
+            added, changed, removed = index.refresh(files, jobs=1)
+        # Each changed or added file is read once, for its hash and analysis.
+        self.assertEqual(sorted(call.args[0] for call in read.call_args_list),
+                         sorted([self.files[0], self.files[3]]))
+        analyze_file.assert_not_called()
+        self.assertEqual((added, changed, removed),
+                         ([self.files[3]], [self.files[0]], [self.files[1]]))
+        self.assertCountsMatch(index, files)
+
+        # Touching a file does not make it change.
+        os.utime(self.files[2], ns=(0, 0))
+        self.assertEqual(index.refresh(files, jobs=1), ([], [], []))
+
+    def test_settings(self):
+        index_path = os.path.join(self.directory, 'index.json')
+        index = CorpusIndex(index_path)
+        index.refresh(self.files, jobs=1)
+        index.save()
+
+        # Files analyzed with other template frequencies are analyzed again.
+        set_template_frequencies({'M': {(5, 'M', None): 1}, 'm': {}})
+        try:
+            self.assertEqual(CorpusIndex(index_path).files, [])
+            self.assertEqual(index.refresh(self.files, jobs=1),
+                             (self.files, [], []))
+            self.assertCountsMatch(index, self.files)
+        finally:
+            set_template_frequencies(None)
+
+    def test_analyze_directory(self):
+        self.assertEqual(analyze_corpus([self.directory], jobs=1),
+                         analyze_corpus(self.files, jobs=1))
+
+
+if __name__ == '__main__':
+    unittest.main()
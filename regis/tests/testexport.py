@@ -0,0 +1,142 @@
+import csv
+import io
+import json
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from analyze import (generate_transition_matrix, get_n_most_common,
+                     get_trimmed_transition, write_graphviz)
+from chordstats import TransitionCounts
+from export import StatisticsExporter
+from musictheory import Chord
+
+I = Chord(1, 'M', 0)
+IV = Chord(4, 'M', 0)
+V = Chord(5, 'M', 0)
+V7 = Chord(5, '7', 0)
+VII = Chord(7, 'half-dim', 1)
+
+PROGRESSIONS = [[I, IV, V, I, I, V7, I], [I, V, V, I, VII, I, IV, I]]
+
+class TestStatisticsExporter(unittest.TestCase):
+
+    def setUp(self):
+        self.counts = TransitionCounts().add(PROGRESSIONS)
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_selection(self):
+        exporter = StatisticsExporter(self.counts, n=3)
+        self.assertEqual(exporter.chords, [I, V, IV])
+        self.assertEqual(exporter.histogram.tolist(), [6, 3, 2])
+        self.assertEqual(list(exporter.edges()),
+                         [(0, 1, 1), (0, 2, 2), (1, 0, 2), (2, 0, 1),
+                          (2, 1, 1)])
+
+        exporter = StatisticsExporter(self.counts, n=None, min_count=2,
+                                      min_chord_count=2, loops=True)
+        self.assertEqual(exporter.chords, [I, V, IV])
+        self.assertEqual(list(exporter.edges()),
+                         [(0, 2, 2), (1, 0, 2)])
+        # I followed by I, V by V
+        exporter = StatisticsExporter(self.counts, n=None, loops=True)
+        self.assertEqual(exporter.transitions.diagonal()[:2].tolist(),
+                         [1, 1])
+
+    def test_dot(self):
+        histogram, transition_matrix = generate_transition_matrix(
+            PROGRESSIONS)
+        chords = get_n_most_common(histogram, 11)
+        trimmed = get_trimmed_transition(histogram, transition_matrix, 11)
+        w = 4.0 / max(trimmed.values())
+        expected = 'digraph G {\n'
+        for from_chord in chords:
+            for to_chord in chords:
+                if trimmed[(from_chord, to_chord)]:
+                    expected += '    "{}" -> "{}"[penwidth={:3}];\n'.format(
+                        from_chord.xml_label, to_chord.xml_label,
+                        w * trimmed[(from_chord, to_chord)])
+        expected += '}'
+
+        path = os.path.join(self.directory, 'major.dot')
+        write_graphviz(PROGRESSIONS, path)
+        with open(path, encoding='utf-8') as fp:
+            self.assertEqual(fp.read(), expected)
+        self.assertIn('&#', expected)
+
+        fp = io.StringIO()
+        StatisticsExporter(TransitionCounts()).write_dot(fp)
+        self.assertEqual(fp.getvalue(), 'digraph G {\n}')
+
+    def test_ties(self):
+        # I, IV and V are each followed by a chord once. I and IV are first
+        # followed by one, so they are the two most common in every path,
+        # though V occurs before IV.
+        progressions = [[I, V], [IV, V], [V, IV]]
+        histogram, transition_matrix = generate_transition_matrix(
+            progressions)
+        self.assertEqual(get_n_most_common(histogram, 2), [I, IV])
+        outputs = []
+        for counts in (TransitionCounts().add(progressions),
+                       TransitionCounts.from_dicts(histogram,
+                                                   transition_matrix)):
+            exporter = StatisticsExporter(counts, n=2)
+            self.assertEqual(exporter.chords, [I, IV])
+            fp = io.StringIO()
+            exporter.write_dot(fp)
+            outputs.append(fp.getvalue())
+        self.assertEqual(outputs, ['digraph G {\n}'] * 2)
+
+    def test_csv(self):
+        fp = io.StringIO()
+        StatisticsExporter(self.counts, n=2).write_csv(fp)
+        rows = list(csv.reader(io.StringIO(fp.getvalue())))
+        self.assertEqual(rows, [['from', 'to', 'count', 'probability'],
+                                ['I', 'V', '1', str(1 / 6)],
+                                ['V', 'I', '2', str(2 / 3)]])
+
+    def test_json(self):
+        fp = io.StringIO()
+        StatisticsExporter(self.counts, n=2).write_json(fp)
+        document = json.loads(fp.getvalue())
+        self.assertEqual(document['chords'], [
+            {'label': 'I', 'chord': [1, 'M', 0, None], 'count': 6},
+            {'label': 'V', 'chord': [5, 'M', 0, None], 'count': 3}])
+        self.assertEqual(document['transitions'], [[0, 1, 1], [1, 0, 2]])
+
+    def test_npz(self):
+        exporter = StatisticsExporter(self.counts, n=3)
+        path = os.path.join(self.directory, 'major.npz')
+        exporter.write(path)
+        with np.load(path) as arrays:
+            self.assertEqual(arrays['labels'].tolist(), ['I', 'V', 'IV'])
+            self.assertEqual(arrays['histogram'].tolist(), [6, 3, 2])
+            self.assertEqual(arrays['transitions'].tolist(),
+                             exporter.transitions.tolist())
+
+    def test_write(self):
+        exporter = StatisticsExporter(self.counts)
+        for format_ in ('dot', 'csv', 'json'):
+            path = os.path.join(self.directory, 'major.' + format_)
+            exporter.write(path)
+            self.assertTrue(os.path.getsize(path))
+        self.assertRaises(ValueError, exporter.write,
+                          os.path.join(self.directory, 'major.txt'))
+
+    def test_from_dicts(self):
+        histogram, transition_matrix = generate_transition_matrix(
+            PROGRESSIONS)
+        counts = TransitionCounts.from_dicts(histogram, transition_matrix)
+        self.assertEqual(counts.to_dicts(), (histogram, transition_matrix))
+        self.assertEqual(list(counts.vocabulary),
+                         list(self.counts.vocabulary))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,54 @@
+import os
+import unittest
+
+from analyze import analyze_file, analyze_files
+import instrument
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+class TestInstrument(unittest.TestCase):
+
+    def setUp(self):
+        instrument.reset()
+
+    def tearDown(self):
+        instrument.disable()
+        instrument.reset()
+
+    def test_disabled(self):
+        self.assertIs(instrument.stage('load'), instrument.stage('match'))
+        analyze_file('test_chunking.mid')
+        snapshot = instrument.snapshot()
+        self.assertEqual(snapshot['stages'], {})
+        self.assertEqual(snapshot['counters'], {})
+
+    def test_counters(self):
+        instrument.enable()
+        self.assertIsNone(analyze_file(os.path.join(CORPUS, '000101b_.mid')))
+        analyze_file('test_chunking.mid')
+
+        snapshot = instrument.snapshot()
+        self.assertEqual(snapshot['stages']['load']['calls'], 2)
+        self.assertEqual(snapshot['stages']['match']['calls'], 1)
+        counters = snapshot['counters']
+        self.assertEqual(counters['files_skipped'], 1)
+        self.assertEqual(counters['files_analyzed'], 1)
+        self.assertEqual(counters['chunks'], 8)
+        self.assertEqual(counters['chunks'],
+                         counters.get('subset_matches', 0) +
+                         counters.get('jaccard_matches', 0))
+        matches = snapshot['caches']['relative_matches']
+        self.assertEqual(matches['hits'] + matches['misses'], 8)
+
+    def test_workers(self):
+        instrument.enable()
+        analyze_files(['test_chunking.mid'] * 2, jobs=2)
+        snapshot = instrument.snapshot()
+        self.assertEqual(snapshot['counters']['files_analyzed'], 2)
+        self.assertEqual(snapshot['counters']['chunks'], 16)
+        self.assertEqual(snapshot['stages']['chunk']['calls'], 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
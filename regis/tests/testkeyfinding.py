@@ -0,0 +1,115 @@
+import io
+import os
+import unittest
+
+from mido import MidiFile
+import numpy as np
+
+from analyze import (ChordProgression, analyze_chunks, analyze_data, chunks,
+                     expand_progression, get_key_string, voice_events)
+from keyfinding import (KEY_STRINGS, duration_profiles, estimate_key,
+                        find_keys, key_track, window_sums)
+from musictheory import Key
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+# A melody outlining I, IV, V and I in C major
+C_MAJOR = [60, 64, 67, 72, 65, 69, 67, 71, 74, 72, 67, 64, 60]
+
+class TestKeyFinding(unittest.TestCase):
+
+    def test_duration_profiles(self):
+        bass = [(48, 6), (43, 2)]
+        soprano = [(64, 3), (67, 0), (62, 5)]
+        profiles = duration_profiles([bass, soprano], 4)
+        self.assertEqual(profiles.tolist(), [
+            [4, 0, 1, 0, 3, 0, 0, 0, 0, 0, 0, 0],
+            [2, 0, 4, 0, 0, 0, 0, 2, 0, 0, 0, 0]])
+
+        # Every pitch class of every chunk sounds in its beat, and only those.
+        with MidiFile('test_chunking.mid') as midi_file:
+            profiles = duration_profiles(voice_events(midi_file),
+                                         midi_file.ticks_per_beat)
+            chunk_list = chunks(midi_file)
+        self.assertEqual(len(profiles), len(chunk_list))
+        for profile, chunk in zip(profiles, chunk_list):
+            self.assertEqual(set(profile.nonzero()[0]), set(chunk))
+
+    def test_find_keys(self):
+        self.assertEqual(len(KEY_STRINGS), 24)
+        for index, key_string in enumerate(KEY_STRINGS):
+            key = Key.from_str(key_string)
+            profile = np.zeros(12)
+            # The tonic triad, root doubled
+            for degree in (1, 1, 3, 5):
+                profile[key.degrees[degree].class_number()] += 1
+            self.assertEqual(find_keys(profile), index)
+
+    def test_estimate_key(self):
+        scale = [(note, 1) for note in C_MAJOR]
+        self.assertEqual(estimate_key([scale], 1), 'C')
+        for file_ in ('000306b_.mid', '000408b_.mid'):
+            with MidiFile(os.path.join(CORPUS, file_)) as midi_file:
+                self.assertEqual(estimate_key(voice_events(midi_file),
+                                              midi_file.ticks_per_beat),
+                                 get_key_string(midi_file))
+
+    def test_key_track(self):
+        profiles = np.arange(12.0).reshape(4, 3).repeat(4, axis=1)
+        self.assertEqual(window_sums(profiles, 2)[:, 0].tolist(),
+                         [3, 3, 9, 15])
+        self.assertEqual(window_sums(profiles, 8)[:, 0].tolist(),
+                         [18, 18, 18, 18])
+
+        # The melody in C and then a tritone higher
+        melody = [(note, 1) for note in C_MAJOR + [note + 6
+                                                   for note in C_MAJOR]]
+        track = key_track([melody], 1, window=8)
+        self.assertEqual(len(track), len(melody))
+        self.assertEqual(track[:4], ['C'] * 4)
+        self.assertEqual(track[-4:], ['F#'] * 4)
+
+    def test_missing_key_signature(self):
+        with open('test_chunking.mid', 'rb') as fp:
+            data = fp.read()
+        with MidiFile(file=io.BytesIO(data)) as midi_file:
+            meta_track = midi_file.tracks[0]
+            for message in list(meta_track):
+                if message.type == 'key_signature':
+                    meta_track.remove(message)
+            fp = io.BytesIO()
+            midi_file.save(file=fp)
+            self.assertIsNone(get_key_string(midi_file))
+
+            # Analyzed in the key that fits best instead
+            expected = analyze_chunks(
+                estimate_key(voice_events(midi_file),
+                             midi_file.ticks_per_beat),
+                chunks(midi_file))
+            cp = ChordProgression()
+            cp.from_midi_file(midi_file)
+        self.assertEqual(analyze_data(fp.getvalue())[0], expected)
+        self.assertEqual(analyze_data(fp.getvalue(), raw=True)[0], expected)
+        self.assertEqual(cp.progression, expand_progression(expected[1]))
+
+    def test_window(self):
+        with MidiFile(os.path.join(CORPUS, '000408b_.mid')) as midi_file:
+            key_strings = key_track(voice_events(midi_file),
+                                    midi_file.ticks_per_beat)
+            tracked = ChordProgression()
+            tracked.from_midi_file(midi_file, window=8)
+            chunk_list = chunks(midi_file)
+        self.assertIn('Bm', key_strings)
+        self.assertEqual(len(tracked.progression), len(chunk_list))
+
+        # Each chunk is analyzed in its own key.
+        for key_string, chunk, chord in zip(key_strings, chunk_list,
+                                            tracked.progression):
+            cp = ChordProgression()
+            cp.from_chunks(Key.from_str(key_string), [chunk])
+            self.assertEqual(cp.progression, [chord])
+
+
+if __name__ == '__main__':
+    unittest.main()
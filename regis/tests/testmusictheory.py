@@ -1,6 +1,7 @@
 import unittest
 
 from musictheory import PitchClass, Pitch, Interval, Chord
+import musictheory
 
 class TestPitchClasses(unittest.TestCase):
 
@@ -29,6 +30,18 @@ class TestPitchClasses(unittest.TestCase):
         self.assertNotEqual(hash(PitchClass('B', sharps=1)),
                             hash(PitchClass('C', sharps=1)))
 
+    def test_interned(self):
+        self.assertIs(PitchClass('C', sharps=1), PitchClass('c', sharps=1))
+        self.assertIs(PitchClass.from_str('Eb'), PitchClass('E', flats=1))
+        with self.assertRaises(AttributeError):
+            PitchClass('C').octave = 4
+
+    def test_class_number(self):
+        self.assertEqual(PitchClass('C').class_number(), 0)
+        self.assertEqual(PitchClass('B', sharps=1).class_number(), 0)
+        self.assertEqual(PitchClass('C', flats=2).class_number(), 10)
+        self.assertEqual(PitchClass('E', sharps=2).class_number(), 6)
+
     def test_cmp(self):
         self.assertLess(PitchClass('C'), PitchClass('D'))
         self.assertLess(PitchClass('E'), PitchClass('F', flats=1))
@@ -70,6 +83,24 @@ class TestPitchClasses(unittest.TestCase):
             PitchClass('B').is_enharmonic_to(PitchClass('C')))
         pass
 
+class TestTables(unittest.TestCase):
+
+    def test_tables(self):
+        # Built on first use, the tables hold the 35 spellings by the 28
+        # simple intervals, and compound intervals do not add to them.
+        PitchClass('D') + Interval('P', 12)
+        Interval('M', 3) + Interval('m', 3)
+        transpositions = musictheory.transpositions
+        self.assertEqual(len(transpositions), 35 * 28)
+        for (pitch_class, interval), result in transpositions.items():
+            self.assertEqual(result,
+                             PitchClass._transpose(pitch_class, interval))
+        for (interval, other), result in musictheory.interval_sums.items():
+            self.assertEqual(result, Interval._sum(interval, other))
+        self.assertEqual(PitchClass('G') + Interval('M', 10),
+                         PitchClass('B'))
+        self.assertEqual(len(transpositions), 35 * 28)
+
 class TestPitches(unittest.TestCase):
 
     def test_validate(self):
@@ -231,6 +262,13 @@ class TestIntervals(unittest.TestCase):
         self.assertEqual(Interval('A', 8).simple_part(), Interval('A', 1))
 
         self.assertEqual(Interval('d', 8).simple_part(), Interval('d', 8))
+        self.assertEqual(Interval('M', 14).simple_part(), Interval('M', 7))
+        self.assertEqual(Interval('P', 15).simple_part(), Interval('P', 1))
+
+    def test_interned(self):
+        self.assertIs(Interval('M', 3), Interval('M', 3))
+        self.assertIs(Interval('M', 3) + Interval('P', 8), Interval('M', 10))
+        self.assertIs(Interval('m', 2) * 2, Interval('d', 3))
 
     def test_octaves(self):
         self.assertEqual(Interval('d', 8).octaves(), 0)
@@ -261,6 +299,15 @@ class TestChords(unittest.TestCase):
         five_of_five = Chord(5, 'M', 2, (5, 'M'))
         pass
 
+    def test_labels(self):
+        chord = Chord.get_cached(7, 'half-dim', 1, (6, 'm'))
+        self.assertEqual(str(chord), 'viiø⁶⁄₅/vi')
+        self.assertIs(str(chord), str(chord))
+        self.assertEqual(chord.xml_label,
+                         'vii&#248;&#8310;&#8260;&#8325;/vi')
+        self.assertEqual(str(Chord(6, 'M7', 3)), 'VI M7⁴⁄₂')
+        self.assertEqual(str(Chord(2, 'N', 1)), 'N⁶⁄₅')
+
 
 if __name__ == '__main__':
     unittest.main()
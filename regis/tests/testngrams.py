@@ -0,0 +1,105 @@
+from collections import Counter
+import unittest
+from unittest import mock
+
+from chordstats import ChordVocabulary
+from musictheory import Chord
+from ngrams import NGramCounts
+
+I = Chord(1, 'M', 0)
+I64 = Chord(1, 'M', 2)
+ii6 = Chord(2, 'm', 1)
+IV = Chord(4, 'M', 0)
+V = Chord(5, 'M', 0)
+V7 = Chord(5, '7', 0)
+vi = Chord(6, 'm', 0)
+
+PROGRESSIONS = [[I, IV, ii6, V7, I], [I, vi, ii6, V7, vi], [ii6, V7],
+                [I, ii6, V, I, I64, V7, I], []]
+
+def brute_force(progressions, order):
+    counts = Counter()
+    for progression in progressions:
+        for length in range(1, order + 1):
+            for start in range(len(progression) - length + 1):
+                counts[tuple(progression[start:start + length])] += 1
+    return counts
+
+class TestNGramCounts(unittest.TestCase):
+
+    def test_counts(self):
+        counts = NGramCounts(4).add(PROGRESSIONS)
+        expected = brute_force(PROGRESSIONS, 4)
+        for ngram, count in expected.items():
+            self.assertEqual(counts.count(ngram), count)
+        self.assertEqual(counts.count((V7, ii6)), 0)
+        self.assertEqual(counts.count((Chord(3, 'm', 0),)), 0)
+        self.assertEqual(counts.total(1), 19)
+        self.assertEqual(counts.total(4), 8)
+        self.assertEqual(counts.most_common(2, 2),
+                         [((ii6, V7), 3), ((V7, I), 2)])
+
+    def test_batches(self):
+        # Counting one chorale at a time gives the right counts after each,
+        # however soon the buffered keys are merged.
+        for pending_keys in (0, 1 << 16):
+            with mock.patch('ngrams.PENDING_KEYS', pending_keys):
+                counts = NGramCounts(4)
+                for index, progression in enumerate(PROGRESSIONS):
+                    counts.add([progression])
+                    expected = brute_force(PROGRESSIONS[:index + 1], 4)
+                    for ngram, count in expected.items():
+                        self.assertEqual(counts.count(ngram), count)
+                self.assertEqual(counts.most_common(2, 2),
+                                 [((ii6, V7), 3), ((V7, I), 2)])
+
+    def test_continuations(self):
+        counts = NGramCounts(3).add(PROGRESSIONS)
+        # What follows ii6 V7
+        self.assertEqual(counts.continuations([ii6, V7]), [(I, 1), (vi, 1)])
+        self.assertEqual(counts.continuations([V7]), [(I, 2), (vi, 1)])
+        self.assertEqual(counts.continuations([])[:2], [(I, 6), (ii6, 4)])
+        self.assertEqual(counts.continuations([Chord(3, 'm', 0)]), [])
+        self.assertRaises(ValueError, counts.continuations, [I, ii6, V7])
+
+    def test_merge(self):
+        whole = NGramCounts(5).add(PROGRESSIONS)
+        merged = NGramCounts(5).add(PROGRESSIONS[:2])
+        merged.merge(NGramCounts(5).add(PROGRESSIONS[2:]))
+        for ngram in brute_force(PROGRESSIONS, 5):
+            self.assertEqual(merged.count(ngram), whole.count(ngram))
+        self.assertEqual(merged.total(2), whole.total(2))
+        self.assertRaises(ValueError, merged.merge, NGramCounts(4))
+        self.assertRaises(ValueError, merged.merge,
+                          NGramCounts(5, sketch=(64, 2)))
+
+    def test_sketch(self):
+        expected = brute_force(PROGRESSIONS, 4)
+        # Never below the true count, even when tiny
+        small = NGramCounts(4, sketch=(8, 2)).add(PROGRESSIONS)
+        for ngram, count in expected.items():
+            self.assertGreaterEqual(small.count(ngram), count)
+
+        sketch = NGramCounts(4, sketch=(1 << 12, 4))
+        sketch.add(PROGRESSIONS[:2]).merge(
+            NGramCounts(4, sketch=(1 << 12, 4)).add(PROGRESSIONS[2:]))
+        self.assertEqual(sketch.sketch, (1 << 12, 4, 0))
+        for ngram, count in expected.items():
+            self.assertEqual(sketch.count(ngram), count)
+        self.assertEqual(sketch.continuations([ii6, V7]), [(I, 1), (vi, 1)])
+        self.assertRaises(ValueError, sketch.most_common, 2, 1)
+        self.assertRaises(ValueError, sketch.merge,
+                          NGramCounts(4, sketch=(1 << 12, 4), seed=1))
+
+    def test_vocabulary(self):
+        vocabulary = ChordVocabulary([I, V])
+        counts = NGramCounts(2, vocabulary)
+        counts.add_encoded([[0, 1, 0]])
+        self.assertEqual(counts.continuations([I]), [(V, 1)])
+        self.assertRaises(ValueError, counts.add, [[I, IV]])
+        self.assertRaises(ValueError, counts.add_encoded, [[-1, 0]])
+        self.assertRaises(ValueError, NGramCounts, 7)
+
+
+if __name__ == '__main__':
+    unittest.main()
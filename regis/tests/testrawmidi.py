@@ -0,0 +1,83 @@
+import io
+import unittest
+
+from mido import Message, MetaMessage, MidiFile, MidiTrack
+
+from analyze import analyze_file, get_key_string, get_tempo
+from rawmidi import read_midi_events
+
+def header(track_count, ticks_per_beat=480):
+    return (b'MThd\x00\x00\x00\x06\x00\x01' + track_count.to_bytes(2, 'big') +
+            ticks_per_beat.to_bytes(2, 'big'))
+
+def track(data):
+    return b'MTrk' + len(data).to_bytes(4, 'big') + data
+
+class TestRawMidi(unittest.TestCase):
+
+    def assertSameAsMido(self, data):
+        midi_file = MidiFile(file=io.BytesIO(data))
+        events = read_midi_events(data)
+        self.assertEqual(events.track_count, len(midi_file.tracks))
+        self.assertEqual(events.ticks_per_beat, midi_file.ticks_per_beat)
+        self.assertEqual(events.key_string, get_key_string(midi_file))
+        self.assertEqual(events.tempo, get_tempo(midi_file))
+        tracks = range(len(midi_file.tracks))
+        for produced, midi_track in zip(events.voice_events(tracks),
+                                        midi_file.tracks):
+            self.assertEqual(list(produced),
+                             [(message.note, message.time)
+                              for message in midi_track
+                              if message.type == 'note_off'])
+
+    def test_chorale(self):
+        with open('test_chunking.mid', 'rb') as fp:
+            self.assertSameAsMido(fp.read())
+
+    def test_analyze_file(self):
+        self.assertEqual(analyze_file('test_chunking.mid', raw=True),
+                         analyze_file('test_chunking.mid'))
+
+    def test_written_by_mido(self):
+        midi_file = MidiFile(ticks_per_beat=96)
+        midi_file.tracks.append(MidiTrack([
+            MetaMessage('set_tempo', tempo=600000),
+            MetaMessage('key_signature', key='Bbm'),
+            MetaMessage('key_signature', key='D')]))
+        midi_file.tracks.append(MidiTrack([
+            Message('note_on', note=60, time=0),
+            Message('note_off', note=60, time=200),
+            Message('note_off', note=64, time=20000),
+            Message('program_change', program=3),
+            Message('sysex', data=[1, 2, 3], time=5),
+            Message('note_off', note=67, time=7)]))
+        fp = io.BytesIO()
+        midi_file.save(file=fp)
+        self.assertSameAsMido(fp.getvalue())
+
+    def test_running_status(self):
+        # A note_on, two note_offs under running status, a meta event that
+        # leaves running status alone, and one more note_off.
+        data = header(1, 4) + track(
+            b'\x00\x90\x3c\x40' + b'\x04\x80\x3c\x00' + b'\x81\x00\x3e\x00' +
+            b'\x00\xff\x59\x02\xfe\x01' + b'\x02\x40\x00' +
+            b'\x00\xff\x2f\x00')
+        self.assertSameAsMido(data)
+        events = read_midi_events(data)
+        self.assertEqual(events.key_string, 'Gm')
+        self.assertEqual(list(events.voice_events([0])[0]),
+                         [(60, 4), (62, 128), (64, 2)])
+
+    def test_malformed(self):
+        with self.assertRaises(OSError):
+            read_midi_events(b'RIFF' + header(1)[4:])
+        with self.assertRaises(OSError):
+            read_midi_events(header(1) + track(b'\x00\x3c\x40'))
+        with self.assertRaises(EOFError):
+            read_midi_events(header(1) + track(b'\x00\x80\x3c\x00')[:-2])
+        with self.assertRaises(EOFError):
+            read_midi_events(header(2) + track(b''))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,65 @@
+import os
+import unittest
+
+from mido import MidiFile
+
+from analyze import chunks, iter_chunks, note_intervals, voice_events
+from slicing import NoteIntervals
+
+CORPUS = os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir,
+                      os.pardir, 'corpus')
+
+class TestNoteIntervals(unittest.TestCase):
+
+    def setUp(self):
+        # A half note C over a quarter rest, then E, G and E again
+        bass = [(48, 8), (43, 0)]
+        soprano = [(64, 0), (60, 2), (64, 4), (67, 1), (64, 3)]
+        self.intervals = NoteIntervals.from_voices([bass, soprano], 4)
+
+    def test_from_voices(self):
+        self.assertEqual(self.intervals.starts.tolist(), [0, 0, 2, 6, 7])
+        self.assertEqual(self.intervals.ends.tolist(), [8, 2, 6, 7, 10])
+        self.assertEqual(self.intervals.classes.tolist(), [0, 0, 4, 7, 4])
+        self.assertEqual(self.intervals.voices.tolist(), [0, 1, 1, 1, 1])
+        self.assertEqual(self.intervals.length, 10)
+
+    def test_chunks(self):
+        self.assertEqual(self.intervals.grid().tolist(), [0, 4, 8, 12])
+        self.assertEqual(self.intervals.chunks(),
+                         [[0, 4], [0, 4, 7], [4]])
+        self.assertEqual(self.intervals.chunks(self.intervals.grid(2)),
+                         [[0], [0, 4], [0, 4], [0, 7, 4], [4]])
+        self.assertEqual(self.intervals.onset_grid().tolist(),
+                         [0, 2, 6, 7, 10])
+        self.assertEqual(self.intervals.chunks(self.intervals.onset_grid()),
+                         [[0], [0, 4], [0, 7], [0, 4]])
+
+    def test_durations(self):
+        self.assertEqual(self.intervals.durations().tolist(), [
+            [6, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0],
+            [4, 0, 0, 0, 3, 0, 0, 1, 0, 0, 0, 0],
+            [0, 0, 0, 0, 2, 0, 0, 0, 0, 0, 0, 0]])
+
+    def test_empty(self):
+        intervals = NoteIntervals.from_voices([[], [(60, 0)]], 4)
+        self.assertEqual(intervals.length, 0)
+        self.assertEqual(intervals.chunks(), [])
+        self.assertEqual(intervals.durations().shape, (0, 12))
+
+    def test_same_as_iter_chunks(self):
+        for path in ('test_chunking.mid',
+                     os.path.join(CORPUS, '000408b_.mid')):
+            with MidiFile(path) as midi_file:
+                intervals = note_intervals(midi_file)
+                self.assertEqual(intervals.chunks(), chunks(midi_file))
+                ticks_per_beat = midi_file.ticks_per_beat
+                for resolution in (ticks_per_beat // 2, ticks_per_beat * 4):
+                    self.assertEqual(
+                        chunks(midi_file, resolution),
+                        list(iter_chunks(voice_events(midi_file),
+                                         resolution)))
+
+
+if __name__ == '__main__':
+    unittest.main()
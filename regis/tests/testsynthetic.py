@@ -0,0 +1,31 @@
+import shutil
+import tempfile
+import unittest
+
+from analyze import analyze_file, chunks, open_midi_file
+from synthetic import generate_corpus
+
+class TestSynthetic(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_generate_corpus(self):
+        paths = generate_corpus(self.directory, 3, seed=1, min_beats=8,
+                                max_beats=16)
+        self.assertEqual(paths, generate_corpus(self.directory, 3, seed=1,
+                                                min_beats=8, max_beats=16))
+        for path in paths:
+            with open_midi_file(path) as midi_file:
+                self.assertEqual(len(midi_file.tracks), 5)
+                beats = len(chunks(midi_file))
+            key_string, progression = analyze_file(path)
+            self.assertTrue(8 <= beats <= 16)
+            self.assertEqual(len(progression), beats)
+
+
+if __name__ == '__main__':
+    unittest.main()
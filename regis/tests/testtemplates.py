@@ -0,0 +1,89 @@
+import unittest
+
+from musictheory import Chord, Key
+from templates import TemplateTable, template_table
+from util import rotate_mask, to_mask
+
+# All keys a MIDI key signature can name, from 7 flats to 7 sharps.
+KEY_STRINGS = ('Cb', 'Gb', 'Db', 'Ab', 'Eb', 'Bb', 'F', 'C', 'G', 'D', 'A',
+               'E', 'B', 'F#', 'C#',
+               'Abm', 'Ebm', 'Bbm', 'Fm', 'Cm', 'Gm', 'Dm', 'Am', 'Em', 'Bm',
+               'F#m', 'C#m', 'G#m', 'D#m', 'A#m')
+
+class TestTemplateTable(unittest.TestCase):
+
+    def test_templates(self):
+        # Keys outside the table are transposed from its rows.
+        table = template_table()
+        for key_string in KEY_STRINGS + ('E#', 'Gbm'):
+            key = Key.from_str(key_string)
+            chords, masks, classes = table.templates(key)
+            self.assertEqual(chords, tuple(key.common_chords()))
+            self.assertEqual(masks, key.common_chord_masks())
+            self.assertEqual(classes, tuple(chord.equivalence_classes(key)
+                                            for chord in chords))
+            self.assertIs(table.templates(key), table.templates(key))
+
+    def test_keys(self):
+        table = template_table()
+        self.assertEqual(table.key_strings, ('C', 'Am'))
+        self.assertEqual(table.key_id(Key.from_str('Am')), 1)
+        self.assertIsNone(table.key_id(Key.from_str('Cb')))
+        # Keys with chords that would need triple sharps or flats are left
+        # out of a table.
+        built = TemplateTable.build(('C', 'B#', 'Bbbm', 'Am'))
+        self.assertEqual(built.key_strings, ('C', 'Am'))
+
+    def test_relative_templates(self):
+        # Every key of a scale has the same templates, transposed.
+        table = TemplateTable.build(KEY_STRINGS)
+        for key_string in KEY_STRINGS:
+            key = Key.from_str(key_string)
+            tonic = key.tonic.class_number()
+            chords, masks, classes = table.relative_templates(key.scale)
+            expected_chords, expected_masks, expected_classes = \
+                table.templates(key)
+            self.assertEqual(chords, expected_chords)
+            self.assertEqual(tuple(rotate_mask(mask, tonic)
+                                   for mask in expected_masks), masks)
+            self.assertEqual(tuple(tuple((class_number - tonic) % 12
+                                         for class_number in chord_classes)
+                                   for chord_classes in expected_classes),
+                             classes)
+
+    def test_candidates(self):
+        table = template_table()
+        for scale in ('M', 'm'):
+            chords, masks, _ = table.relative_templates(scale)
+            candidates = table.candidates(scale)
+            self.assertIs(table.candidates(scale), candidates)
+            # Templates that share a mask with an earlier one are dropped.
+            self.assertEqual(len(set(candidates.masks)), len(candidates))
+            self.assertEqual(len(set(masks)), len(candidates))
+            for chunk_mask in range(1 << 12):
+                index = candidates.superset(chunk_mask)
+                expected = next((chord for chord, mask in zip(chords, masks)
+                                 if mask & chunk_mask == chunk_mask), None)
+                self.assertEqual(index is None, expected is None)
+                if index is not None:
+                    self.assertEqual(candidates.chords[index], expected)
+
+    def test_frequency_order(self):
+        table = template_table()
+        exact = table.candidates('M')
+        candidates = table.candidates('M', {(4, 'M', None): 10,
+                                            (2, 'm', None): 3})
+        self.assertEqual(candidates.chords[:2],
+                         (Chord(4, 'M', 0), Chord(2, 'm', 0)))
+        self.assertEqual(candidates.chords[2:],
+                         tuple(chord for chord in exact.chords
+                               if chord not in candidates.chords[:2]))
+        # The tonic alone is in both I and IV, the latter now tried first.
+        chunk_mask = to_mask([0])
+        self.assertEqual(exact.chords[exact.superset(chunk_mask)],
+                         Chord(1, 'M', 0))
+        self.assertEqual(candidates.chords[candidates.superset(chunk_mask)],
+                         Chord(4, 'M', 0))
+
+if __name__ == '__main__':
+    unittest.main()
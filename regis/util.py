@@ -7,8 +7,13 @@ ROMAN_NUMERAL_DICT = OrderedDict([
     (50, 'L'), (40, 'XL'), (10, 'X'), (9, 'IX'), (5, 'V'), (4, 'IV'), (1, 'I')
     ])
 
+# Roman numerals of the scale degrees, SCALE_DEGREE_NUMERALS[degree - 1]
+SCALE_DEGREE_NUMERALS = ('I', 'II', 'III', 'IV', 'V', 'VI', 'VII')
+
 def to_roman(num):
     """ Given int between 1 and 4000 returns corresponding Roman numeral. """
+    if 1 <= num <= 7:
+        return SCALE_DEGREE_NUMERALS[num - 1]
     if not 1 <= num <= 4000:
         raise ValueError('to_roman can only convert integers between 1 and '
                          '3999')
@@ -18,3 +23,24 @@ def to_roman(num):
         result += ROMAN_NUMERAL_DICT[roman_value] * how_many
         num = remainder
     return result
+
+
+# Number of set bits of every 12-bit pitch class mask
+POPCOUNT = tuple(bin(mask).count('1') for mask in range(1 << 12))
+
+def to_mask(class_numbers):
+    """ Given pitch class numbers returns the 12-bit mask with those bits set.
+    """
+    mask = 0
+    for class_number in class_numbers:
+        mask |= 1 << class_number
+    return mask
+
+
+def rotate_mask(mask, shift):
+    """ Transposes a 12-bit pitch class mask down by shift semitones.
+
+    Rotating the mask of a chunk by the pitch class of the tonic gives its
+    pitch classes relative to the key, the same in every key.
+    """
+    return ((mask >> shift) | (mask << (12 - shift))) & 0xFFF
@@ -9,6 +9,7 @@ setup(name='regis',
       license='GPL3',
       packages=['regis'],
       install_requires=[
-        'mido'
+        'mido',
+        'numpy'
       ],
       zip_safe=False)